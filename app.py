@@ -1,24 +1,16 @@
 
 import streamlit as st
-import os
 from dotenv import load_dotenv
-import pymysql
 from datetime import datetime
+from db_pool import get_connection
 
 # Load environment variables
 load_dotenv()
 
-# Database connection (using TiDB Cloud credentials)
+# Database connection (using TiDB Cloud credentials from TIDB_* variables).
+# Connections come from a process-wide pool; close() hands them back to it.
 def get_db_connection():
-    return pymysql.connect(
-        host=os.getenv('TIDB_HOST'),
-        user=os.getenv('TIDB_USER'),
-        password=os.getenv('TIDB_PASSWORD'),
-        database=os.getenv('TIDB_DATABASE'),
-        port=int(os.getenv('TIDB_PORT', 4000)),
-        ssl_verify_identity=True,
-        ssl_ca=os.getenv('TIDB_CA_PATH') # Path to your CA certificate
-    )
+    return get_connection()
 
 # --- Streamlit App --- #
 st.set_page_config(page_title='AI Mental Health Companion', layout='wide')
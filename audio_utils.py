@@ -1,39 +1,315 @@
 
-import speech_recognition as sr
-import pyttsx3
+import io
+import json
+import os
+import shutil
+import subprocess
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def recognize_speech_from_mic():
+import numpy as np
+
+import model_registry
+
+FRAME_MS = 30
+VOICE_NOTE_RATE = 16000
+
+# ── Audio input ────────────────────────────────────────────────────
+
+class _Prepend:
+    """Non-seekable stream with already-read bytes put back in front."""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b""
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+def _open_source(source):
+    """Returns (stream, first 4 bytes, whether the stream was opened here)."""
+    if isinstance(source, (str, os.PathLike)):
+        stream, owned = open(source, "rb"), True
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        stream, owned = io.BytesIO(bytes(source)), True
+    else:
+        stream, owned = source, False  # already a binary file-like object
+    head = stream.read(4)
+    if getattr(stream, "seekable", lambda: False)():
+        stream.seek(-len(head), io.SEEK_CUR)
+    else:
+        stream = _Prepend(head, stream)
+    return stream, head, owned
+
+def _wav_blocks(stream, block_frames):
+    with wave.open(stream, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV audio is supported.")
+        rate, channels = wav.getframerate(), wav.getnchannels()
+        yield rate
+        while True:
+            data = wav.readframes(block_frames)
+            if not data:
+                return
+            samples = np.frombuffer(data, dtype="<i2")
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+            yield samples
+
+def _voice_note_blocks(stream, block_frames):
+    # WhatsApp voice notes are Ogg/Opus; ffmpeg decodes them to 16 kHz mono PCM as a stream
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("Decoding voice notes needs ffmpeg on the PATH.")
+    process = subprocess.Popen(
+        ["ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+         "-ar", str(VOICE_NOTE_RATE), "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    # ffmpeg reads from a feeder thread so decoded audio is available while input still arrives
+    feeder = ThreadPoolExecutor(max_workers=1)
+
+    def feed():
+        try:
+            for chunk in iter(lambda: stream.read(64 * 1024), b""):
+                process.stdin.write(chunk)
+        finally:
+            process.stdin.close()
+
+    feeder.submit(feed)
+    yield VOICE_NOTE_RATE
+    try:
+        while True:
+            data = process.stdout.read(block_frames * 2)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2")
+    finally:
+        process.stdout.close()
+        process.wait()
+        feeder.shutdown()
+
+def iter_audio_frames(source, frame_ms=FRAME_MS):
+    """
+    Reads audio incrementally as fixed-length mono 16-bit frames.
+    Args:
+        source: WAV file path, WAV or Ogg/Opus bytes, or a binary file-like object
+            (e.g. an upload or a downloaded WhatsApp voice note).
+        frame_ms (int): Frame length in milliseconds.
+    Yields:
+        The sample rate first, then np.int16 arrays of frame_ms each.
+    """
+    stream, head, owned = _open_source(source)
+    blocks = _voice_note_blocks if head == b"OggS" else _wav_blocks
+    try:
+        reader = blocks(stream, 4096)
+        rate = next(reader)
+        frame_len = rate * frame_ms // 1000
+        yield rate
+        pending = np.zeros(0, dtype=np.int16)
+        for block in reader:
+            pending = np.concatenate((pending, block))
+            whole = len(pending) // frame_len * frame_len
+            for start in range(0, whole, frame_len):
+                yield pending[start:start + frame_len]
+            pending = pending[whole:]
+        if len(pending):
+            yield pending
+    finally:
+        if owned:
+            stream.close()
+
+# ── Voice activity detection ───────────────────────────────────────
+
+class EnergyVAD:
+    """
+    Splits a frame stream into speech segments by short-term energy.
+
+    A frame is voiced when its RMS exceeds both an absolute floor and a
+    multiple of the running noise estimate. A segment starts after
+    `start_frames` voiced frames (plus some pre-roll) and ends after
+    `hangover_ms` of silence or at `max_segment_s`.
+    """
+
+    def __init__(self, threshold=300.0, noise_ratio=3.0, start_frames=3, hangover_ms=450,
+                 pre_roll_ms=150, max_segment_s=15.0):
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.start_frames = start_frames
+        self.hangover_ms = hangover_ms
+        self.pre_roll_ms = pre_roll_ms
+        self.max_segment_s = max_segment_s
+
+    def segments(self, frames, rate):
+        """
+        Args:
+            frames (iterable): np.int16 frames of equal length.
+            rate (int): Sample rate.
+        Yields:
+            tuple: (pcm bytes, start seconds, end seconds) per speech segment.
+        """
+        noise = None
+        position = 0
+        pre_roll = deque()
+        segment, segment_start, voiced_run, silence = None, 0, 0, 0
+        for frame in frames:
+            frame_s = len(frame) / rate
+            rms = float(np.sqrt(np.mean(frame.astype(np.float64) ** 2))) if len(frame) else 0.0
+            voiced = rms > max(self.threshold, (noise or 0.0) * self.noise_ratio)
+            if not voiced:
+                # Slow-moving noise floor estimated from unvoiced frames only
+                noise = rms if noise is None else 0.95 * noise + 0.05 * rms
+
+            if segment is None:
+                pre_roll.append(frame)
+                while len(pre_roll) * frame_s * 1000 > self.pre_roll_ms + self.start_frames * frame_s * 1000:
+                    pre_roll.popleft()
+                voiced_run = voiced_run + 1 if voiced else 0
+                if voiced_run >= self.start_frames:
+                    segment = list(pre_roll)
+                    segment_start = max(0.0, position + frame_s - len(segment) * frame_s)
+                    pre_roll.clear()
+                    silence = 0
+            else:
+                segment.append(frame)
+                silence = 0 if voiced else silence + frame_s * 1000
+                length = sum(len(f) for f in segment) / rate
+                if silence >= self.hangover_ms or length >= self.max_segment_s:
+                    yield np.concatenate(segment).tobytes(), segment_start, position + frame_s
+                    segment, voiced_run = None, 0
+            position += frame_s
+        if segment:
+            yield np.concatenate(segment).tobytes(), segment_start, position
+
+# ── Recognition backends ───────────────────────────────────────────
+
+class VoskBackend:
+    """Offline recognition with a local Vosk model (VOSK_MODEL_PATH)."""
+
+    def transcribe(self, pcm, rate):
+        vosk = model_registry.get("vosk")
+        recognizer = vosk.KaldiRecognizer(model_registry.get("vosk_model"), rate)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+class SphinxBackend:
+    """Offline recognition with CMU PocketSphinx through speech_recognition."""
+
+    def transcribe(self, pcm, rate):
+        sr = model_registry.get("speech_recognition")
+        try:
+            return sr.Recognizer().recognize_sphinx(sr.AudioData(pcm, rate, 2))
+        except sr.UnknownValueError:
+            return ""
+
+BACKENDS = {"vosk": VoskBackend, "sphinx": SphinxBackend}
+
+def get_backend(name=None):
+    """
+    Returns a recognition backend: any object with transcribe(pcm_bytes, rate) -> str.
+    Args:
+        name (str): "vosk" or "sphinx". Defaults to the ASR_BACKEND env variable, then vosk.
+    """
+    return BACKENDS[name or os.environ.get("ASR_BACKEND", "vosk")]()
+
+# ── Streaming transcription ────────────────────────────────────────
+
+def transcribe_stream(source, backend=None, vad=None, frame_ms=FRAME_MS, on_phrase=None):
+    """
+    Transcribes audio phrase by phrase while it is still being read.
+
+    Speech segments found by the VAD are recognized on a worker thread as
+    soon as each one ends, so the first phrase is transcribed while later
+    audio is still arriving or being decoded.
+    Args:
+        source: WAV path, WAV/Ogg bytes or a binary file-like object.
+        backend: Recognition backend. Defaults to get_backend().
+        vad (EnergyVAD): Segmenter. Defaults to EnergyVAD().
+        on_phrase (callable): Called from the recognition thread with each
+            phrase dict the moment it is recognized.
+    Yields:
+        dict: text, start and end (seconds) for each phrase, in order.
+    """
+    backend = backend or get_backend()
+    vad = vad or EnergyVAD()
+    frames = iter_audio_frames(source, frame_ms)
+    rate = next(frames)
+
+    def recognize(pcm, start, end):
+        phrase = {"text": backend.transcribe(pcm, rate).strip(), "start": start, "end": end}
+        if on_phrase:
+            on_phrase(phrase)
+        return phrase
+
+    pending = deque()
+    # One worker keeps phrases in order while the VAD reads ahead
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr") as pool:
+        for pcm, start, end in vad.segments(frames, rate):
+            pending.append(pool.submit(recognize, pcm, start, end))
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def transcribe(source, backend=None, vad=None):
+    """
+    Returns:
+        str: Full transcript of an audio clip or voice note.
+    """
+    return " ".join(p["text"] for p in transcribe_stream(source, backend, vad) if p["text"])
+
+def recognize_speech_from_mic(backend=None):
     """
     Transcribes speech from microphone input.
     Returns:
         str: The transcribed text, or an error message.
     """
+    sr = model_registry.get("speech_recognition")
     r = sr.Recognizer()
     with sr.Microphone() as source:
         r.adjust_for_ambient_noise(source)
-        st.info("Say something!")
+        print("Say something!")
         audio = r.listen(source)
 
     try:
-        text = r.recognize_google(audio)
-        return text
-    except sr.UnknownValueError:
-        return "Could not understand audio"
-    except sr.RequestError as e:
+        text = (backend or get_backend()).transcribe(audio.get_raw_data(convert_width=2), audio.sample_rate)
+        return text or "Could not understand audio"
+    except Exception as e:
         return f"Speech recognition service error: {e}"
 
-def text_to_speech(text):
+def text_to_speech(text, wait=True, interrupt=False):
     """
-    Converts text to speech and plays it.
+    Converts text to speech and plays it on the shared TTS worker.
     Args:
         text (str): The text to convert to speech.
+        wait (bool): Block until playback ends.
+        interrupt (bool): Stop any speech already playing or queued.
+    Returns:
+        Future: Resolves to True when spoken, False if interrupted.
     """
-    engine = pyttsx3.init()
-    engine.say(text)
-    engine.runAndWait()
+    from tts_service import get_tts_service
+    future = get_tts_service().speak(text, interrupt=interrupt)
+    if wait:
+        future.result()
+    return future
 
 if __name__ == "__main__":
-    # Example usage
+    # Example usage: python audio_utils.py [clip.wav|voice_note.ogg]
+    import sys
+    import time
+
+    if len(sys.argv) > 1:
+        start = time.perf_counter()
+        for phrase in transcribe_stream(sys.argv[1]):
+            print(f"[{phrase['start']:6.2f}-{phrase['end']:6.2f}s, +{time.perf_counter() - start:.2f}s] {phrase['text']}")
+        sys.exit()
+
     print("Testing speech recognition...")
     input_text = recognize_speech_from_mic()
     print(f"You said: {input_text}")
@@ -41,6 +317,3 @@ if __name__ == "__main__":
     if input_text != "Could not understand audio" and not input_text.startswith("Speech recognition service error"):
         print("Testing text to speech...")
         text_to_speech(f"You just said: {input_text}")
-
-
-
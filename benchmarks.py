@@ -0,0 +1,468 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Performance regression suite for the hot paths. Everything runs offline:
+# data is synthetic and LM Studio, DeepFace and TiDB are replaced by local
+# stand-ins. Every metric is seconds per operation, so lower is better.
+#
+#   python benchmarks.py --quick                  # smaller sizes, ~1 minute
+#   python benchmarks.py --save-baseline          # record the reference run
+#   python benchmarks.py --threshold 0.2          # fail on >20% slowdowns
+
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.25
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers f(config) -> {metric: seconds per operation} under a name."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def per_op(fn, ops, repeat=3):
+    """
+    Returns:
+        float: Best-of-`repeat` wall time of fn() divided by ops.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / ops
+
+
+# ── Synthetic data ─────────────────────────────────────────────────
+
+TOPICS = ["anxiety", "sleep", "stress", "loneliness", "motivation", "breathing", "gratitude", "focus"]
+MOODS = ["happy", "sad", "neutral", "angry", "fear", "surprise"]
+MESSAGES = ["hi there", "I can't sleep before my exams", "help", "work has been overwhelming lately",
+            "I feel a bit lonely this week", "thanks, the breathing exercise helped", "panic attack again",
+            "my friend said something that hurt"]
+
+
+def synthetic_embeddings(n, dim=EMBEDDING_DIM, seed=0, clusters=64):
+    """Unit-length float32 vectors grouped around `clusters` topics, like real sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_tip_rows(n, dim=EMBEDDING_DIM, seed=0, first_id=1):
+    """(id, topic, tip_text, embedding bytes) rows as stored in the tips table."""
+    vectors = synthetic_embeddings(n, dim, seed)
+    return [(first_id + i, TOPICS[i % len(TOPICS)], f"Tip {first_id + i}: take a short mindful break.",
+             vectors[i].tobytes()) for i in range(n)]
+
+
+def synthetic_log_frame(n, seed=0, start="2025-01-01"):
+    """Chat/mood log rows, one every 30 seconds."""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "timestamp": pd.date_range(start, periods=n, freq="30s").strftime("%Y-%m-%dT%H:%M:%S"),
+        "mood": rng.choice(MOODS, n),
+        "user_input": rng.choice(MESSAGES, n),
+        "ai_reply": "That sounds hard. Let's take it one step at a time together.",
+        "tip_topic": rng.choice(TOPICS, n),
+        "tip_text": "Try a slow breathing exercise.",
+        "tip_score": rng.random(n).round(3),
+    })
+
+
+def synthetic_frames(n, height=1080, width=1920, seed=0):
+    """JPEG-encoded camera frames."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n):
+        frame = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+        frames.append(cv2.imencode(".jpg", frame)[1].tobytes())
+    return frames
+
+
+# ── Stand-ins ──────────────────────────────────────────────────────
+
+class FakeLMStudio(BaseHTTPRequestHandler):
+    """LM Studio completions endpoint answering instantly, streamed or not."""
+
+    protocol_version = "HTTP/1.1"
+    reply = "You are not alone in this. Let's take it one step at a time."
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if request.get("stream"):
+            words = self.reply.split(" ")
+            events = [json.dumps({"choices": [{"text": w + " "}]}) for w in words]
+            body = "".join(f"data: {e}\n\n" for e in events + ["[DONE]"]).encode()
+        else:
+            body = json.dumps({"choices": [{"text": self.reply}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve(handler):
+    """Runs an HTTP stand-in on a free local port and yields its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FakeEmotionModel:
+    """Keras emotion model stand-in: a fixed cost per predict() call plus a small cost per face."""
+
+    CALL_OVERHEAD_S = 0.02  # graph dispatch and host/device copies in model.predict
+    PER_FACE_S = 0.001
+
+    def predict(self, batch, verbose=0):
+        time.sleep(self.CALL_OVERHEAD_S + self.PER_FACE_S * len(batch))
+        means = batch.reshape(len(batch), -1).mean(axis=1)
+        return np.column_stack([1.0 - means] + [np.full(len(batch), 0.1)] * 5 + [means])
+
+
+class FakeDeepFace:
+    """
+    DeepFace stand-in. Face detection is real OpenCV work on the whole frame;
+    classification goes through FakeEmotionModel, once per analyze() call or
+    once per batch through build_model().
+    """
+
+    model = FakeEmotionModel()
+
+    @classmethod
+    def extract_faces(cls, img_path, detector_backend="opencv", enforce_detection=True, align=True):
+        import cv2
+        gray = cv2.cvtColor(img_path, cv2.COLOR_BGR2GRAY)
+        cv2.equalizeHist(gray)
+        height, width = gray.shape
+        face = img_path[height // 4:height * 3 // 4, width // 4:width * 3 // 4, ::-1].astype(np.float32) / 255
+        return [{"face": face, "facial_area": {"x": width // 4, "y": height // 4, "w": width // 2, "h": height // 2},
+                 "confidence": 0.9}]
+
+    @classmethod
+    def build_model(cls, task=None, model_name=None):
+        return cls
+
+    @classmethod
+    def analyze(cls, img_path, actions=None, enforce_detection=True, detector_backend="opencv"):
+        import mood_detector
+        results = []
+        for face in cls.extract_faces(img_path, detector_backend, enforce_detection):
+            scores = cls.model.predict(mood_detector._emotion_input(face["face"])[np.newaxis, ..., np.newaxis])[0]
+            scores = 100 * scores / scores.sum()
+            results.append({"emotion": dict(zip(mood_detector.EMOTION_LABELS, scores)),
+                            "dominant_emotion": mood_detector.EMOTION_LABELS[int(np.argmax(scores))],
+                            "region": face["facial_area"]})
+        return results
+
+
+def fake_tidb(rows):
+    """In-memory SQLite engine with the mental_health_tips schema, standing in for TiDB."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE mental_health_tips (id INTEGER PRIMARY KEY, topic TEXT, "
+                          "tip_text TEXT, embedding BLOB, text_hash TEXT)"))
+        conn.execute(text("INSERT INTO mental_health_tips VALUES (:id, :topic, :tip_text, :embedding, :id)"),
+                     [{"id": r[0], "topic": r[1], "tip_text": r[2], "embedding": r[3]} for r in rows])
+    return engine
+
+
+# ── Benchmarks ─────────────────────────────────────────────────────
+
+@benchmark("tip_retrieval")
+def bench_tip_retrieval(config):
+    from tip_index import TipIndex, encode_int8
+    results = {}
+    queries = synthetic_embeddings(200, config.dim, seed=1)
+    for n in config.tip_sizes:
+        if n <= 100000:
+            # Full load from the database stand-in, then a top-1 search per query
+            engine = fake_tidb(synthetic_tip_rows(n, config.dim))
+            index = TipIndex(engine, version_column="text_hash", max_age=None)
+            results[f"refresh_full_{n}"] = per_op(lambda: index.refresh(full=True), 1, repeat=2)
+            engine.dispose()
+        else:
+            # Too large for SQLite round trips here; filled in chunks straight from the generator
+            index = TipIndex(None, max_age=None)
+            for first in range(0, n, 100000):
+                rows = synthetic_tip_rows(min(100000, n - first), config.dim, seed=first, first_id=first + 1)
+                index._upsert(rows, {})
+                del rows
+            index._last_refresh = time.monotonic()
+        count = 200 if n <= 100000 else 20
+        results[f"search_{n}"] = per_op(lambda: [index.search(q, k=1) for q in queries[:count]], count)
+        del index
+        # Same tips as int8 codes (TipIndex(quantized=True)), scored without re-ranking
+        index = TipIndex(None, max_age=None, quantized=True)
+        for first in range(0, n, 100000):
+            rows = synthetic_tip_rows(min(100000, n - first), config.dim, seed=first, first_id=first + 1)
+            index._upsert([(key, topic, tip, encode_int8(np.frombuffer(emb, dtype=np.float32)))
+                           for key, topic, tip, emb in rows], {})
+            del rows
+        index._last_refresh = time.monotonic()
+        results[f"search_int8_{n}"] = per_op(lambda: [index.search(q, k=1) for q in queries[:count]], count)
+        del index
+    return results
+
+
+@benchmark("logs")
+def bench_logs(config):
+    from data_exporter import export_logs_to_csv, get_all_logs
+    from log_writer import close_all
+    n = config.log_rows
+    frame = synthetic_log_frame(n)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "mood_logs.csv")
+    try:
+        results = {"append_row": per_op(lambda: export_logs_to_csv("mood", frame, path), n, repeat=1)}
+        results["read_all_row"] = per_op(lambda: get_all_logs(path), n)
+        # One day out of the log, served through the offset index after the first call
+        day = frame["timestamp"].iloc[n // 2][:10]
+        get_all_logs(path, start=day, end=f"{day}T23:59:59")
+        results["read_day"] = per_op(lambda: get_all_logs(path, start=day, end=f"{day}T23:59:59"), 1)
+        results["read_filtered_row"] = per_op(
+            lambda: get_all_logs(path, columns=["timestamp", "mood"], filters=[("mood", "==", "sad")]), n)
+        return results
+    finally:
+        close_all()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@benchmark("webhook")
+def bench_webhook(config):
+    import whatsapp_integration
+    n = config.webhook_requests
+    client = whatsapp_integration.app.test_client()
+    forms = [{"Body": MESSAGES[i % len(MESSAGES)], "From": f"whatsapp:+1555{i:07d}",
+              "MessageSid": f"SM{i:032d}"} for i in range(n)]
+
+    def post_all():
+        for form in forms:
+            client.post("/webhook", data=form)
+
+    results = {
+        "intent_match": per_op(lambda: [whatsapp_integration.router.match(m) for m in MESSAGES * 1000],
+                               1000 * len(MESSAGES)),
+        "sync_request": per_op(post_all, n),
+    }
+    # Free-text replies: LLM pipeline and conversation history against the LM Studio stand-in
+    with serve(FakeLMStudio) as url, contextlib.redirect_stdout(io.StringIO()):
+        base_url = whatsapp_integration.LLM_OPTIONS.get("base_url")
+        whatsapp_integration.LLM_OPTIONS["base_url"] = url + "/v1"
+        try:
+            texts = ["work has been overwhelming lately", "my friend said something that hurt"]
+            count = n // 10
+            results["compose_llm_reply"] = per_op(
+                lambda: [whatsapp_integration.compose_reply(texts[i % 2], session_id=f"bench{i % 50}")
+                         for i in range(count)], count)
+        finally:
+            if base_url is None:
+                whatsapp_integration.LLM_OPTIONS.pop("base_url")
+            else:
+                whatsapp_integration.LLM_OPTIONS["base_url"] = base_url
+    return results
+
+
+@benchmark("reminders")
+def bench_reminders(config):
+    import notification_system
+    from reminder_scheduler import ReminderScheduler
+    n = config.reminders
+    directory = tempfile.mkdtemp()
+    fired = []
+    try:
+        # set_reminder through the shared scheduler, pointed at a scratch database
+        scheduler = ReminderScheduler(os.path.join(directory, "set.db"), dispatch=fired.extend).start()
+        previous, notification_system._scheduler = notification_system._scheduler, scheduler
+        later = datetime.datetime.now() + datetime.timedelta(days=1)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = {"set_reminder": per_op(
+                    lambda: [notification_system.set_reminder("Drink some water!", later) for _ in range(1000)],
+                    1000, repeat=1)}
+        finally:
+            notification_system._scheduler = previous
+            scheduler.close()
+
+        scheduler = ReminderScheduler(os.path.join(directory, "bulk.db"), dispatch=fired.extend)
+        now = time.time()
+        items = [("Take a deep breath", now + (i % 3600)) for i in range(n)]
+        results["schedule_many_item"] = per_op(lambda: scheduler.schedule_many(items), n, repeat=1)
+        results["dispatch_item"] = per_op(lambda: scheduler.run_pending(now=now + 3600), n, repeat=1)
+        scheduler.close()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@benchmark("mood_detector")
+def bench_mood_detector(config):
+    from unittest.mock import patch
+    import mood_detector
+    frames = synthetic_frames(config.frames)
+    # Decoding, downscaling and face cropping are real; the emotion model is stood in for
+    with patch.object(mood_detector, "DeepFace", FakeDeepFace):
+        return {
+            "single_image": per_op(lambda: [mood_detector.detect_mood_from_image(f) for f in frames], len(frames)),
+            "batch_image": per_op(lambda: mood_detector.detect_moods_batch(frames), len(frames)),
+        }
+
+
+# ── Results and baseline ───────────────────────────────────────────
+
+def run(names, config):
+    """
+    Runs the selected benchmarks; a failing one is recorded and the rest still run.
+    Returns:
+        dict: Run metadata and {benchmark: {metric: seconds}} under "results".
+    """
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "quick": config.quick,
+        "results": {},
+        "errors": {},
+    }
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        start = time.perf_counter()
+        try:
+            report["results"][name] = BENCHMARKS[name](config)
+        except Exception as e:
+            report["errors"][name] = f"{type(e).__name__}: {e}"
+            print(f"  failed: {report['errors'][name]}")
+            continue
+        for metric, value in report["results"][name].items():
+            print(f"  {metric:<24}{format_seconds(value):>12}")
+        print(f"  ({time.perf_counter() - start:.1f}s)")
+    return report
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares a run against a baseline run.
+    Args:
+        report (dict): Output of run().
+        baseline (dict): A previously saved run.
+        threshold (float): Allowed slowdown, e.g. 0.25 for 25%.
+    Returns:
+        list: Dicts with benchmark, metric, baseline, current, change (ratio - 1)
+        and status ("ok", "faster" or "regression") for metrics present in both.
+    """
+    rows = []
+    for name, metrics in report["results"].items():
+        for metric, current in metrics.items():
+            previous = baseline.get("results", {}).get(name, {}).get(metric)
+            if not previous:
+                continue
+            change = current / previous - 1
+            status = "regression" if change > threshold else "faster" if change < -threshold else "ok"
+            rows.append({"benchmark": name, "metric": metric, "baseline": previous,
+                         "current": current, "change": change, "status": status})
+    return rows
+
+
+def format_seconds(value):
+    if value >= 1:
+        return f"{value:.2f} s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.2f} ms"
+    return f"{value * 1e6:.2f} us"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks with baseline comparison.")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="Smaller data sizes for a fast check.")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Where to write this run's JSON results.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store this run as the baseline.")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("BENCH_THRESHOLD", DEFAULT_THRESHOLD)),
+                        help="Allowed slowdown per metric before it counts as a regression (0.25 = 25%%).")
+    parser.add_argument("--tip-sizes", help="Comma-separated tip counts (default 1000,100000,1000000).")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Embedding dimensions.")
+    config = parser.parse_args(argv)
+    if config.tip_sizes:
+        config.tip_sizes = [int(n) for n in config.tip_sizes.split(",")]
+    else:
+        config.tip_sizes = [1000, 100000] if config.quick else [1000, 100000, 1000000]
+    config.log_rows = 20000 if config.quick else 200000
+    config.webhook_requests = 200 if config.quick else 2000
+    config.reminders = 20000 if config.quick else 200000
+    config.frames = 4 if config.quick else 16
+    return config
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    names = config.only.split(",") if config.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(unknown)}")
+        return 2
+
+    report = run(names, config)
+    with open(config.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {config.output}")
+
+    regressions = []
+    if os.path.exists(config.baseline):
+        with open(config.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != config.quick:
+            print("Note: baseline and this run used different sizes (--quick); only shared metrics are compared.")
+        rows = compare(report, baseline, config.threshold)
+        print(f"\nAgainst {config.baseline} ({baseline.get('created')}), threshold {config.threshold:.0%}:")
+        for row in rows:
+            print(f"  {row['benchmark'] + '.' + row['metric']:<40}{format_seconds(row['baseline']):>12}"
+                  f"{format_seconds(row['current']):>12}{row['change']:>+9.1%}  {row['status']}")
+        regressions = [row for row in rows if row["status"] == "regression"]
+    else:
+        print(f"No baseline at {config.baseline}; run with --save-baseline to create one.")
+
+    if config.save_baseline:
+        shutil.copyfile(config.output, config.baseline)
+        print(f"Baseline saved to {config.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {config.threshold:.0%}.")
+        return 1
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import instrumentation
+
+_DONE = object()
+
+
+class ChatTurnPipeline:
+    """
+    Runs one chat turn with its stages overlapped.
+
+    The LLM request and the tip lookup run concurrently, each on its own
+    worker pool, the caller's thread only renders streamed tokens, and speech
+    and logging are handed to a background queue so they never delay the
+    reply. Each blocking stage has its own timeout; a stage that overruns is
+    reported in "errors" and left to finish in the background. Separate pools
+    keep LLM calls that are still running after their timeout from delaying
+    the tip lookups of other sessions.
+    """
+
+    def __init__(self, generate_reply, find_tip, speak=None, log=None,
+                 llm_timeout=60.0, tip_timeout=5.0, llm_workers=4, tip_workers=4):
+        """
+        Args:
+            generate_reply (callable): f(user_input, on_token) -> reply text; also
+                given context= when run() is called with conversation context.
+            find_tip (callable): f(user_input) -> (topic, tip_text, score) or None.
+            speak (callable): Optional f(reply) run off the critical path.
+            log (callable): Optional f(result) run off the critical path.
+            llm_timeout (float): Seconds to wait for the complete reply.
+            tip_timeout (float): Seconds to wait for the tip, counted from turn start.
+            llm_workers (int): Concurrent LLM requests.
+            tip_workers (int): Concurrent tip lookups.
+        """
+        self.generate_reply = generate_reply
+        self.find_tip = find_tip
+        self.speak = speak
+        self.log = log
+        self.llm_timeout = llm_timeout
+        self.tip_timeout = tip_timeout
+        self._llm_pool = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="chat-llm")
+        self._tip_pool = ThreadPoolExecutor(max_workers=tip_workers, thread_name_prefix="chat-tip")
+        # One worker keeps speech and log writes in turn order
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-side")
+
+    def run(self, user_input, on_token=None, context=None):
+        """
+        Processes a single user message.
+        Args:
+            user_input (str): The user's message.
+            on_token (callable): Called on the caller's thread with the reply so far.
+            context (str): Earlier conversation for the LLM; the tip lookup
+                only sees user_input.
+        Returns:
+            dict: ai_reply, topic, tip_text, tip_score, per-stage timings (seconds)
+            and stage errors.
+        """
+        start = time.perf_counter()
+        result = {"user_input": user_input, "ai_reply": "", "topic": "", "tip_text": "",
+                  "tip_score": 0.0, "timings": {}, "errors": {}}
+
+        tip_future = self._tip_pool.submit(self._timed, "tip", self.find_tip, user_input)
+        tokens = queue.Queue()
+        llm_future = self._llm_pool.submit(self._run_llm, user_input, tokens, context)
+
+        result["ai_reply"] = self._drain_tokens(tokens, llm_future, start, on_token, result)
+
+        try:
+            tip, elapsed = tip_future.result(timeout=max(0.0, self.tip_timeout - (time.perf_counter() - start)))
+            result["timings"]["tip"] = elapsed
+            if tip:
+                result["topic"], result["tip_text"], result["tip_score"] = tip
+        except FutureTimeout:
+            result["errors"]["tip"] = f"timed out after {self.tip_timeout:.1f}s"
+        except Exception as e:
+            result["errors"]["tip"] = str(e)
+
+        result["timings"]["turn"] = time.perf_counter() - start
+        for stage, seconds in result["timings"].items():
+            instrumentation.observe(f"chat_{stage}", seconds, error=stage in result["errors"])
+        for stage in result["errors"].keys() - result["timings"].keys():
+            instrumentation.observe(f"chat_{stage}", result["timings"]["turn"], error=True)
+        if self.speak and result["ai_reply"]:
+            self._background.submit(self._quietly, self.speak, result["ai_reply"])
+        if self.log:
+            self._background.submit(self._quietly, self.log, result)
+        return result
+
+    def shutdown(self, wait=True):
+        self._llm_pool.shutdown(wait=wait)
+        self._tip_pool.shutdown(wait=wait)
+        self._background.shutdown(wait=wait)
+
+    def _run_llm(self, user_input, tokens, context=None):
+        # Profiled here, on the worker: cProfile only sees the thread that enables it
+        try:
+            with instrumentation.profiler.profile("chat_llm"):
+                if context is None:
+                    reply = self.generate_reply(user_input, tokens.put)
+                else:
+                    reply = self.generate_reply(user_input, tokens.put, context=context)
+            tokens.put(_DONE)
+            return reply
+        except Exception:
+            tokens.put(_DONE)
+            raise
+
+    def _drain_tokens(self, tokens, llm_future, start, on_token, result):
+        partial = ""
+        deadline = start + self.llm_timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                result["errors"]["llm"] = f"timed out after {self.llm_timeout:.1f}s"
+                return partial or "(LM Studio took too long to answer. Please try again.)"
+            try:
+                item = tokens.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            partial = item
+            if "llm_first_token" not in result["timings"]:
+                result["timings"]["llm_first_token"] = time.perf_counter() - start
+            if on_token:
+                on_token(partial)
+
+        result["timings"]["llm"] = time.perf_counter() - start
+        try:
+            return llm_future.result().strip()
+        except Exception as e:
+            result["errors"]["llm"] = str(e)
+            return f"(LM Studio error: {e})"
+
+    @staticmethod
+    def _timed(stage, fn, *args):
+        start = time.perf_counter()
+        with instrumentation.profiler.profile(f"chat_{stage}"):
+            value = fn(*args)
+        return value, time.perf_counter() - start
+
+    @staticmethod
+    def _quietly(fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Background chat task failed: {e}")
+
+
+if __name__ == "__main__":
+    # Example usage with slow stand-in stages
+    def slow_reply(text, on_token):
+        reply = ""
+        for word in "Try to get some rest tonight.".split():
+            time.sleep(0.2)
+            reply += word + " "
+            on_token(reply)
+        return reply
+
+    def slow_tip(text):
+        time.sleep(0.5)
+        return ("sleep", "Keep a regular bedtime", 0.82)
+
+    pipeline = ChatTurnPipeline(slow_reply, slow_tip, speak=lambda r: time.sleep(1.0))
+    turn = pipeline.run("I can't sleep")
+    print(turn["ai_reply"], "|", turn["tip_text"])
+    print({stage: f"{t:.2f}s" for stage, t in turn["timings"].items()}, "(serial would be ~2.7s)")
+    pipeline.shutdown()
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def cache_key(model, template, params, text):
+    """
+    Builds the exact-match key for a completion.
+    Args:
+        model (str): Model name.
+        template (str): Prompt template the text is inserted into.
+        params (dict): Sampling parameters (max_tokens, temperature, ...).
+        text (str): The user text filled into the template.
+    Returns:
+        tuple: (namespace hash, entry hash). Entries only ever match within
+        the same namespace, i.e. the same model, template and parameters.
+    """
+    namespace = hashlib.sha256(
+        json.dumps([model, template, params], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    normalized = " ".join(text.lower().split())
+    return namespace, hashlib.sha256(f"{namespace}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("namespace", "text", "reply", "embedding", "created", "latency")
+
+    def __init__(self, namespace, text, reply, embedding, created, latency):
+        self.namespace = namespace
+        self.text = text
+        self.reply = reply
+        self.embedding = embedding
+        self.created = created
+        self.latency = latency
+
+
+class CompletionCache:
+    """
+    TTL + LRU cache of LLM completions, optionally matching semantically.
+
+    Exact hits are keyed on model, prompt template, sampling parameters and
+    normalized user text. With an embed function and similarity threshold,
+    a miss falls back to the most similar cached text in the same namespace.
+    Entries are written through to SQLite so the cache survives restarts.
+    """
+
+    def __init__(self, path=None, ttl=24 * 3600, max_entries=2000, embed=None,
+                 similarity_threshold=None):
+        """
+        Args:
+            path (str): SQLite file used for persistence. None keeps the cache in memory.
+            ttl (float): Seconds an entry stays valid.
+            max_entries (int): Maximum number of cached completions.
+            embed (callable): f(text) -> vector; enables semantic matching.
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.counters = {"hits": 0, "semantic_hits": 0, "misses": 0, "saved_latency": 0.0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, namespace TEXT, text TEXT, "
+                "reply TEXT, embedding BLOB, created REAL, latency REAL)"
+            )
+            self._db.commit()
+            self._load()
+
+    @property
+    def semantic(self):
+        return self.embed is not None and self.similarity_threshold is not None
+
+    def get(self, text, model, template, params):
+        """
+        Looks up a cached reply.
+        Returns:
+            str: The cached reply, or None on a miss.
+        """
+        namespace, key = cache_key(model, template, params, text)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                self.counters["saved_latency"] += entry.latency
+                return entry.reply
+
+        if self.semantic:
+            match = self._nearest(namespace, self._embedding(text))
+            if match is not None:
+                with self._lock:
+                    self.counters["semantic_hits"] += 1
+                    self.counters["saved_latency"] += match.latency
+                return match.reply
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, text, reply, model, template, params, latency=0.0):
+        """
+        Stores a reply.
+        Args:
+            latency (float): Seconds it took to produce the reply; credited as
+                saved time whenever the entry is reused.
+        """
+        namespace, key = cache_key(model, template, params, text)
+        embedding = self._embedding(text) if self.semantic else None
+        entry = _Entry(namespace, text, reply, embedding, time.time(), latency)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, namespace, text, reply,
+                     embedding.tobytes() if embedding is not None else None, entry.created, latency),
+                )
+                self._db.executemany("DELETE FROM completions WHERE key = ?", [(k,) for k in evicted])
+                self._db.commit()
+
+    def get_or_compute(self, text, compute, model, template, params, cacheable=None):
+        """
+        Returns a cached reply or computes, caches and returns a new one.
+        Args:
+            compute (callable): f() -> reply, called only on a miss.
+            cacheable (callable): Optional f(reply) -> bool; a computed reply
+                is only stored when it returns True (e.g. not after an error).
+        Returns:
+            tuple: (reply, True if it came from the cache)
+        """
+        reply = self.get(text, model, template, params)
+        if reply is not None:
+            return reply, True
+        start = time.perf_counter()
+        reply = compute()
+        if cacheable is None or cacheable(reply):
+            self.put(text, reply, model, template, params, latency=time.perf_counter() - start)
+        return reply, False
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters, hit rate, total saved latency and size.
+        """
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ── internals ──────────────────────────────────────────────────
+    def _embedding(self, text):
+        vec = np.asarray(self.embed(text), dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _expired(self, entry, now=None):
+        return (now or time.time()) - entry.created > self.ttl
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            del self._entries[key]
+            return None
+        return entry
+
+    def _nearest(self, namespace, query):
+        with self._lock:
+            now = time.time()
+            candidates = [e for e in self._entries.values()
+                          if e.namespace == namespace and e.embedding is not None
+                          and e.embedding.shape == query.shape and not self._expired(e, now)]
+        if not candidates:
+            return None
+        scores = np.vstack([e.embedding for e in candidates]) @ query
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity_threshold else None
+
+    def _load(self):
+        cutoff = time.time() - self.ttl
+        self._db.execute("DELETE FROM completions WHERE created < ?", (cutoff,))
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT key, namespace, text, reply, embedding, created, latency FROM completions "
+            "ORDER BY created DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for key, namespace, text, reply, emb, created, latency in reversed(rows):
+            embedding = np.frombuffer(emb, dtype=np.float32) if emb is not None else None
+            self._entries[key] = _Entry(namespace, text, reply, embedding, created, latency)
+
+
+if __name__ == "__main__":
+    # Example usage with a toy embedding and a slow stand-in model
+    def toy_embed(text):
+        vec = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            vec[hash(word) % 64] += 1
+        return vec
+
+    cache = CompletionCache(embed=toy_embed, similarity_threshold=0.8)
+    params = {"max_tokens": 150, "temperature": 0.7}
+    for prompt in ["I'm stressed about exams", "i'm STRESSED about exams", "I'm so stressed about exams", "hi"]:
+        reply, cached = cache.get_or_compute(prompt, lambda: time.sleep(0.5) or "Take it one step at a time.",
+                                             "mistral-7b-instruct-v0.2", "User: {}\nAI:", params)
+        print(f"{prompt!r}: cached={cached}")
+    print(cache.stats())
@@ -1,33 +1,67 @@
 
 import pandas as pd
 import os
+from log_reader import iter_logs
+from log_store import filter_frame, has_dataset, log_files, normalize_timestamps, read_logs
+from log_writer import flush_path, get_log_writer
 
 def export_logs_to_csv(log_type, data, filename):
     """
     Exports data to a CSV file.
+    Rows go through the shared log writer for the file, so exports never
+    interleave with rows other sessions are appending at the same time.
     Args:
         log_type (str): Type of log (e.g., "chat", "mood", "journal").
         data (pd.DataFrame): DataFrame containing the data to export.
         filename (str): Name of the CSV file to export to.
     """
     try:
-        file_exists = os.path.isfile(filename)
-        data.to_csv(filename, mode="a", index=False, header=not file_exists)
+        writer = get_log_writer(filename, list(data.columns))
+        writer.write_many(data.astype(object).where(data.notna(), "").to_dict("records"))
+        writer.flush()
         return f"Successfully exported {log_type} logs to {filename}"
     except Exception as e:
         return f"Error exporting {log_type} logs: {e}"
 
-def get_all_logs(log_file_path):
+def get_all_logs(log_file_path, start=None, end=None, columns=None, filters=None):
     """
-    Reads all logs from a given CSV file.
+    Reads logs from a given CSV file.
+    If the log has been compacted into Parquet (see log_store.compact_log),
+    the dataset and the not-yet-compacted CSV tail are read together, with
+    time bounds and filters pushed down into the Parquet scan. Otherwise a
+    time range or column list streams the CSV in chunks through the sidecar
+    offset index, so only the requested region is parsed. Files the log was
+    rotated to are read too, oldest first.
     Args:
         log_file_path (str): Path to the log CSV file.
+        start (str | datetime): Optional inclusive lower timestamp bound.
+        end (str | datetime): Optional inclusive upper timestamp bound.
+        columns (list): Optional columns to return.
+        filters (list): Optional (column, op, value) predicates, e.g. [("mood", "==", "sad")].
     Returns:
-        pd.DataFrame: DataFrame containing the logs, or an empty DataFrame if file not found.
+        pd.DataFrame: DataFrame containing the logs (timestamp as datetime64[ns]),
+        or an empty DataFrame if file not found.
     """
-    if os.path.isfile(log_file_path):
-        return pd.read_csv(log_file_path)
-    return pd.DataFrame()
+    flush_path(log_file_path)
+    if has_dataset(log_file_path):
+        return read_logs(log_file_path, start=start, end=end, columns=columns, filters=filters)
+    paths = [path for path in log_files(log_file_path) if os.path.getsize(path)]
+    if not paths:
+        return pd.DataFrame()
+    if start is None and end is None and columns is None and not filters:
+        return normalize_timestamps(pd.concat([pd.read_csv(path) for path in paths], ignore_index=True))
+    needed = None
+    if columns and filters:
+        needed = list(dict.fromkeys(list(columns) + [column for column, _, _ in filters]))
+    chunks = []
+    for path in paths:
+        for chunk in iter_logs(path, start=start, end=end, columns=needed or columns):
+            if filters:
+                chunk = chunk[filter_frame(chunk, filters)]
+            chunks.append(chunk[columns] if columns else chunk)
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return normalize_timestamps(pd.concat(chunks, ignore_index=True))
 
 if __name__ == "__main__":
     # Example Usage:
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long callers wait to check out a connection
+    and how often the checkout timeout is hit.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = {"checkouts": 0, "timeouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+        self._metrics_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeout:
+            with self._metrics_lock:
+                self.metrics["timeouts"] += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._metrics_lock:
+            self.metrics["checkouts"] += 1
+            self.metrics["total_wait"] += wait
+            self.metrics["max_wait"] = max(self.metrics["max_wait"], wait)
+        return conn
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+def tidb_url_from_env():
+    """
+    Builds the TiDB connection URL and driver arguments from TIDB_* variables.
+    Returns:
+        tuple: (sqlalchemy URL, connect_args dict)
+    """
+    url = URL.create(
+        "mysql+pymysql",
+        username=os.getenv("TIDB_USER"),
+        password=os.getenv("TIDB_PASSWORD"),
+        host=os.getenv("TIDB_HOST"),
+        port=int(os.getenv("TIDB_PORT", 4000)),
+        database=os.getenv("TIDB_DATABASE"),
+    )
+    connect_args = {"ssl_verify_identity": True, "ssl_ca": os.getenv("TIDB_CA_PATH")}
+    return url, connect_args
+
+
+def get_engine(url=None, connect_args=None, pool_size=5, max_overflow=10, pool_timeout=10.0,
+               pool_recycle=1800, pre_ping=True):
+    """
+    Returns the process-wide pooled engine for a database, creating it on first use.
+
+    Engines are cached per URL and driver arguments, so every Streamlit rerun,
+    session and module shares one pool instead of opening new TLS connections.
+    Pool settings only apply when the engine is first created.
+    Args:
+        url (str | sqlalchemy.engine.URL): Database URL. Defaults to TIDB_* env settings.
+        connect_args (dict): Extra DB-API connect() arguments.
+        pool_size (int): Connections kept open in the pool.
+        max_overflow (int): Extra connections allowed under load.
+        pool_timeout (float): Seconds to wait for a free connection before failing.
+        pool_recycle (int): Seconds after which idle connections are replaced.
+        pre_ping (bool): Test connections on checkout and replace dead ones.
+    Returns:
+        sqlalchemy.engine.Engine: The shared engine.
+    """
+    if url is None:
+        url, env_args = tidb_url_from_env()
+        connect_args = {**env_args, **(connect_args or {})}
+    connect_args = connect_args or {}
+    if isinstance(url, URL):
+        url_key = url.render_as_string(hide_password=False)
+    else:
+        url_key = url
+    key = (url_key, tuple(sorted((k, repr(v)) for k, v in connect_args.items())))
+
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(
+                url,
+                connect_args=connect_args,
+                poolclass=TimedQueuePool,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=pre_ping,
+            )
+            _engines[key] = engine
+        return engine
+
+
+def get_connection(url=None, connect_args=None):
+    """
+    Checks out a raw DB-API connection from the shared pool.
+    Calling close() on it returns it to the pool instead of disconnecting.
+    """
+    return get_engine(url, connect_args).raw_connection()
+
+
+def pool_stats(engine):
+    """
+    Args:
+        engine (sqlalchemy.engine.Engine): Engine created by get_engine().
+    Returns:
+        dict: Checkout count, timeouts, mean/max wait and current pool usage.
+    """
+    pool = engine.pool
+    stats = dict(getattr(pool, "metrics", {}))
+    checkouts = stats.get("checkouts", 0)
+    stats["mean_wait"] = stats.get("total_wait", 0.0) / checkouts if checkouts else 0.0
+    stats["size"] = pool.size()
+    stats["checked_out"] = pool.checkedout()
+    stats["overflow"] = pool.overflow()
+    return stats
+
+
+def dispose_all():
+    """Closes every pooled connection, e.g. before forking worker processes."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+if __name__ == "__main__":
+    # Example usage with a SQLite stand-in: reuse vs. a fresh engine per call
+    import tempfile
+    from sqlalchemy import text
+
+    db_path = os.path.join(tempfile.mkdtemp(), "pool_demo.db")
+    url = f"sqlite:///{db_path}"
+
+    start = time.perf_counter()
+    for _ in range(200):
+        with create_engine(url).connect() as conn:
+            conn.execute(text("SELECT 1"))
+    print(f"New engine per call: {(time.perf_counter() - start) * 5:.3f} ms/query")
+
+    engine = get_engine(url)
+    start = time.perf_counter()
+    for _ in range(200):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    print(f"Shared pool:         {(time.perf_counter() - start) * 5:.3f} ms/query")
+    print(pool_stats(engine))
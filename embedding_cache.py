@@ -0,0 +1,149 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Builds the cache key for a piece of text.
+    Args:
+        text (str): Raw user text.
+    Returns:
+        str: Lower-cased text with surrounding and repeated whitespace collapsed.
+    """
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Memoizing wrapper around a SentenceTransformer-style model.
+
+    Embeddings are cached under normalized text and evicted least-recently-used
+    once either the entry limit or the byte budget is exceeded.
+    """
+
+    def __init__(self, model, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            model: Object with an encode(texts) method (e.g. SentenceTransformer).
+            max_entries (int): Maximum number of cached embeddings.
+            max_bytes (int): Maximum total size of cached embeddings in bytes.
+        """
+        self.model = model
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+    def encode(self, text):
+        """
+        Returns the embedding for a single text, computing it only on a miss.
+        Args:
+            text (str): Text to embed.
+        Returns:
+            np.ndarray: float32 embedding (read-only, shared with the cache).
+        """
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts):
+        """
+        Embeds a batch of texts, sending only the cache misses to the model
+        in one batched call.
+        Args:
+            texts (list): Texts to embed.
+        Returns:
+            list: One float32 embedding per input text, in input order.
+        """
+        keys = [normalize_text(t) for t in texts]
+        results = [None] * len(keys)
+        missing = OrderedDict()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._entries.get(key)
+                if vec is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results[i] = vec
+                else:
+                    self.misses += 1
+                    missing.setdefault(key, []).append(i)
+
+        if missing:
+            # Embed the first original spelling of each distinct key
+            batch = [texts[positions[0]] for positions in missing.values()]
+            vectors = np.asarray(self.model.encode(batch), dtype=np.float32)
+            with self._lock:
+                for (key, positions), vec in zip(missing.items(), vectors):
+                    vec = np.array(vec, dtype=np.float32)
+                    vec.setflags(write=False)
+                    self._store(key, vec)
+                    for i in positions:
+                        results[i] = vec
+        return results
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters, hit rate and current cache size.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _store(self, key, vec):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        if vec.nbytes > self.max_bytes:
+            return
+        self._entries[key] = vec
+        self._bytes += vec.nbytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+
+if __name__ == "__main__":
+    # Example usage with the production model
+    import time
+    from sentence_transformers import SentenceTransformer
+
+    cache = EmbeddingCache(SentenceTransformer("all-MiniLM-L6-v2"))
+    phrases = ["I feel anxious", "can't sleep", "  I feel   ANXIOUS ", "exams stress me out"] * 25
+
+    start = time.perf_counter()
+    cache.encode_many(phrases)
+    print(f"Batch of {len(phrases)}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    cache.encode("I feel anxious")
+    print(f"Cached single phrase: {(time.perf_counter() - start) * 1000:.3f} ms")
+    print(cache.stats())
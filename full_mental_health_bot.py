@@ -1,38 +1,156 @@
-
 import streamlit as st
-import openai, datetime, pandas as pd, os
-from sqlalchemy import create_engine, text
-from sentence_transformers import SentenceTransformer
-import numpy as np
-from mood_detector import detect_mood_from_image
+import datetime, pandas as pd, os, time, uuid
+from functools import partial
+from inference_pool import MoodInferencePool, QueueFull
 from audio_utils import recognize_speech_from_mic, text_to_speech
+from tip_index import TipIndex, version_column_for
+from embedding_cache import EmbeddingCache
+from llm_client import generate_reply
+from chat_pipeline import ChatTurnPipeline
+from completion_cache import CompletionCache
+from db_pool import get_engine
+from log_writer import get_log_writer
+from mood_analytics import MoodAnalytics
+from session_store import SessionStore
+from history_search import HistoryIndex, KINDS
+from tts_service import get_tts_service
+import instrumentation
+import model_registry
 
 # ── Models & DB ────────────────────────────────────────────────────
-# Note: sentence-transformers and torch installation is problematic in this environment.
-# For now, we will proceed with the existing code, but this needs to be addressed for full functionality.
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# Heavy libraries (torch, TensorFlow, cv2, pyttsx3) are imported on first use
+# through model_registry, so pages that don't need them start instantly.
+@st.cache_resource
+def start_warm_up():
+    # Comma-separated components to preload in the background; empty disables it
+    names = [n for n in os.environ.get("WARM_UP_MODELS", "embedder").split(",") if n]
+    return model_registry.warm_up(names) if names else None
+
+start_warm_up()
 
-openai.api_base = "http://localhost:1234/v1"   # LM Studio server
-openai.api_key  = "not-needed"
+@st.cache_resource
+def get_embedder():
+    # Memoized embeddings shared by every session; repeated phrases skip the model
+    return EmbeddingCache(model_registry.get("embedder"), max_entries=5000)
 
-engine = create_engine(
+# Shared pooled engine: created once per process, not on every rerun
+engine = get_engine(
     "mysql+pymysql://DbYbZAnbhjP7LZB.root:PMo7rCUvUA5Kv9Id@"
     "gateway01.us-west-2.prod.aws.tidbcloud.com:4000/test?ssl_ca=/home/ubuntu/mental_health_ai/mental_health/isrgrootx1.pem"
 )
 
 LOG_FILE = "mood_logs.csv"
+LOG_FIELDS = ["timestamp", "mood", "user_input", "ai_reply", "tip_topic", "tip_text", "tip_score"]
+JOURNAL_FILE = "journal_logs.csv"
+JOURNAL_FIELDS = ["timestamp", "entry"]
+# Same single-user key as MoodAnalytics uses for logs without a user_id column
+HISTORY_USER = "local"
+
+def find_best_tip(tip_index, embedder, user_input):
+    with instrumentation.span("embedding"):
+        query = embedder.encode(user_input)
+    with instrumentation.span("tip_search"):
+        matches = tip_index.search(query, k=1)
+    if not matches:
+        return None
+    best = matches[0]
+    return best["topic"], best["tip_text"], best["score"]
+
+PROMPT_TEMPLATE = "You are a kind mental‑health assistant.\n{context}User: {user_input}\nAI:"
+LLM_MODEL = "mistral-7b-instruct-v0.2"
+LLM_PARAMS = {"max_tokens": 150, "temperature": 0.7}
+# Earlier turns get this many tokens of a 4k context, leaving room for the reply
+CONTEXT_TOKENS = 1024
+
+def llm_reply(completion_cache, user_input, on_token, context=""):
+    metrics = {}
+
+    def compute():
+        prompt = PROMPT_TEMPLATE.format(context=context, user_input=user_input)
+        reply, call_metrics = generate_reply(prompt, on_token=on_token, model=LLM_MODEL, **LLM_PARAMS)
+        metrics.update(call_metrics)
+        return reply
+
+    if context:
+        # Replies that depend on earlier turns are not reusable across conversations
+        return compute()
+    # Only replies produced without any error are reused by later (near-)duplicate prompts
+    reply, cached = completion_cache.get_or_compute(user_input, compute, LLM_MODEL, PROMPT_TEMPLATE, LLM_PARAMS,
+                                                    cacheable=lambda reply: not metrics["error"])
+    if cached:
+        on_token(reply)
+    return reply
+
+def log_turn(history, embedder, turn):
+    tip_text = turn["tip_text"]
+    if "tip" in turn["errors"]:
+        tip_text = f"(Tip error: {turn['errors']['tip']})"
+    log_row = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "mood": "",                 # mood tracking will be added later
+        "user_input": turn["user_input"],
+        "ai_reply": turn["ai_reply"],
+        "tip_topic": turn["topic"],
+        "tip_text": tip_text,
+        "tip_score": round(turn["tip_score"], 3),
+    }
+    # Buffered: rows are appended in batches by the writer's background thread
+    get_log_writer(LOG_FILE, LOG_FIELDS).write(log_row)
+    # The tip lookup already embedded this message, so the embedding cache answers
+    history.add(HISTORY_USER, turn["user_input"], embedder.encode(turn["user_input"]), kind="chat")
+
+@st.cache_resource
+def get_tip_index():
+    # One index per process, shared by every session and rerun.
+    # text_hash is maintained by tip_ingest, so edited tips are picked up too;
+    # tables that predate it only pick up new and deleted tips.
+    return TipIndex(engine, version_column=version_column_for(engine), max_age=300)
+
+@st.cache_resource
+def get_inference_pool():
+    # Worker processes load the emotion model once and are shared by all sessions
+    return MoodInferencePool(job_timeout=30.0)
+
+@st.cache_resource
+def get_mood_analytics():
+    return MoodAnalytics(LOG_FILE)
+
+@st.cache_resource
+def get_completion_cache():
+    # Near-duplicate prompts ("hi", "I'm stressed about exams") reuse earlier replies
+    return CompletionCache("completion_cache.db", ttl=24 * 3600, max_entries=2000,
+                           embed=get_embedder().encode, similarity_threshold=0.92)
+
+@st.cache_resource
+def get_history_index():
+    # Past chat messages and journal entries, searchable by meaning
+    return HistoryIndex()
+
+@st.cache_resource
+def get_session_store():
+    # Conversation history for every browser session, bounded in memory
+    return SessionStore(max_bytes=32 * 1024 * 1024, idle_ttl=2 * 3600)
+
+@st.cache_resource
+def get_turn_pipeline():
+    # Resolve the cached resources here, on the script thread, before workers use them
+    return ChatTurnPipeline(partial(llm_reply, get_completion_cache()),
+                            partial(find_best_tip, get_tip_index(), get_embedder()),
+                            speak=partial(text_to_speech, wait=False, interrupt=True),
+                            log=partial(log_turn, get_history_index(), get_embedder()),
+                            llm_timeout=60.0, tip_timeout=5.0)
 
 # --- Streamlit App --- #
-st.set_page_config(page_title=\'AI Mental Health Companion\', layout=\'wide\')
-st.title(\'🧠 AI Mental Health Companion\')
+st.set_page_config(page_title='AI Mental Health Companion', layout='wide')
+st.title('🧠 AI Mental Health Companion')
 
 # Sidebar for navigation
-st.sidebar.title(\'Navigation\')
-page = st.sidebar.radio(\'Go to\', [\'Chat\', \'Mood Tracker\', \'Journal\', \'Settings\'])
+st.sidebar.title('Navigation')
+page = st.sidebar.radio('Go to', ['Chat', 'Mood Tracker', 'Journal', 'Settings'])
 
-if page == \'Chat\':
-    st.header(\'💬 Chat with your Companion\')
-    user_input = st.text_input("How are you feeling today?", placeholder="e.g., I\'m feeling anxious about exams")
+if page == 'Chat':
+    st.header('💬 Chat with your Companion')
+    user_input = st.text_input("How are you feeling today?", placeholder="e.g., I'm feeling anxious about exams")
 
     if st.button("Speak"): # Voice input button
         st.info("Listening...")
@@ -41,88 +159,167 @@ if page == \'Chat\':
         user_input = speech_input # Use speech as input
 
     if user_input:
-        # 1️⃣  LM Studio reply (completion endpoint = plain text)
-        try:
-            res = openai.Completion.create(
-                model="mistral-7b-instruct-v0.2",
-                prompt=f"You are a kind mental‑health assistant.\nUser: {user_input}\nAI:",
-                max_tokens=150,
-                temperature=0.7,
+        reply_box = st.empty()
+        session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+        if st.session_state.get("last_turn", {}).get("user_input") == user_input:
+            # A rerun (e.g. another widget changed) shows the turn instead of repeating it
+            turn = st.session_state["last_turn"]
+        else:
+            # LLM reply and tip lookup run concurrently; speech and logging run in the background
+            sessions = get_session_store()
+            turn = get_turn_pipeline().run(
+                user_input,
+                on_token=lambda so_far: reply_box.write(f"🤖 AI: {so_far}▌"),
+                context=sessions.build_context(session_id, max_tokens=CONTEXT_TOKENS),
             )
-            ai_reply = res["choices"][0]["text"].strip()
-        except Exception as e:
-            ai_reply = f"(LM Studio error: {e})"
-
-        # 2️⃣  Best tip from TiDB
-        topic = tip_text = ""
-        tip_score = 0.0
-        try:
-            u_vec = embedder.encode(user_input)
-            with engine.connect() as conn:
-                rows = conn.execute(text("SELECT topic, tip_text, embedding FROM mental_health_tips"))
-                best_sim = -1
-                for tpc, txt, emb in rows:
-                    v = np.frombuffer(emb, dtype=np.float32)
-                    sim = np.dot(u_vec, v) / (np.linalg.norm(u_vec) * np.linalg.norm(v))
-                    if sim > best_sim:
-                        best_sim, topic, tip_text = sim, tpc, txt
-                tip_score = best_sim
-        except Exception as e:
-            tip_text = f"(Tip error: {e})"
-
-        # 3️⃣  Show results
-        st.write(f"\n🤖 AI: {ai_reply}")
+            sessions.append(session_id, "user", user_input)
+            if "llm" not in turn["errors"]:
+                sessions.append(session_id, "assistant", turn["ai_reply"])
+            st.session_state["last_turn"] = turn
+        ai_reply, topic, tip_text, tip_score = (
+            turn["ai_reply"], turn["topic"], turn["tip_text"], turn["tip_score"]
+        )
+        if "tip" in turn["errors"]:
+            tip_text = f"(Tip error: {turn['errors']['tip']})"
+
+        # Show results
+        reply_box.write(f"🤖 AI: {ai_reply}")
         if tip_text:
             st.write(f"💡 Tip ({topic}, {tip_score:.2f}): {tip_text}\n")
+            # Tips repeat across users, so their audio is rendered once and served as a file
+            if "tip" not in turn["errors"]:
+                tip_audio = get_tts_service().synthesize(tip_text)
+                if tip_audio.done() and not tip_audio.exception():
+                    st.audio(tip_audio.result())
         else:
             st.write("💡 No tip found.\n")
+        if "llm_first_token" in turn["timings"]:
+            st.caption(f"First token in {turn['timings']['llm_first_token']:.2f}s · "
+                       f"reply in {turn['timings']['llm']:.2f}s")
 
-        # Text to speech for AI reply
-        text_to_speech(ai_reply)
-
-        # 4️⃣  Log to CSV
-        log_row = {
-            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
-            "mood": "",                 # mood tracking will be added later
-            "user_input": user_input,
-            "ai_reply": ai_reply,
-            "tip_topic": topic,
-            "tip_text": tip_text,
-            "tip_score": round(tip_score, 3),
-        }
-        df = pd.DataFrame([log_row])
-        header_needed = not os.path.isfile(LOG_FILE)
-        df.to_csv(LOG_FILE, mode="a", index=False, header=header_needed)
-
-elif page == \'Mood Tracker\':
-    st.header(\'😊 Mood Tracker\')
-    st.write(\'Upload a selfie to detect your mood:\')
+elif page == 'Mood Tracker':
+    st.header('😊 Mood Tracker')
+    st.write('Upload a selfie to detect your mood:')
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
 
     if uploaded_file is not None:
-        # Save the uploaded file temporarily
-        with open(os.path.join("temp_image.jpg"), "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        st.image(uploaded_file, caption=\'Uploaded Image.\', use_column_width=True)
-        st.write("Detecting mood...")
-        mood_result = detect_mood_from_image("temp_image.jpg")
-        
-        if "error" in mood_result:
-            st.error(f"Error detecting mood: {mood_result[\"error\"]}")
-        else:
+        st.image(uploaded_file, caption='Uploaded Image.', use_column_width=True)
+        # Inference runs in the worker pool; this session only polls for its result
+        pool = get_inference_pool()
+        upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+        if st.session_state.get("mood_upload") != upload_key:
+            try:
+                st.session_state["mood_job"] = pool.submit(uploaded_file.getvalue())
+                st.session_state["mood_upload"] = upload_key
+                st.session_state.pop("mood_result", None)
+            except QueueFull:
+                st.warning("Mood detection is busy right now. Please try again in a moment.")
+
+        mood_result = st.session_state.get("mood_result")
+        job_id = st.session_state.get("mood_job")
+        if mood_result is None and job_id:
+            job = pool.poll(job_id)
+            if job["status"] in ("queued", "running"):
+                st.write("Detecting mood...")
+                time.sleep(0.5)
+                st.rerun()
+            pool.forget(job_id)
+            faces = job["result"]
+            if job["status"] != "done":
+                mood_result = {"error": job["error"]}
+            elif isinstance(faces, dict):
+                mood_result = faces
+            elif faces:
+                mood_result = faces[0]["emotion"]
+            else:
+                mood_result = {"error": "No face detected in the image."}
+            st.session_state["mood_result"] = mood_result
+
+        if mood_result and "error" in mood_result:
+            st.error(f"Error detecting mood: {mood_result['error']}")
+        elif mood_result:
             st.write("Detected Emotions:")
             for emotion, score in mood_result.items():
                 st.write(f"- {emotion}: {score:.2f}%")
-            # You can add logic here to update mood logs in TiDB
 
-elif page == \'Journal\':
-    st.header(\'✍️ Daily Journal\')
-    st.write(\'Journaling functionality coming soon!\')
+            # Log the dominant emotion once per upload (the page reruns on every interaction)
+            if st.session_state.get("logged_upload") != upload_key:
+                st.session_state["logged_upload"] = upload_key
+                get_log_writer(LOG_FILE, LOG_FIELDS).write({
+                    "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "mood": max(mood_result, key=mood_result.get),
+                })
+
+    # Trends come from incrementally maintained daily rollups, not a rescan of the log
+    analytics = get_mood_analytics()
+    analytics.update()
+    daily = analytics.daily()
+    if not daily.empty:
+        st.subheader('📈 Your trends')
+        streaks = analytics.streaks()
+        col1, col2 = st.columns(2)
+        col1.metric("Current streak", f"{streaks['current']} days")
+        col2.metric("Longest streak", f"{streaks['longest']} days")
+        st.line_chart(analytics.rolling(window=7)[["messages"]].tail(90))
+        emotion_columns = [c for c in daily.columns if c not in ("messages", "mood_entries", "mean_tip_score")]
+        if emotion_columns:
+            st.bar_chart(daily[emotion_columns].tail(30))
+
+elif page == 'Journal':
+    st.header('✍️ Daily Journal')
+    history = get_history_index()
+    with st.form("journal_entry", clear_on_submit=True):
+        entry = st.text_area("What's on your mind today?")
+        if st.form_submit_button("Save entry") and entry.strip():
+            now = datetime.datetime.now()
+            get_log_writer(JOURNAL_FILE, JOURNAL_FIELDS).write(
+                {"timestamp": now.isoformat(timespec="seconds"), "entry": entry})
+            history.add(HISTORY_USER, entry, get_embedder().encode(entry), ts=now, kind="journal")
+            st.success("Entry saved.")
+
+    st.subheader('🔎 When did I feel like this before?')
+    query = st.text_input("Describe a feeling or situation", placeholder="e.g., nervous before a presentation")
+    col1, col2 = st.columns(2)
+    dates = col1.date_input("Between", value=[])
+    kinds = col2.multiselect("Search in", list(KINDS), default=list(KINDS))
+    if query and kinds:
+        start, end = (dates[0], dates[1] + datetime.timedelta(days=1)) if len(dates) == 2 else (None, None)
+        with instrumentation.span("history_search"):
+            matches = history.search(get_embedder().encode(query), user=HISTORY_USER, k=10,
+                                     start=start, end=end, kinds=kinds)
+        if not matches:
+            st.write("Nothing similar found yet.")
+        for match in matches:
+            st.write(f"**{match['timestamp'][:16].replace('T', ' ')}** · {match['kind']} · "
+                     f"similarity {match['score']:.2f}")
+            st.write(f"> {match['text']}")
+
+elif page == 'Settings':
+    st.header('⚙️ Settings')
+    st.write('Settings functionality coming soon!')
+
+    st.subheader('🚀 Startup timings')
+    report = pd.DataFrame(model_registry.startup_report()).set_index("component")
+    st.dataframe(report)
+    st.caption("Import and load time per component, in seconds. "
+               "Components are loaded on first use or by the background warm-up.")
 
-elif page == \'Settings\':
-    st.header(\'⚙️ Settings\')
-    st.write(\'Settings functionality coming soon!\')
+    st.subheader('🩺 Diagnostics')
+    stages = instrumentation.snapshot()
+    if stages:
+        latency = pd.DataFrame(stages).set_index("stage")
+        for column in ["mean_s", "p50_s", "p95_s", "p99_s", "max_s"]:
+            latency[column.replace("_s", "_ms")] = (latency.pop(column) * 1000).round(1)
+        st.dataframe(latency)
+    else:
+        st.write("No timings recorded yet. Send a chat message first.")
+    rate = st.slider("Profile a share of LLM and tip stages (cProfile)", 0.0, 1.0,
+                     float(instrumentation.profiler.sample_rate), step=0.05)
+    instrumentation.profiler.sample_rate = rate
+    for report in instrumentation.profiler.slowest():
+        with st.expander(f"{report['name']}: {report['seconds']:.2f}s at "
+                         f"{datetime.datetime.fromtimestamp(report['at']):%H:%M:%S}"):
+            st.code(report["report"])
 
 
 
@@ -0,0 +1,596 @@
+import datetime
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from log_reader import TIMESTAMP_COLUMN, LogOffsetIndex, iter_logs
+from log_writer import rotated_paths
+
+HISTORY_DIR = os.environ.get("HISTORY_INDEX_DIR", "history_index")
+KINDS = ("chat", "journal")
+# Log column holding the text of each kind (mood_logs.csv and journal_logs.csv)
+LOG_TEXT_COLUMNS = {"chat": "user_input", "journal": "entry"}
+META_DTYPE = np.dtype([("user", "<i4"), ("ts", "<f8"), ("kind", "<i1"), ("list", "<i4")])
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):  # a date: whole day from midnight
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.timestamp()
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores, k):
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+class _IdList:
+    """Growable int64 array of entry ids."""
+
+    __slots__ = ("ids", "size")
+
+    def __init__(self, ids=None):
+        self.ids = np.empty(16, dtype=np.int64) if ids is None else ids
+        self.size = 0 if ids is None else len(ids)
+
+    def append(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.ids):
+            grown = np.empty(max(needed, 2 * len(self.ids)), dtype=np.int64)
+            grown[:self.size] = self.ids[:self.size]
+            self.ids = grown
+        self.ids[self.size:needed] = values
+        self.size = needed
+
+    def view(self):
+        return self.ids[:self.size]
+
+
+def _group(keys, ids):
+    """Splits ids into {key: _IdList} by key, keeping id order within a key."""
+    order = np.argsort(keys, kind="stable")
+    keys, ids = keys[order], ids[order]
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    return {int(group_keys[0]): _IdList(group_ids.copy())
+            for group_keys, group_ids in zip(np.split(keys, bounds), np.split(ids, bounds)) if len(group_keys)}
+
+
+class HistoryIndex:
+    """
+    Semantic search over a user's past chat messages and journal entries.
+
+    Embeddings live in a memory-mapped float32 file and per-entry metadata
+    (user, time, kind, cluster) in a memory-mapped record file, so opening
+    the index does not read the vectors and only the rows a query touches are
+    paged in. Entry texts are kept in SQLite. Once min_train entries exist,
+    an IVF (inverted file) index is trained with spherical k-means; each new
+    entry is appended to the list of its nearest centroid, and a query scans
+    only the nprobe closest lists. Lists are also kept per user, so a user's
+    query only touches that user's entries in those lists. Users with at
+    most exact_limit entries are searched exactly, which is both faster and
+    exact at that size.
+    """
+
+    def __init__(self, path=HISTORY_DIR, dim=384, nprobe=32, min_train=10000, exact_limit=20000):
+        """
+        Args:
+            path (str): Directory holding the index files.
+            dim (int): Embedding dimensions.
+            nprobe (int): IVF lists scanned per query; higher is slower and more accurate.
+            min_train (int): Entries needed before the IVF index is trained;
+                until then every query is exact.
+            exact_limit (int): Per-user entry count up to which user queries are exact.
+        """
+        self.path = path
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.exact_limit = exact_limit
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        state = self._read_state()
+        self.dim = state.get("dim", dim)
+        self._db = sqlite3.connect(os.path.join(path, "entries.db"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, text TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS users (code INTEGER PRIMARY KEY, user TEXT UNIQUE)")
+        # Backfill progress per log file, committed together with the entries it added
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS backfill (source TEXT, inode INTEGER, position INTEGER, "
+            "offset INTEGER, end_offset INTEGER, cutoff REAL, PRIMARY KEY (source, inode))"
+        )
+        self._db.commit()
+        self._users = {user: code for code, user in self._db.execute("SELECT code, user FROM users")}
+        self._user_names = {code: user for user, code in self._users.items()}
+        # An entry counts once its text row is committed, so SQLite decides the size after a crash
+        self.count = self._db.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM entries").fetchone()[0]
+
+        centroids_path = os.path.join(path, "centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self._capacity = 0
+        self._vectors = None
+        self._meta = None
+        self._map(max(self.count, 1024))
+
+        ids = np.arange(self.count, dtype=np.int64)
+        meta = self._meta[:self.count]
+        self._user_ids = _group(meta["user"], ids)
+        self._index_lists(meta, ids)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def add(self, user, text, vector, ts=None, kind="chat"):
+        """
+        Adds one entry.
+        Args:
+            user (str): Owner of the entry.
+            text (str): The message or journal entry.
+            vector (array-like): Its embedding.
+            ts (datetime | str | float): When it was written; defaults to now.
+            kind (str): "chat" or "journal".
+        Returns:
+            int: Entry id.
+        """
+        return self.add_many([user], [text], np.asarray(vector, dtype=np.float32)[None, :],
+                             [ts], [kind])[0]
+
+    def add_many(self, users, texts, vectors, timestamps=None, kinds=None):
+        """
+        Adds entries in one batch: one vector write, one flush and one commit.
+        Returns:
+            list: Entry ids in input order.
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Entries have {vectors.shape[1]} dimensions, index has {self.dim}.")
+        now = time.time()
+        timestamps = [now if t is None else _to_epoch(t) for t in (timestamps or [None] * len(texts))]
+        kind_codes = [KINDS.index(k) for k in (kinds or ["chat"] * len(texts))]
+
+        with self._lock:
+            codes = np.array([self._user_code(u) for u in users], dtype=np.int32)
+            first = self.count
+            ids = np.arange(first, first + len(texts), dtype=np.int64)
+            if first + len(texts) > self._capacity:
+                self._map(max(first + len(texts), 2 * self._capacity))
+            lists = self._assign(vectors) if self.trained else np.full(len(texts), -1, dtype=np.int32)
+            self._vectors[first:first + len(texts)] = vectors
+            meta = self._meta[first:first + len(texts)]
+            meta["user"], meta["ts"], meta["kind"], meta["list"] = codes, timestamps, kind_codes, lists
+            self._vectors.flush()
+            self._meta.flush()
+            self._db.executemany("INSERT INTO entries (id, text) VALUES (?, ?)", zip(ids.tolist(), texts))
+            self._db.commit()
+            self.count += len(texts)
+
+            for code in np.unique(codes):
+                self._user_ids.setdefault(int(code), _IdList()).append(ids[codes == code])
+            if self.trained:
+                for lst in np.unique(lists):
+                    self._lists.setdefault(int(lst), _IdList()).append(ids[lists == lst])
+                keys = self._user_list_keys(codes, lists)
+                for key in np.unique(keys):
+                    self._user_lists.setdefault(int(key), _IdList()).append(ids[keys == key])
+            elif self.count >= self.min_train:
+                self.rebuild()
+        return ids.tolist()
+
+    def search(self, vector, user=None, k=5, start=None, end=None, kinds=None, nprobe=None, exact=False):
+        """
+        Finds the entries most similar to a query embedding.
+        Args:
+            vector (array-like): Query embedding.
+            user (str): Only this user's entries; None searches everyone.
+            k (int): Number of results.
+            start, end (datetime | date | str | float): Optional inclusive time bounds.
+            kinds (list): Optional subset of KINDS.
+            nprobe (int): IVF lists to scan; defaults to self.nprobe.
+            exact (bool): Scan every candidate instead of using the IVF index.
+        Returns:
+            list: Dicts with id, user, timestamp, kind, text and score, best first.
+        """
+        query = _normalize(np.asarray(vector, dtype=np.float32).ravel())
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Query has {query.shape[0]} dimensions, index has {self.dim}.")
+        start, end = _to_epoch(start), _to_epoch(end)
+        with self._lock:
+            scope = None  # every entry
+            if user is not None:
+                if user not in self._users:
+                    return []
+                own = self._user_ids.get(self._users[user])
+                scope = own.view() if own else np.empty(0, dtype=np.int64)
+            filters = (start, end, kinds)
+            if any(f is not None for f in filters):
+                scope = self._filter(scope, *filters)
+            # Small or narrowly filtered scopes are scanned exactly; IVF would miss matches there
+            size = self.count if scope is None else len(scope)
+            if self.trained and not exact and size > self.exact_limit:
+                candidates = self._probe(query, nprobe or self.nprobe, user)
+                if any(f is not None for f in filters):
+                    candidates = self._filter(candidates, *filters)
+            else:
+                candidates = scope
+            ids, scores = self._score(query, candidates)
+            top = _top_k(scores, min(k, len(scores)))
+            ids, scores = ids[top], scores[top]
+            meta = self._meta[ids]
+            texts = self._texts(ids.tolist())
+            return [
+                {
+                    "id": int(i),
+                    "user": self._user_names[int(m["user"])],
+                    "timestamp": datetime.datetime.fromtimestamp(float(m["ts"])).isoformat(timespec="seconds"),
+                    "kind": KINDS[int(m["kind"])],
+                    "text": texts.get(int(i), ""),
+                    "score": float(s),
+                }
+                for i, m, s in zip(ids, meta, scores)
+            ]
+
+    def rebuild(self, nlist=None, iterations=10, sample_size=None, seed=0):
+        """
+        (Re)trains the IVF centroids and reassigns every entry. Worth running
+        after the index has grown several times over since the last training.
+        Args:
+            nlist (int): Number of lists; defaults to about 2 * sqrt(entries).
+            iterations (int): k-means iterations.
+            sample_size (int): Entries the centroids are trained on; defaults to 32 per list.
+        """
+        with self._lock:
+            n = self.count
+            nlist = nlist or int(min(4096, max(16, 2 * np.sqrt(n))))
+            rng = np.random.default_rng(seed)
+            sample_size = min(n, sample_size or nlist * 32)
+            sample = np.asarray(self._vectors[np.sort(rng.choice(n, sample_size, replace=False))])
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assigned = self._nearest(sample, centroids)
+                counts = np.bincount(assigned, minlength=nlist)
+                starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+                sums = np.empty_like(centroids)
+                used = counts > 0
+                sums[used] = np.add.reduceat(sample[np.argsort(assigned, kind="stable")], starts[used])
+                # Empty clusters restart from random entries
+                sums[~used] = sample[rng.choice(sample_size, int((~used).sum()))]
+                centroids = _normalize(sums)
+            self.centroids = centroids.astype(np.float32)
+            np.save(os.path.join(self.path, "centroids.npy"), self.centroids)
+            self._write_state()
+
+            lists = np.empty(n, dtype=np.int32)
+            for first in range(0, n, 65536):
+                lists[first:first + 65536] = self._assign(self._vectors[first:min(first + 65536, n)])
+            self._meta["list"][:n] = lists
+            self._meta.flush()
+            self._index_lists(self._meta[:n], np.arange(n, dtype=np.int64))
+
+    def backfill_from_log(self, log_path, encode, user="local", kind="chat", text_column=None):
+        """
+        Adds the messages already in a CSV log (and the files it was rotated
+        to) that predate the index, e.g. mood_logs.csv from before chat
+        messages were indexed.
+
+        The first call fixes the plan: every file and its size at that point.
+        Rows are then read between the log's offset-index entries and each
+        range is committed together with its progress, so an interrupted
+        backfill resumes where it stopped and never adds a row twice. Rows at
+        or after the first entry the index already had for this user and kind
+        were indexed live and are skipped.
+        Args:
+            log_path (str): The live log, e.g. mood_logs.csv.
+            encode (callable): f(list of texts) -> one embedding per text.
+            user (str): Owner of the entries.
+            kind (str): "chat" or "journal".
+            text_column (str): Column with the text; defaults to LOG_TEXT_COLUMNS[kind].
+        Returns:
+            int: Entries added by this call.
+        """
+        text_column = text_column or LOG_TEXT_COLUMNS[kind]
+        source = f"{kind}:{user}"
+        files = {os.stat(p).st_ino: p for p in rotated_paths(log_path) + [log_path] if os.path.isfile(p)}
+        with self._lock:
+            plan = self._db.execute("SELECT inode, offset, end_offset, cutoff FROM backfill "
+                                    "WHERE source = ? ORDER BY position", (source,)).fetchall()
+            if not plan:
+                plan = self._plan_backfill(source, files, user, kind)
+
+        added = 0
+        for inode, offset, end, cutoff in plan:
+            if offset >= end:
+                continue
+            path = files.get(inode)
+            if path is None:
+                print(f"Backfill: a planned log file (inode {inode}) no longer exists, skipping it.")
+                continue
+            index = LogOffsetIndex(path)
+            index.update()
+            bounds = [start for _, start in index.state["entries"] if offset < start < end] + [end]
+            for last in bounds:
+                texts, stamps = self._read_backfill_range(path, offset, last, text_column, cutoff)
+                with self._lock:
+                    try:
+                        self._db.execute("UPDATE backfill SET offset = ? WHERE source = ? AND inode = ?",
+                                         (last, source, inode))
+                        if texts:
+                            self.add_many([user] * len(texts), texts, encode(texts), stamps, [kind] * len(texts))
+                        else:
+                            self._db.commit()
+                    except BaseException:
+                        self._db.rollback()
+                        raise
+                added += len(texts)
+                offset = last
+        return added
+
+    def stats(self):
+        with self._lock:
+            sizes = [lst.size for lst in self._lists.values()]
+            return {
+                "entries": self.count,
+                "users": len(self._users),
+                "trained": self.trained,
+                "lists": len(sizes),
+                "largest_list": max(sizes, default=0),
+                "vector_bytes": self._capacity * self.dim * 4,
+            }
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._meta.flush()
+            self._db.close()
+
+    # ── internals ──────────────────────────────────────────────────
+    def _read_state(self):
+        try:
+            with open(os.path.join(self.path, "state.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self):
+        with open(os.path.join(self.path, "state.json"), "w") as f:
+            json.dump({"dim": self.dim, "nlist": None if self.centroids is None else len(self.centroids)}, f)
+
+    def _plan_backfill(self, source, files, user, kind):
+        cutoff = None
+        if user in self._users:
+            meta = self._meta[:self.count]
+            live = meta["ts"][(meta["user"] == self._users[user]) & (meta["kind"] == KINDS.index(kind))]
+            if len(live):
+                # Log timestamps have whole seconds and are taken just before the live add
+                cutoff = float(math.floor(live.min()))
+        plan = []
+        for position, (inode, path) in enumerate(files.items()):
+            index = LogOffsetIndex(path)
+            index.update()
+            plan.append((inode, index.data_start, index.state["scanned_to"], cutoff))
+            self._db.execute("INSERT INTO backfill VALUES (?, ?, ?, ?, ?, ?)", (source, inode, position) + plan[-1][1:])
+        self._db.commit()
+        return plan
+
+    @staticmethod
+    def _read_backfill_range(path, first, last, text_column, cutoff):
+        texts, stamps = [], []
+        for chunk in iter_logs(path, columns=[TIMESTAMP_COLUMN, text_column], byte_range=(first, last)):
+            for ts, text in zip(chunk[TIMESTAMP_COLUMN], chunk[text_column]):
+                if not isinstance(text, str) or not text.strip():
+                    continue  # e.g. mood-only rows
+                try:
+                    ts = _to_epoch(ts)
+                except (TypeError, ValueError):
+                    continue
+                if ts is None or math.isnan(ts):
+                    continue
+                if cutoff is None or ts < cutoff:
+                    texts.append(text)
+                    stamps.append(ts)
+        return texts, stamps
+
+    def _map(self, capacity):
+        # Grow the files, then map them again; the OS page cache holds the hot part
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("meta.bin", META_DTYPE.itemsize)):
+            file_path = os.path.join(self.path, name)
+            with open(file_path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._meta.flush()
+        self._vectors = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dim))
+        self._meta = np.memmap(os.path.join(self.path, "meta.bin"), dtype=META_DTYPE, mode="r+",
+                               shape=(capacity,))
+        self._capacity = capacity
+        if not os.path.exists(os.path.join(self.path, "state.json")):
+            self._write_state()
+
+    def _index_lists(self, meta, ids):
+        if self.centroids is None:
+            self._lists, self._user_lists = {}, {}
+            return
+        self._lists = _group(meta["list"], ids)
+        self._user_lists = _group(self._user_list_keys(meta["user"], meta["list"]), ids)
+
+    def _user_list_keys(self, codes, lists):
+        return codes.astype(np.int64) * len(self.centroids) + lists
+
+    def _user_code(self, user):
+        code = self._users.get(user)
+        if code is None:
+            code = len(self._users)
+            self._db.execute("INSERT INTO users (code, user) VALUES (?, ?)", (code, user))
+            self._users[user] = code
+            self._user_names[code] = user
+        return code
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def _assign(self, vectors):
+        return self._nearest(np.asarray(vectors), self.centroids)
+
+    def _probe(self, query, nprobe, user=None):
+        closest = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        if user is None:
+            lists = [self._lists.get(int(c)) for c in closest]
+        else:
+            base = self._users[user] * len(self.centroids)
+            lists = [self._user_lists.get(base + int(c)) for c in closest]
+        parts = [lst.view() for lst in lists if lst is not None]
+        # Sorted ids read the memory-mapped vectors front to back
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def _chunks(self, ids):
+        if ids is None:
+            return (np.arange(first, min(first + 65536, self.count)) for first in range(0, self.count, 65536))
+        return (ids[first:first + 65536] for first in range(0, len(ids), 65536))
+
+    def _filter(self, ids, start, end, kinds):
+        kind_codes = [KINDS.index(k) for k in kinds] if kinds else None
+        kept = [np.empty(0, dtype=np.int64)]
+        for chunk in self._chunks(ids):
+            meta = self._meta[chunk]
+            keep = np.ones(len(chunk), dtype=bool)
+            if start is not None:
+                keep &= meta["ts"] >= start
+            if end is not None:
+                keep &= meta["ts"] <= end
+            if kind_codes is not None:
+                keep &= np.isin(meta["kind"], kind_codes)
+            kept.append(chunk[keep])
+        return np.concatenate(kept)
+
+    def _score(self, query, ids):
+        chunks_ids, chunks_scores = [], []
+        for chunk in self._chunks(ids):
+            if len(chunk):
+                chunks_ids.append(chunk)
+                chunks_scores.append(self._vectors[chunk] @ query)
+        if not chunks_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(chunks_ids), np.concatenate(chunks_scores)
+
+    def _texts(self, ids):
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        return dict(self._db.execute(f"SELECT id, text FROM entries WHERE id IN ({marks})", ids))
+
+
+if __name__ == "__main__":
+    # Recall and latency report: IVF vs. exact search over synthetic entries (default 1M),
+    # or a one-time backfill from the CSV logs with --backfill
+    import argparse
+    import shutil
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Report IVF vs. exact search recall and latency, "
+                                                 "or backfill the history index from a CSV log.")
+    parser.add_argument("n", nargs="?", type=int, default=1000000, help="Synthetic entries for the report")
+    parser.add_argument("--backfill", metavar="LOG",
+                        help="Index the messages already in LOG (e.g. mood_logs.csv); safe to re-run after an interruption")
+    parser.add_argument("--kind", choices=KINDS, default="chat", help="chat for mood_logs.csv, journal for journal_logs.csv")
+    parser.add_argument("--user", default="local", help="Owner of the backfilled entries")
+    parser.add_argument("--index-dir", default=HISTORY_DIR)
+    args = parser.parse_args()
+
+    if args.backfill:
+        # Stop the app first: the index files are not shared between processes
+        import model_registry
+        embedder = model_registry.get("embedder")
+        history = HistoryIndex(args.index_dir)
+        start = time.perf_counter()
+        added = history.backfill_from_log(args.backfill, embedder.encode, user=args.user, kind=args.kind)
+        print(f"Backfilled {added:,} {args.kind} entries from {args.backfill} in {time.perf_counter() - start:.1f}s "
+              f"({len(history):,} entries in the index)")
+        history.close()
+        sys.exit()
+
+    from benchmarks import synthetic_embeddings
+
+    n = args.n
+    dim, k, n_queries = 384, 10, 100
+    path = tempfile.mkdtemp()
+    index = HistoryIndex(path, dim=dim, min_train=n + 1)  # trained once below, after loading
+
+    # 1000 users, one heavy user with 10% of the entries, one year of timestamps
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    first_ts = time.time() - 365 * 86400
+    for first in range(0, n, 100000):
+        size = min(100000, n - first)
+        vectors = synthetic_embeddings(size, dim, seed=first)
+        users = np.where(rng.random(size) < 0.1, "heavy", np.char.add("user", rng.integers(0, 1000, size).astype(str)))
+        stamps = first_ts + 365 * 86400 * (first + np.arange(size)) / n
+        kinds = np.where(rng.random(size) < 0.2, "journal", "chat")
+        index.add_many(users.tolist(), [f"entry {first + i}" for i in range(size)], vectors, stamps.tolist(),
+                       kinds.tolist())
+    load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index.rebuild()
+    train_s = time.perf_counter() - start
+    stats = index.stats()
+    print(f"{n:,} entries: loaded in {load_s:.1f}s, IVF trained in {train_s:.1f}s "
+          f"({stats['lists']} lists, largest {stats['largest_list']:,}), vectors {stats['vector_bytes'] / 2**30:.2f} GiB")
+
+    queries = synthetic_embeddings(n_queries, dim, seed=12345)
+
+    def run(**options):
+        results, latencies = [], []
+        for q in queries:
+            t = time.perf_counter()
+            results.append({r["id"] for r in index.search(q, k=k, **options)})
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        return results, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+    def report(label, exact_options, options_list):
+        truth, p50, p95 = run(exact=True, **exact_options)
+        print(f"\n{label}\n  exact          p50 {p50:8.2f} ms  p95 {p95:8.2f} ms")
+        for options in options_list:
+            found, p50, p95 = run(**exact_options, **options)
+            recall = np.mean([len(a & b) / max(1, len(b)) for a, b in zip(found, truth)])
+            print(f"  nprobe={options['nprobe']:<4}    p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  recall@{k} {recall:.3f}")
+
+    probes = [{"nprobe": p} for p in (4, 8, 16, 32, 64)]
+    report("All users", {}, probes)
+    report("Heavy user (10% of entries)", {"user": "heavy"}, probes)
+    last_month = datetime.datetime.now() - datetime.timedelta(days=30)
+    report("Heavy user, last 30 days, journal only", {"user": "heavy", "start": last_month, "kinds": ["journal"]},
+           probes[2:3])
+    _, p50, p95 = run(user="user7")
+    print(f"\nTypical user ({len(index._user_ids[index._users['user7']].view()):,} entries, exact): "
+          f"p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+    index.close()
+    start = time.perf_counter()
+    reopened = HistoryIndex(path)
+    print(f"Reopened in {time.perf_counter() - start:.2f}s with {len(reopened):,} entries")
+    reopened.close()
+    shutil.rmtree(path)
@@ -0,0 +1,265 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """Raised when the inference pool already has max_pending jobs."""
+
+
+def _load_emotion_model():
+    """
+    Worker initializer: keeps each worker to one math thread (parallelism
+    comes from the processes) and loads the DeepFace emotion model once.
+    """
+    for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ.setdefault(var, "1")
+    import numpy as np
+    from mood_detector import detect_mood_from_image
+    detect_mood_from_image(np.zeros((64, 64, 3), dtype=np.uint8))
+
+
+def _detect_faces(image):
+    from mood_detector import detect_moods_batch
+    return detect_moods_batch([image])[0]
+
+
+def _worker_main(worker_id, jobs, results, worker_fn, initializer):
+    if initializer is not None:
+        initializer()
+    while True:
+        item = jobs.get()
+        if item is None:
+            break
+        job_id, payload, deadline = item
+        if time.time() > deadline:
+            continue  # waited too long in the queue; the pool has already given up on it
+        results.put(("start", job_id, worker_id))
+        try:
+            results.put(("done", job_id, worker_fn(payload)))
+        except Exception as e:
+            results.put(("error", job_id, str(e)))
+
+
+class _Job:
+    __slots__ = ("status", "result", "error", "submitted", "started", "finished", "worker", "event")
+
+    def __init__(self):
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.worker = None
+        self.event = threading.Event()
+
+
+class MoodInferencePool:
+    """
+    Out-of-process pool running face-emotion inference.
+
+    Each worker process loads the model once at startup and then serves jobs
+    from a shared queue, so inference never runs on (or holds the GIL of) the
+    Streamlit script thread. The number of queued plus running jobs is
+    bounded; a job that runs past job_timeout has its worker killed and
+    replaced, and one still queued after queue_timeout is dropped. Finished
+    jobs nobody collects are evicted after result_ttl.
+    """
+
+    def __init__(self, workers=None, max_pending=None, job_timeout=30.0, queue_timeout=60.0, result_ttl=300.0,
+                 worker_fn=_detect_faces, initializer=_load_emotion_model, start_method="spawn"):
+        """
+        Args:
+            workers (int): Worker processes. Defaults to the number of CPU cores.
+            max_pending (int): Queued + running jobs allowed before submit() pushes back.
+            job_timeout (float): Seconds a job may run before its worker is killed.
+            queue_timeout (float): Seconds a job may wait for a worker before it times out.
+            result_ttl (float): Seconds a finished job is kept for poll() / result().
+            worker_fn (callable): Picklable top-level f(payload) run in the workers.
+            initializer (callable): Picklable top-level function run once per worker.
+            start_method (str): multiprocessing start method; "spawn" avoids
+                forking a process that already holds model or UI threads.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self.result_ttl = result_ttl
+        self.worker_fn = worker_fn
+        self.initializer = initializer
+        self._ctx = multiprocessing.get_context(start_method)
+        self._jobs_queue = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._processes = {}
+        self._next_worker = 0
+        self._closed = False
+        for _ in range(self.workers):
+            self._spawn_worker()
+        self._collector = threading.Thread(target=self._collect, name="inference-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, payload, block=False, timeout=None):
+        """
+        Queues a job.
+        Args:
+            payload: Picklable input, e.g. encoded image bytes.
+            block (bool): Wait for a free slot instead of raising QueueFull.
+            timeout (float): Maximum seconds to wait when blocking.
+        Returns:
+            str: Job id for poll() / result().
+        """
+        if self._closed:
+            raise RuntimeError("Inference pool is shut down.")
+        if not self._slots.acquire(blocking=block, timeout=timeout if block else None):
+            raise QueueFull(f"{self.max_pending} jobs already pending.")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = _Job()
+        # Wall-clock deadline: the workers are separate processes
+        self._jobs_queue.put((job_id, payload, time.time() + self.queue_timeout))
+        return job_id
+
+    def poll(self, job_id):
+        """
+        Returns:
+            dict: status ("queued", "running", "done", "error", "timeout" or
+            "expired" once evicted), plus result or error and the elapsed time in seconds.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {"status": "expired", "result": None, "elapsed": None,
+                        "error": "The result was not collected in time; please try again."}
+            end = job.finished or time.monotonic()
+            return {"status": job.status, "result": job.result, "error": job.error,
+                    "elapsed": end - job.submitted}
+
+    def result(self, job_id, timeout=None):
+        """
+        Waits for a job and returns its result.
+        Raises:
+            TimeoutError: If the job is not finished within `timeout` seconds
+                or was killed for exceeding job_timeout.
+            RuntimeError: If the job raised in the worker.
+            KeyError: If the job is unknown or was evicted after result_ttl.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+        if not job.event.wait(timeout):
+            raise TimeoutError(f"Job {job_id} still {job.status} after {timeout}s.")
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        if job.status == "done":
+            return job.result
+        if job.status == "timeout":
+            raise TimeoutError(job.error)
+        raise RuntimeError(job.error)
+
+    def forget(self, job_id):
+        """Drops a finished job's record once the caller no longer needs it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.event.is_set():
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": len(self._processes),
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "max_pending": self.max_pending,
+        }
+
+    def shutdown(self):
+        self._closed = True
+        for _ in self._processes:
+            self._jobs_queue.put(None)
+        for process in list(self._processes.values()):
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes.clear()
+
+    # ── internals ──────────────────────────────────────────────────
+    def _spawn_worker(self):
+        worker_id = self._next_worker
+        self._next_worker += 1
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._jobs_queue, self._results, self.worker_fn, self.initializer),
+            name=f"mood-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status, job.result, job.error = status, result, error
+        job.finished = time.monotonic()
+        job.event.set()
+        self._slots.release()
+
+    def _collect(self):
+        while not self._closed:
+            try:
+                kind, job_id, value = self._results.get(timeout=0.1)
+            except queue.Empty:
+                kind = None
+            with self._lock:
+                job = self._jobs.get(job_id) if kind else None
+                if job is not None and job.status in ("queued", "running"):
+                    if kind == "start":
+                        job.status, job.worker, job.started = "running", value, time.monotonic()
+                    elif kind == "done":
+                        self._finish(job, "done", result=value)
+                    elif kind == "error":
+                        self._finish(job, "error", error=value)
+                self._check_timeouts()
+
+    def _check_timeouts(self):
+        now = time.monotonic()
+        expired = []
+        for job_id, job in self._jobs.items():
+            if job.status == "running" and now - job.started > self.job_timeout:
+                process = self._processes.pop(job.worker, None)
+                if process is not None:
+                    process.terminate()
+                    self._spawn_worker()
+                self._finish(job, "timeout", error=f"Inference exceeded {self.job_timeout:.1f}s.")
+            elif job.status == "queued" and now - job.submitted > self.queue_timeout:
+                self._finish(job, "timeout", error=f"No worker free within {self.queue_timeout:.1f}s.")
+            elif job.finished is not None and now - job.finished > self.result_ttl:
+                expired.append(job_id)  # its poller went away
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+if __name__ == "__main__":
+    # Benchmark: throughput as worker count grows (CPU-only)
+    import sys
+    import numpy as np
+    import cv2
+
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    image = cv2.imencode(".jpg", frame)[1].tobytes()
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+
+    for workers in sorted({1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1}):
+        pool = MoodInferencePool(workers=workers, max_pending=n)
+        pool.result(pool.submit(image), timeout=300)  # wait for model loading
+        start = time.perf_counter()
+        ids = [pool.submit(image) for _ in range(n)]
+        for job_id in ids:
+            pool.result(job_id, timeout=300)
+        elapsed = time.perf_counter() - start
+        print(f"{workers} workers: {n / elapsed:.1f} images/sec")
+        pool.shutdown()
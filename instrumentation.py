@@ -0,0 +1,305 @@
+import bisect
+import cProfile
+import functools
+import heapq
+import io
+import os
+import pstats
+import random
+import threading
+import time
+
+# Spans are recorded unless METRICS_ENABLED=0; disabled spans cost one global lookup
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRIC_PREFIX = "mental_health_ai"
+# Bucket upper bounds: 100 us to 100 s, 8 per decade (each ~33% wider than the last)
+BUCKETS = tuple(round(1e-4 * 10 ** (i / 8), 7) for i in range(49))
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class Histogram:
+    """Latency distribution for one stage, in fixed log-spaced buckets."""
+
+    __slots__ = ("counts", "count", "sum", "errors", "max", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation inside its bucket
+        (like Prometheus' histogram_quantile).
+        Returns:
+            float | None: Seconds, or None without observations.
+        """
+        with self._lock:
+            counts, total, largest = list(self.counts), self.count, self.max
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else largest
+                return min(largest, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return largest
+
+
+def histogram(stage):
+    hist = _histograms.get(stage)
+    if hist is None:
+        with _histograms_lock:
+            hist = _histograms.setdefault(stage, Histogram())
+    return hist
+
+
+def observe(stage, seconds, error=False):
+    """Records a duration that was measured elsewhere, e.g. ChatTurnPipeline timings."""
+    if ENABLED:
+        histogram(stage).observe(seconds, error)
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        histogram(self.stage).observe(time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(stage):
+    """
+    Times a block as one observation of `stage`; exceptions count as errors.
+    Usage:
+        with span("embedding"):
+            vec = embedder.encode(text)
+    """
+    return _Span(stage) if ENABLED else _NOOP
+
+
+def timed(stage, profile=False):
+    """
+    Decorator form of span().
+    Args:
+        stage (str): Stage name.
+        profile (bool): Also offer each call to the cProfile sampler (see ProfileSampler).
+            cProfile only records the calling thread, so use it on functions that do
+            their work on that thread, not on ones waiting for pool workers.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(stage):
+                if not profile:
+                    return fn(*args, **kwargs)
+                with profiler.profile(stage):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """
+    Returns:
+        list: One dict per stage with count, errors, mean and p50/p95/p99/max in seconds.
+    """
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    rows = []
+    for stage, hist in items:
+        if not hist.count:
+            continue
+        rows.append({
+            "stage": stage,
+            "count": hist.count,
+            "errors": hist.errors,
+            "mean_s": hist.sum / hist.count,
+            "p50_s": hist.quantile(0.50),
+            "p95_s": hist.quantile(0.95),
+            "p99_s": hist.quantile(0.99),
+            "max_s": hist.max,
+        })
+    return rows
+
+
+def prometheus_text():
+    """
+    Returns:
+        str: All stage histograms in the Prometheus text exposition format.
+    """
+    name = f"{METRIC_PREFIX}_stage_seconds"
+    errors = f"{METRIC_PREFIX}_stage_errors_total"
+    lines = [f"# HELP {name} Latency of each processing stage.", f"# TYPE {name} histogram"]
+    error_lines = [f"# HELP {errors} Stage executions that raised.", f"# TYPE {errors} counter"]
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    for stage, hist in items:
+        with hist._lock:
+            counts, total, seconds, failed = list(hist.counts), hist.count, hist.sum, hist.errors
+        label = stage.replace("\\", "\\\\").replace('"', '\\"')
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{stage="{label}"}} {seconds:.6f}')
+        lines.append(f'{name}_count{{stage="{label}"}} {total}')
+        error_lines.append(f'{errors}{{stage="{label}"}} {failed}')
+    return "\n".join(lines + error_lines) + "\n"
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+# ── Profiling of slow requests ─────────────────────────────────────
+
+class ProfileSampler:
+    """
+    Runs cProfile on a random sample of requests and keeps the reports of
+    the slowest ones. Only one request is profiled at a time; others run
+    unprofiled while a profile is in progress.
+    """
+
+    def __init__(self, sample_rate=0.0, keep=10, top_functions=25):
+        """
+        Args:
+            sample_rate (float): Fraction of requests to profile; 0 disables profiling.
+            keep (int): Number of slowest profiled requests to keep.
+            top_functions (int): Lines of the cumulative-time report stored per request.
+        """
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.top_functions = top_functions
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._slowest = []  # min-heap of (seconds, sequence, report dict)
+        self._sequence = 0
+
+    def profile(self, name):
+        """Context manager profiling the block if it is sampled."""
+        if not self.sample_rate or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return _NOOP
+        return _Profiled(self, name)
+
+    def slowest(self):
+        """
+        Returns:
+            list: Dicts with name, seconds, at (epoch) and report text, slowest first.
+        """
+        with self._lock:
+            return [report for _, _, report in sorted(self._slowest, reverse=True)]
+
+    def _record(self, name, seconds, profiler):
+        with self._lock:
+            if len(self._slowest) >= self.keep and seconds <= self._slowest[0][0]:
+                return
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(self.top_functions)
+        report = {"name": name, "seconds": seconds, "at": time.time(), "report": out.getvalue()}
+        with self._lock:
+            self._sequence += 1
+            heapq.heappush(self._slowest, (seconds, self._sequence, report))
+            if len(self._slowest) > self.keep:
+                heapq.heappop(self._slowest)
+
+
+class _Profiled:
+    __slots__ = ("sampler", "name", "profiler", "start")
+
+    def __init__(self, sampler, name):
+        self.sampler = sampler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler = cProfile.Profile()
+        self.start = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.disable()
+        seconds = time.perf_counter() - self.start
+        try:
+            self.sampler._record(self.name, seconds, self.profiler)
+        finally:
+            self.sampler._busy.release()
+        return False
+
+
+# Process-wide sampler; PROFILE_SAMPLE_RATE=0.05 profiles one request in twenty
+profiler = ProfileSampler(sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)))
+
+
+if __name__ == "__main__":
+    # Overhead of a span when enabled and disabled, and quantile accuracy
+    n = 200000
+
+    def loop():
+        for _ in range(n):
+            with span("bench"):
+                pass
+
+    for enabled in (False, True):
+        ENABLED = enabled
+        start = time.perf_counter()
+        loop()
+        elapsed = time.perf_counter() - start
+        print(f"span {'enabled' if enabled else 'disabled'}: {elapsed / n * 1e9:.0f} ns")
+
+    start = time.perf_counter()
+    for _ in range(n):
+        pass
+    print(f"empty loop: {(time.perf_counter() - start) / n * 1e9:.0f} ns")
+
+    rng = random.Random(0)
+    samples = sorted(rng.lognormvariate(-2, 1) for _ in range(100000))
+    reset()
+    for s in samples:
+        observe("lognormal", s)
+    hist = histogram("lognormal")
+    for q in (0.5, 0.95, 0.99):
+        exact = samples[int(q * len(samples))]
+        print(f"p{int(q * 100)}: exact {exact * 1000:.1f} ms, histogram {hist.quantile(q) * 1000:.1f} ms")
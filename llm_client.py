@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from collections import deque
+
+import requests
+
+LM_STUDIO_URL = os.getenv("LM_STUDIO_URL", "http://localhost:1234/v1")
+DEFAULT_MODEL = "mistral-7b-instruct-v0.2"
+
+# Metrics of the most recent replies, newest last
+RECENT_METRICS = deque(maxlen=200)
+
+
+def _payload(prompt, model, max_tokens, temperature, stream):
+    return {
+        "model": model,
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": stream,
+    }
+
+
+def complete(prompt, model=DEFAULT_MODEL, max_tokens=150, temperature=0.7,
+             base_url=LM_STUDIO_URL, timeout=60):
+    """
+    Requests a completion and blocks until the whole text is available.
+    Args:
+        prompt (str): Prompt sent to the completion endpoint.
+    Returns:
+        str: The completion text.
+    """
+    res = requests.post(
+        f"{base_url}/completions",
+        json=_payload(prompt, model, max_tokens, temperature, stream=False),
+        timeout=timeout,
+    )
+    res.raise_for_status()
+    return res.json()["choices"][0]["text"]
+
+
+def stream_complete(prompt, model=DEFAULT_MODEL, max_tokens=150, temperature=0.7,
+                    base_url=LM_STUDIO_URL, timeout=60):
+    """
+    Requests a completion as a server-sent event stream.
+    Args:
+        prompt (str): Prompt sent to the completion endpoint.
+    Yields:
+        str: Text fragments in the order the server produces them.
+    """
+    with requests.post(
+        f"{base_url}/completions",
+        json=_payload(prompt, model, max_tokens, temperature, stream=True),
+        stream=True,
+        timeout=timeout,
+    ) as res:
+        res.raise_for_status()
+        for line in res.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            piece = json.loads(data)["choices"][0].get("text", "")
+            if piece:
+                yield piece
+
+
+def generate_reply(prompt, on_token=None, stream=True, **kwargs):
+    """
+    Produces an AI reply, streaming it when possible.
+
+    Falls back to the blocking endpoint when streaming fails, also when the
+    stream breaks off after some tokens: the complete reply then replaces the
+    partial text (on_token is called with it), so a cut-off reply is never
+    returned. Metrics for every call are appended to RECENT_METRICS.
+    Args:
+        prompt (str): Prompt sent to the completion endpoint.
+        on_token (callable): Called with the reply text so far after each fragment.
+        stream (bool): Try the streaming endpoint first.
+        **kwargs: Passed through to complete() / stream_complete().
+    Returns:
+        tuple: (reply text, metrics dict with ttft, total_time, tokens,
+        tokens_per_sec, streamed and error, the stream failure if there was one)
+    Raises:
+        requests.RequestException: If the blocking fallback fails too.
+    """
+    start = time.perf_counter()
+    metrics = {"streamed": False, "ttft": None, "tokens": 0, "error": None}
+    pieces = []
+
+    if stream:
+        try:
+            for piece in stream_complete(prompt, **kwargs):
+                if metrics["ttft"] is None:
+                    metrics["ttft"] = time.perf_counter() - start
+                pieces.append(piece)
+                metrics["tokens"] += 1
+                if on_token:
+                    on_token("".join(pieces))
+            metrics["streamed"] = True
+        except Exception as e:
+            metrics["error"] = f"stream failed: {e}"
+
+    if not metrics["streamed"]:
+        reply = complete(prompt, **kwargs)
+        metrics["ttft"] = time.perf_counter() - start
+        metrics["tokens"] = len(reply.split())
+        pieces = [reply]
+        if on_token:
+            on_token(reply)
+
+    metrics["total_time"] = time.perf_counter() - start
+    generation_time = metrics["total_time"] - (metrics["ttft"] or 0.0)
+    metrics["tokens_per_sec"] = (
+        metrics["tokens"] / generation_time if metrics["streamed"] and generation_time > 0
+        else metrics["tokens"] / metrics["total_time"] if metrics["total_time"] > 0 else 0.0
+    )
+    RECENT_METRICS.append(metrics)
+    return "".join(pieces).strip(), metrics
+
+
+if __name__ == "__main__":
+    # Example usage against a running LM Studio server
+    reply, stats = generate_reply(
+        "You are a kind mental-health assistant.\nUser: I can't sleep\nAI:",
+        on_token=lambda text: print(f"\r{text[-70:]}", end="", flush=True),
+    )
+    print(f"\n\nTTFT: {stats['ttft']:.2f}s, {stats['tokens_per_sec']:.1f} tokens/sec, streamed={stats['streamed']}")
@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import os
+
+import pandas as pd
+
+from log_writer import flush_path
+
+INDEX_SUFFIX = ".idx"
+TIMESTAMP_COLUMN = "timestamp"
+
+
+def _to_timestamp(value):
+    return pd.Timestamp(value) if value is not None else None
+
+
+class LogOffsetIndex:
+    """
+    Sparse sidecar index mapping log timestamps to byte offsets.
+
+    Every `every`-th record start is stored as (timestamp, offset) in
+    <log>.idx, so a range query can seek straight to the region it needs
+    instead of parsing the file from the top. The index only ever scans
+    bytes appended since the last update and is rebuilt if the log was
+    rotated or truncated.
+    """
+
+    def __init__(self, log_path, every=1000, timestamp_column=TIMESTAMP_COLUMN):
+        self.log_path = log_path
+        self.index_path = log_path + INDEX_SUFFIX
+        self.every = every
+        self.timestamp_column = timestamp_column
+        self.state = self._empty_state()
+        if os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = self._empty_state()
+
+    @property
+    def header(self):
+        return self.state["header"]
+
+    @property
+    def data_start(self):
+        return self.state["data_start"]
+
+    def update(self):
+        """
+        Extends the index over rows appended since the last call.
+        Returns:
+            bool: True if the sidecar file changed.
+        """
+        if not os.path.isfile(self.log_path):
+            return False
+        stat = os.stat(self.log_path)
+        if stat.st_ino != self.state["inode"] or stat.st_size < self.state["scanned_to"]:
+            self.state = self._empty_state()
+            self.state["inode"] = stat.st_ino
+        if stat.st_size == self.state["scanned_to"]:
+            return False
+
+        with open(self.log_path, "rb") as f:
+            f.seek(self.state["scanned_to"])
+            offset = self.state["scanned_to"]
+            record_start = offset
+            in_quotes = False
+            for line in f:
+                if line.count(b'"') % 2:
+                    in_quotes = not in_quotes
+                offset += len(line)
+                if in_quotes or not line.endswith(b"\n"):
+                    continue
+                self._add_record(record_start, line if record_start == offset - len(line) else None, f, offset)
+                record_start = offset
+            # Anything after the last complete record is a write still in progress
+            self.state["scanned_to"] = record_start
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.index_path)
+        return True
+
+    def seek_offset(self, start):
+        """
+        Returns the byte offset to start reading at for rows at or after `start`.
+        Args:
+            start (str | datetime): Lower timestamp bound, or None.
+        Returns:
+            int: Offset of a record boundary at or before the first matching row.
+        """
+        entries = self.state["entries"]
+        if start is None or not entries or not self.state["sorted"]:
+            return self.data_start
+        start = _to_timestamp(start)
+        best = self.data_start
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pd.Timestamp(entries[mid][0]) < start:
+                best = entries[mid][1]
+                lo = mid + 1
+            else:
+                hi = mid
+        return best
+
+    # ── internals ──────────────────────────────────────────────────
+    @staticmethod
+    def _empty_state():
+        return {"inode": None, "header": None, "data_start": 0, "scanned_to": 0,
+                "entries": [], "rows": 0, "sorted": True, "last_ts": None}
+
+    def _add_record(self, start, single_line, f, end):
+        if self.state["header"] is None:
+            header = self._read_record(f, start, end, single_line)
+            self.state["header"] = header
+            self.state["data_start"] = end
+            return
+        rows = self.state["rows"]
+        self.state["rows"] = rows + 1
+        if rows % self.every:
+            return
+        record = self._read_record(f, start, end, single_line)
+        try:
+            ts = record[self.header.index(self.timestamp_column)]
+        except (ValueError, IndexError):
+            return
+        if self.state["last_ts"] is not None and ts < self.state["last_ts"]:
+            self.state["sorted"] = False
+        self.state["last_ts"] = ts
+        self.state["entries"].append([ts, start])
+
+    @staticmethod
+    def _read_record(f, start, end, single_line):
+        if single_line is None:
+            position = f.tell()
+            f.seek(start)
+            single_line = f.read(end - start)
+            f.seek(position)
+        return next(csv.reader(io.StringIO(single_line.decode("utf-8"))), [])
+
+
+class _BoundedReader(io.RawIOBase):
+    """Read-only view of a binary file that stops at a fixed byte offset."""
+
+    def __init__(self, raw, end):
+        self.raw = raw
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self.end - self.raw.tell()
+        if remaining <= 0:
+            return 0
+        data = self.raw.read(min(len(buffer), remaining))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_logs(log_path, start=None, end=None, columns=None, chunksize=10000,
+              timestamp_column=TIMESTAMP_COLUMN, byte_range=None):
+    """
+    Streams a CSV log in chunks, optionally limited to a time range.
+
+    Uses the sidecar offset index to skip directly to the first relevant
+    region and stops reading once rows are past `end`, so memory use is
+    bounded by chunksize rather than by the size of the log.
+    Args:
+        log_path (str): Path to the CSV log.
+        start (str | datetime): Inclusive lower timestamp bound.
+        end (str | datetime): Inclusive upper timestamp bound.
+        columns (list): Columns to return (projection); None returns all.
+        chunksize (int): Rows parsed per chunk.
+        byte_range (tuple): Optional (first, last) byte offsets, both on record
+            boundaries, to read instead of seeking by timestamp. None for last
+            means end of file.
+    Yields:
+        pd.DataFrame: Matching rows, one chunk at a time.
+    """
+    flush_path(log_path)
+    if not os.path.isfile(log_path) or os.path.getsize(log_path) == 0:
+        return
+    index = LogOffsetIndex(log_path, timestamp_column=timestamp_column)
+    index.update()
+    header = index.header
+    if not header:
+        return
+    start, end = _to_timestamp(start), _to_timestamp(end)
+    filtering = start is not None or end is not None
+    if filtering and timestamp_column not in header:
+        raise ValueError(f"{log_path} has no {timestamp_column!r} column to filter on.")
+
+    wanted = list(columns) if columns else list(header)
+    usecols = wanted + [timestamp_column] if filtering and timestamp_column not in wanted else wanted
+
+    with open(log_path, "rb") as raw:
+        if byte_range:
+            first, last = byte_range
+            raw.seek(max(first, index.data_start))
+            if last is not None:
+                if last <= raw.tell():
+                    return
+                raw = io.BufferedReader(_BoundedReader(raw, last))
+        else:
+            raw.seek(index.seek_offset(start))
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        reader = pd.read_csv(text, header=None, names=header, usecols=usecols, chunksize=chunksize)
+        for chunk in reader:
+            if filtering:
+                ts = pd.to_datetime(chunk[timestamp_column], errors="coerce")
+                mask = pd.Series(True, index=chunk.index)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts <= end
+                past_end = end is not None and index.state["sorted"] and ts.min() > end
+                chunk = chunk.loc[mask, wanted]
+                if len(chunk):
+                    yield chunk
+                if past_end:
+                    break
+            else:
+                yield chunk[wanted]
+
+
+if __name__ == "__main__":
+    # Benchmark: one-week range query over a large synthetic log
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.mkdtemp(), "mood_logs.csv")
+    days = pd.date_range("2025-01-01", periods=500000, freq="min")
+    pd.DataFrame({
+        "timestamp": days.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mood": "calm",
+        "user_input": "I feel anxious about exams",
+        "ai_reply": "That sounds stressful, let's take it one step at a time.",
+        "tip_score": 0.8,
+    }).to_csv(path, index=False)
+
+    start = time.perf_counter()
+    full = pd.read_csv(path)
+    full = full[(full.timestamp >= "2025-06-01") & (full.timestamp < "2025-06-08")]
+    print(f"Full read_csv + filter: {time.perf_counter() - start:.2f}s ({len(full)} rows)")
+
+    start = time.perf_counter()
+    LogOffsetIndex(path).update()
+    print(f"Initial index build:    {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    week = pd.concat(iter_logs(path, "2025-06-01", "2025-06-07T23:59:59", columns=["timestamp", "mood"]))
+    print(f"Indexed range query:    {time.perf_counter() - start:.2f}s ({len(week)} rows)")
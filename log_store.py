@@ -0,0 +1,291 @@
+import json
+import operator
+import os
+
+import pandas as pd
+
+from log_reader import LogOffsetIndex, iter_logs
+from log_writer import flush_path, rotated_paths
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet storage is optional
+    pa = ds = pq = None
+
+DICTIONARY_COLUMNS = ["tip_topic", "mood"]
+NUMERIC_COLUMNS = ["tip_score"]
+MANIFEST = "_manifest.json"
+_PANDAS_OPS = {
+    "=": operator.eq, "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+def normalize_timestamps(frame):
+    """
+    Parses the timestamp column (if selected) to datetime64[ns], so rows read
+    from Parquet, from the CSV tail or from a plain CSV log have the same dtype.
+    Unparseable values become NaT.
+    """
+    if "timestamp" in frame.columns:
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], errors="coerce").astype("datetime64[ns]")
+    return frame
+
+
+def log_files(log_path):
+    """
+    Returns:
+        list: The files a log was rotated to, oldest first, then the live log (if present).
+    """
+    return [path for path in rotated_paths(log_path) + [log_path] if os.path.isfile(path)]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet log storage needs pyarrow: pip install pyarrow")
+
+
+def dataset_dir_for(log_path):
+    """
+    Returns the Parquet dataset directory paired with a log file,
+    e.g. mood_logs.csv -> mood_logs.parquet/.
+    """
+    return os.path.splitext(log_path)[0] + ".parquet"
+
+
+def has_dataset(log_path):
+    return pa is not None and os.path.isfile(os.path.join(dataset_dir_for(log_path), MANIFEST))
+
+
+def _load_manifest(dataset_dir):
+    path = os.path.join(dataset_dir, MANIFEST)
+    if os.path.isfile(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"sources": {}}
+
+
+def _save_manifest(dataset_dir, manifest):
+    path = os.path.join(dataset_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def _to_table(chunk):
+    chunk = chunk.copy()
+    chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], errors="coerce")
+    chunk = chunk.dropna(subset=["timestamp"])
+    chunk["date"] = chunk["timestamp"].dt.strftime("%Y-%m-%d")
+    # Fixed column types keep every part file on the same schema,
+    # even for chunks where a text column happens to be entirely empty
+    for column in chunk.columns:
+        if column in ("timestamp", "date"):
+            continue
+        if column in NUMERIC_COLUMNS:
+            chunk[column] = pd.to_numeric(chunk[column], errors="coerce").astype("float64")
+        else:
+            chunk[column] = chunk[column].fillna("").astype(str)
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    for column in DICTIONARY_COLUMNS:
+        if column in table.column_names:
+            i = table.column_names.index(column)
+            table = table.set_column(i, column, table[column].dictionary_encode())
+    return table
+
+
+def compact_log(log_path, dataset_dir=None, chunksize=100000):
+    """
+    Moves rows appended to a CSV or JSONL log since the last compaction into
+    a date-partitioned Parquet dataset (date=YYYY-MM-DD/part-*.parquet).
+
+    The source file is left untouched; the manifest records how far each file
+    (by inode, so rotated files are recognised) has been compacted. Re-running
+    after a crash rewrites the same part files instead of duplicating rows.
+    Args:
+        log_path (str): Append-only .csv or .jsonl log.
+        dataset_dir (str): Target dataset. Defaults to dataset_dir_for(log_path).
+        chunksize (int): Rows converted per Parquet write.
+    Returns:
+        dict: Number of rows compacted and the new compacted offset.
+    """
+    _require_pyarrow()
+    dataset_dir = dataset_dir or dataset_dir_for(log_path)
+    os.makedirs(dataset_dir, exist_ok=True)
+    manifest = _load_manifest(dataset_dir)
+    flush_path(log_path)
+    if not os.path.isfile(log_path):
+        return {"rows": 0, "offset": 0}
+    source = str(os.stat(log_path).st_ino)
+    first = manifest["sources"].get(source, 0)
+
+    if log_path.endswith(".jsonl"):
+        last, chunks = _jsonl_chunks(log_path, first, chunksize)
+    else:
+        index = LogOffsetIndex(log_path)
+        index.update()
+        last = index.state["scanned_to"]
+        chunks = iter_logs(log_path, chunksize=chunksize, byte_range=(first, last))
+
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        if chunk.empty:
+            continue
+        table = _to_table(chunk)
+        ds.write_dataset(
+            table, dataset_dir, format="parquet",
+            partitioning=_partitioning(),
+            basename_template=f"part-{source}-{first}-{i}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd", use_dictionary=True),
+        )
+        rows += table.num_rows
+
+    manifest["sources"][source] = last
+    _save_manifest(dataset_dir, manifest)
+    return {"rows": rows, "offset": last}
+
+
+def _jsonl_chunks(log_path, first, chunksize):
+    with open(log_path, "rb") as f:
+        f.seek(first)
+        data = f.read()
+    complete = data.rfind(b"\n") + 1
+    last = first + complete
+
+    def chunks():
+        lines = data[:complete].splitlines()
+        for i in range(0, len(lines), chunksize):
+            yield pd.DataFrame([json.loads(line) for line in lines[i:i + chunksize] if line.strip()])
+
+    return last, chunks()
+
+
+def filter_frame(frame, filters):
+    """
+    Applies (column, op, value) predicates to a DataFrame.
+    Returns:
+        pd.Series: Boolean row mask.
+    """
+    mask = pd.Series(True, index=frame.index)
+    for column, op, value in filters:
+        if op == "in":
+            mask &= frame[column].isin(value)
+        elif op == "not in":
+            mask &= ~frame[column].isin(value)
+        else:
+            mask &= _PANDAS_OPS[op](frame[column], value)
+    return mask
+
+
+def read_logs(log_path, start=None, end=None, columns=None, filters=None, dataset_dir=None):
+    """
+    Reads a log transparently from its Parquet dataset plus the CSV rows that
+    have not been compacted yet, including those of files it was rotated to.
+
+    Time bounds prune whole date partitions and, like `filters`, are pushed
+    down into the Parquet scan so non-matching row groups are never decoded.
+    Args:
+        log_path (str): The live CSV/JSONL log.
+        start (str | datetime): Inclusive lower timestamp bound.
+        end (str | datetime): Inclusive upper timestamp bound.
+        columns (list): Columns to return.
+        filters (list): (column, op, value) predicates, e.g. [("mood", "==", "sad")].
+    Returns:
+        pd.DataFrame: Matching rows with timestamp as datetime64[ns].
+    """
+    _require_pyarrow()
+    dataset_dir = dataset_dir or dataset_dir_for(log_path)
+    filters = list(filters or [])
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    frames = []
+    manifest = _load_manifest(dataset_dir)
+    if manifest["sources"]:
+        dataset = ds.dataset(dataset_dir, format="parquet", partitioning=_partitioning(),
+                             exclude_invalid_files=True, ignore_prefixes=["_", "."])
+        expression = None
+        predicates = list(filters)
+        if start is not None:
+            predicates += [("date", ">=", start.strftime("%Y-%m-%d")), ("timestamp", ">=", start)]
+        if end is not None:
+            predicates += [("date", "<=", end.strftime("%Y-%m-%d")), ("timestamp", "<=", end)]
+        if predicates:
+            expression = pq.filters_to_expression(predicates)
+        names = [c for c in (columns or dataset.schema.names) if c != "date"]
+        table = dataset.to_table(columns=names, filter=expression)
+        frames.append(normalize_timestamps(table.to_pandas()))
+
+    # compact_log only sees the live file, so rotated files may still hold rows past their offset
+    for path in log_files(log_path):
+        source = str(os.stat(path).st_ino)
+        offset = manifest["sources"].get(source, 0)
+        if path.endswith(".jsonl"):
+            _, tail = _jsonl_chunks(path, offset, 100000)
+        else:
+            tail = iter_logs(path, start=start, end=end, byte_range=(offset, None))
+        for chunk in tail:
+            if chunk.empty:
+                continue
+            chunk = normalize_timestamps(chunk.copy())
+            mask = filter_frame(chunk, filters)
+            if start is not None:
+                mask &= chunk["timestamp"] >= start
+            if end is not None:
+                mask &= chunk["timestamp"] <= end
+            chunk = chunk[mask]
+            frames.append(chunk[columns] if columns else chunk)
+
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    result = pd.concat(frames, ignore_index=True)
+    for column in DICTIONARY_COLUMNS:
+        if column in result.columns and isinstance(result[column].dtype, pd.CategoricalDtype):
+            result[column] = result[column].astype(object)
+    return result
+
+
+if __name__ == "__main__":
+    # Benchmark: file size and read time, CSV vs. Parquet
+    import tempfile
+    import time
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "mood_logs.csv")
+    n = 500000
+    stamps = pd.date_range("2025-01-01", periods=n, freq="min")
+    topics = ["anxiety", "sleep", "stress", "focus", "loneliness"]
+    pd.DataFrame({
+        "timestamp": stamps.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mood": [["calm", "sad", "happy", "anxious"][i % 4] for i in range(n)],
+        "user_input": [f"I feel anxious about exams, day {i % 97}" for i in range(n)],
+        "ai_reply": "That sounds stressful. Let's take it one step at a time and start with a short break.",
+        "tip_topic": [topics[i % 5] for i in range(n)],
+        "tip_text": [f"Tip about {topics[i % 5]}: try box breathing for four minutes." for i in range(n)],
+        "tip_score": 0.8,
+    }).to_csv(path, index=False)
+
+    start = time.perf_counter()
+    print(compact_log(path), f"compaction {time.perf_counter() - start:.2f}s")
+    parquet_bytes = sum(os.path.getsize(os.path.join(d, f))
+                        for d, _, files in os.walk(dataset_dir_for(path)) for f in files if f.endswith(".parquet"))
+    print(f"Size: CSV {os.path.getsize(path) / 1e6:.1f} MB, Parquet {parquet_bytes / 1e6:.1f} MB")
+
+    for label, kwargs in [("full", {}), ("one week, mood=sad", {"start": "2025-06-01", "end": "2025-06-07T23:59:59",
+                                                                "filters": [("mood", "==", "sad")]})]:
+        t = time.perf_counter()
+        frame = pd.read_csv(path)
+        if kwargs:
+            frame = frame[(frame.timestamp >= "2025-06-01") & (frame.timestamp < "2025-06-08") & (frame.mood == "sad")]
+        csv_time = time.perf_counter() - t
+        t = time.perf_counter()
+        result = read_logs(path, **kwargs)
+        print(f"{label}: CSV {csv_time:.2f}s vs Parquet {time.perf_counter() - t:.2f}s ({len(result)} rows)")
@@ -0,0 +1,160 @@
+import importlib
+import os
+import threading
+import time
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+VOSK_MODEL_PATH = os.environ.get("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+
+_loaders = {}
+_instances = {}
+_timings = {}
+_locks = {}
+_registry_lock = threading.Lock()
+_loading = threading.local()
+
+
+def register(name, loader):
+    """
+    Registers a heavyweight component that is built on first use.
+    Args:
+        name (str): Component name used with get().
+        loader (callable): Builds the component; may call timed_import().
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def timed_import(module_name):
+    """
+    Imports a module and charges the time to the component being loaded.
+    """
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    component = getattr(_loading, "name", None)
+    if component is not None:
+        _timings.setdefault(component, {"import": 0.0, "load": 0.0})
+        _timings[component]["import"] += time.perf_counter() - start
+    return module
+
+
+def get(name):
+    """
+    Returns the process-wide instance of a component, loading it exactly once
+    even when several threads or Streamlit sessions ask at the same time.
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _locks[name]:
+        if name not in _instances:
+            previous, outer_nested = getattr(_loading, "name", None), getattr(_loading, "nested", 0.0)
+            _loading.name, _loading.nested = name, 0.0
+            _timings[name] = {"import": 0.0, "load": 0.0}
+            start = time.perf_counter()
+            try:
+                _instances[name] = _loaders[name]()
+            finally:
+                nested = _loading.nested
+                _loading.name, _loading.nested = previous, outer_nested
+            total = time.perf_counter() - start
+            # Components loaded by this loader (e.g. vosk for vosk_model) report their own time
+            _timings[name]["load"] = total - _timings[name]["import"] - nested
+            if previous is not None:
+                _loading.nested += total
+        return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def warm_up(names=None, background=True):
+    """
+    Loads components ahead of their first use.
+    Args:
+        names (list): Components to load; defaults to every registered one.
+        background (bool): Load in a daemon thread and return immediately.
+    Returns:
+        threading.Thread | None: The warm-up thread when running in background.
+    """
+    names = list(names or _loaders)
+
+    def run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"Warm-up of {name} failed: {e}")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def startup_report():
+    """
+    Returns:
+        list: One dict per registered component with import and load seconds.
+    """
+    return [
+        {
+            "component": name,
+            "loaded": name in _instances,
+            "import_s": round(_timings.get(name, {}).get("import", 0.0), 3),
+            "load_s": round(_timings.get(name, {}).get("load", 0.0), 3),
+        }
+        for name in _loaders
+    ]
+
+
+def _load_embedder():
+    return timed_import("sentence_transformers").SentenceTransformer(EMBEDDING_MODEL)
+
+
+def _load_deepface():
+    return timed_import("deepface").DeepFace
+
+
+def _load_cv2():
+    return timed_import("cv2")
+
+
+def _load_speech_recognition():
+    return timed_import("speech_recognition")
+
+
+def _load_pyttsx3():
+    return timed_import("pyttsx3")
+
+
+def _load_vosk():
+    vosk = timed_import("vosk")
+    vosk.SetLogLevel(-1)
+    return vosk
+
+
+def _load_vosk_model():
+    return get("vosk").Model(VOSK_MODEL_PATH)
+
+
+register("embedder", _load_embedder)
+register("deepface", _load_deepface)
+register("cv2", _load_cv2)
+register("speech_recognition", _load_speech_recognition)
+register("pyttsx3", _load_pyttsx3)
+register("vosk", _load_vosk)
+register("vosk_model", _load_vosk_model)
+
+
+if __name__ == "__main__":
+    # Startup timing report for every heavyweight component
+    warm_up(background=False)
+    print(f"{'component':<20}{'import (s)':>12}{'load (s)':>12}")
+    for row in startup_report():
+        status = "" if row["loaded"] else "  (failed)"
+        print(f"{row['component']:<20}{row['import_s']:>12.3f}{row['load_s']:>12.3f}{status}")
@@ -0,0 +1,234 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from log_reader import LogOffsetIndex, iter_logs
+from log_writer import flush_path, rotated_paths
+
+EMOTION_PREFIX = "emotion_"
+
+
+class MoodAnalytics:
+    """
+    Incrementally maintained per-user daily rollups of a mood/chat log.
+
+    update() folds only the rows appended since the previous call into a
+    (user, date) table of message counts, tip_score sums and emotion counts,
+    so dashboard queries cost O(days) no matter how many messages were logged.
+    The rollups and the read position are persisted next to the log.
+    """
+
+    def __init__(self, log_path, state_path=None, user_column="user_id", default_user="local"):
+        """
+        Args:
+            log_path (str): CSV log written by the Chat and Mood Tracker pages.
+            state_path (str): Where rollups are persisted. Defaults to <log>.rollup.pkl.
+            user_column (str): Column identifying the user; rows without it
+                are attributed to default_user.
+            default_user (str): User id for logs that carry no user column.
+        """
+        self.log_path = log_path
+        self.state_path = state_path or log_path + ".rollup.pkl"
+        self.user_column = user_column
+        self.default_user = default_user
+        self._lock = threading.Lock()
+        self.inode = None
+        self.offset = 0
+        self.rollup = pd.DataFrame()
+        if os.path.isfile(self.state_path):
+            state = pd.read_pickle(self.state_path)
+            self.inode, self.offset, self.rollup = state["inode"], state["offset"], state["rollup"]
+
+    def update(self):
+        """
+        Folds newly appended log rows into the rollups.
+        Returns:
+            int: Number of rows ingested.
+        """
+        flush_path(self.log_path)
+        with self._lock:
+            if not os.path.isfile(self.log_path):
+                return 0
+            ingested = 0
+            inode = os.stat(self.log_path).st_ino
+            if inode != self.inode:
+                # The log was rotated: finish the file we were reading, then any
+                # files rotated after it, before starting on the new log
+                if self.inode is not None:
+                    ingested += self._ingest_rotated()
+                self.inode, self.offset = inode, 0
+            index = LogOffsetIndex(self.log_path)
+            index.update()
+            last = index.state["scanned_to"]
+            if last > self.offset:
+                ingested += self._ingest(self.log_path, self.offset, last)
+                self.offset = last
+            if ingested:
+                pd.to_pickle({"inode": self.inode, "offset": self.offset, "rollup": self.rollup}, self.state_path)
+            return ingested
+
+    def _ingest(self, path, first, last=None):
+        ingested = 0
+        for chunk in iter_logs(path, byte_range=(first, last)):
+            self._fold(self._aggregate(chunk))
+            ingested += len(chunk)
+        return ingested
+
+    def _ingest_rotated(self):
+        rotated = rotated_paths(self.log_path)
+        inodes = [os.stat(path).st_ino for path in rotated]
+        if self.inode not in inodes:
+            return 0  # the file we were reading is gone; nothing left to recover
+        position = inodes.index(self.inode)
+        ingested = self._ingest(rotated[position], self.offset)
+        for path in rotated[position + 1:]:
+            ingested += self._ingest(path, 0)
+        return ingested
+
+    def users(self):
+        if self.rollup.empty:
+            return []
+        return sorted(self.rollup.index.get_level_values("user").unique())
+
+    def daily(self, user=None, start=None, end=None):
+        """
+        Daily activity for one user, with days without activity filled in.
+        Returns:
+            pd.DataFrame: Indexed by date with messages, mood_entries,
+            mean_tip_score and one share column per detected emotion.
+        """
+        days = self._user_rows(user)
+        if days.empty:
+            return days
+        full_range = pd.date_range(start or days.index.min(), end or days.index.max(), freq="D")
+        days = days.reindex(full_range, fill_value=0)
+        days.index.name = "date"
+
+        emotions = [c for c in days.columns if c.startswith(EMOTION_PREFIX)]
+        result = pd.DataFrame(index=days.index)
+        result["messages"] = days["messages"]
+        result["mood_entries"] = days[emotions].sum(axis=1) if emotions else 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["mean_tip_score"] = np.where(days["tip_count"] > 0, days["tip_score_sum"] / days["tip_count"], np.nan)
+            totals = result["mood_entries"].to_numpy()[:, None]
+            shares = np.where(totals > 0, days[emotions].to_numpy() / totals, 0.0)
+        for i, column in enumerate(emotions):
+            result[column[len(EMOTION_PREFIX):]] = shares[:, i]
+        return result
+
+    def weekly(self, user=None):
+        """
+        Weekly totals (messages, mood entries) and mean tip score.
+        """
+        raw = self._user_rows(user)
+        if raw.empty:
+            return raw
+        weeks = raw.resample("W").sum()
+        result = pd.DataFrame(index=weeks.index)
+        result["messages"] = weeks["messages"]
+        emotions = [c for c in weeks.columns if c.startswith(EMOTION_PREFIX)]
+        result["mood_entries"] = weeks[emotions].sum(axis=1) if emotions else 0
+        result["mean_tip_score"] = (weeks["tip_score_sum"] / weeks["tip_count"]).where(weeks["tip_count"] > 0)
+        return result
+
+    def rolling(self, user=None, window=7):
+        """
+        Rolling-window averages over the daily series.
+        """
+        days = self.daily(user)
+        if days.empty:
+            return days
+        return pd.DataFrame({
+            "messages": days["messages"].rolling(window, min_periods=1).mean(),
+            "mean_tip_score": days["mean_tip_score"].rolling(window, min_periods=1).mean(),
+        })
+
+    def streaks(self, user=None, today=None):
+        """
+        Consecutive days with any activity.
+        Returns:
+            dict: current streak (ending today or yesterday) and longest streak, in days.
+        """
+        days = self.daily(user)
+        if days.empty:
+            return {"current": 0, "longest": 0}
+        active = ((days["messages"] + days["mood_entries"]) > 0).to_numpy().astype(np.int8)
+        # Run lengths from the positions where activity switches on/off
+        padded = np.concatenate(([0], active, [0]))
+        edges = np.flatnonzero(np.diff(padded))
+        runs = edges[1::2] - edges[::2]
+        longest = int(runs.max()) if runs.size else 0
+
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        last_day = days.index[-1]
+        current = 0
+        if active[-1] and (today - last_day).days <= 1:
+            current = int(runs[-1])
+        return {"current": current, "longest": longest}
+
+    # ── internals ──────────────────────────────────────────────────
+    def _user_rows(self, user):
+        user = user or self.default_user
+        if self.rollup.empty or user not in self.rollup.index.get_level_values("user"):
+            return pd.DataFrame()
+        rows = self.rollup.xs(user, level="user").sort_index()
+        rows.index = pd.DatetimeIndex(rows.index)
+        return rows
+
+    def _aggregate(self, chunk):
+        frame = pd.DataFrame({
+            "user": chunk[self.user_column].fillna(self.default_user).astype(str)
+            if self.user_column in chunk else self.default_user,
+            "date": pd.to_datetime(chunk["timestamp"], errors="coerce").dt.strftime("%Y-%m-%d"),
+        })
+        text = chunk["user_input"] if "user_input" in chunk else pd.Series("", index=chunk.index)
+        frame["messages"] = (text.fillna("").astype(str).str.len() > 0).astype(np.int64)
+        if "tip_score" in chunk:
+            scores = pd.to_numeric(chunk["tip_score"], errors="coerce")
+        else:
+            scores = pd.Series(np.nan, index=chunk.index)
+        frame["tip_score_sum"] = scores.fillna(0.0)
+        frame["tip_count"] = scores.notna().astype(np.int64)
+        if "mood" in chunk:
+            moods = chunk["mood"].fillna("").astype(str).str.strip().str.lower()
+            dummies = pd.get_dummies(moods[moods != ""], prefix=EMOTION_PREFIX.rstrip("_"), dtype=np.int64)
+            frame = frame.join(dummies).fillna({c: 0 for c in dummies.columns})
+        frame = frame.dropna(subset=["date"])
+        return frame.groupby(["user", "date"]).sum()
+
+    def _fold(self, delta):
+        if self.rollup.empty:
+            self.rollup = delta
+        else:
+            self.rollup = self.rollup.add(delta, fill_value=0)
+        self.rollup = self.rollup.fillna(0)
+
+
+if __name__ == "__main__":
+    # Benchmark: dashboard query cost after incremental ingestion
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.mkdtemp(), "mood_logs.csv")
+    n = 300000
+    stamps = pd.date_range("2025-01-01", periods=n, freq="min")
+    moods = np.array(["", "", "happy", "sad", "neutral", "fear"])
+    pd.DataFrame({
+        "timestamp": stamps.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mood": moods[np.arange(n) % len(moods)],
+        "user_input": "I feel anxious",
+        "tip_score": 0.75,
+    }).to_csv(path, index=False)
+
+    analytics = MoodAnalytics(path)
+    start = time.perf_counter()
+    print(f"Initial rollup of {analytics.update()} rows: {time.perf_counter() - start:.2f}s")
+    with open(path, "a") as f:
+        f.write("2025-07-29T09:00:00,happy,good morning,0.9\n")
+    start = time.perf_counter()
+    print(f"Incremental update of {analytics.update()} row: {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    daily, streak = analytics.daily(), analytics.streaks(today="2025-07-29")
+    print(f"Dashboard query over {len(daily)} days: {(time.perf_counter() - start) * 1000:.1f} ms, streaks {streak}")
@@ -1,32 +1,182 @@
+import os
+import numpy as np
+import model_registry
 
-import cv2
-from deepface import DeepFace
+# cv2 and DeepFace (TensorFlow) are imported on first use, not at import time
+cv2 = None
+DeepFace = None
 
-def detect_mood_from_image(image_path):
+def _load_backends():
+    global cv2, DeepFace
+    if cv2 is None:
+        cv2 = model_registry.get("cv2")
+    if DeepFace is None:
+        DeepFace = model_registry.get("deepface")
+
+# Faces are still found reliably at this size and analysis is much cheaper
+MAX_IMAGE_SIDE = 640
+
+def load_image(image, max_side=MAX_IMAGE_SIDE):
+    """
+    Loads an image into memory as a BGR array, downscaling oversized images.
+    Args:
+        image: File path, raw encoded bytes (JPEG/PNG), a file-like object
+            (e.g. a Streamlit upload) or a BGR NumPy array.
+        max_side (int): Longest allowed side in pixels; None keeps full size.
+    Returns:
+        np.ndarray: BGR image.
+    """
+    _load_backends()
+    if isinstance(image, np.ndarray):
+        img = image
+    else:
+        if isinstance(image, (str, os.PathLike)):
+            img = cv2.imread(os.fspath(image), cv2.IMREAD_COLOR)
+        else:
+            if hasattr(image, "getvalue"):
+                image = image.getvalue()
+            elif hasattr(image, "read"):
+                image = image.read()
+            img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Could not decode image.")
+
+    if max_side:
+        height, width = img.shape[:2]
+        scale = max_side / max(height, width)
+        if scale < 1:
+            img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+def _analyze_faces(img, detector_backend):
+    analysis = DeepFace.analyze(img_path=img, actions=["emotion"], enforce_detection=False,
+                                detector_backend=detector_backend)
+    return [
+        {
+            "emotion": face["emotion"],
+            "dominant_emotion": face.get("dominant_emotion"),
+            "region": face.get("region"),
+        }
+        for face in analysis
+    ]
+
+def detect_mood_from_image(image, max_side=MAX_IMAGE_SIDE, detector_backend="opencv"):
     """
     Detects mood from an image using DeepFace.
     Args:
-        image_path (str): Path to the image file.
+        image: Path to the image file, encoded image bytes, a file-like object
+            or a BGR NumPy array. Nothing is written to disk.
+        max_side (int): Images larger than this are downscaled before detection.
     Returns:
         dict: A dictionary containing detected emotions and their scores.
     """
     try:
         # DeepFace.analyze returns a list of dictionaries, one for each face found.
         # We'll take the first face found.
-        analysis = DeepFace.analyze(img_path=image_path, actions=["emotion"], enforce_detection=False)
-        if analysis:
-            return analysis[0]["emotion"]
+        faces = _analyze_faces(load_image(image, max_side), detector_backend)
+        if faces:
+            return faces[0]["emotion"]
         else:
             return {"error": "No face detected in the image."}
     except Exception as e:
         return {"error": str(e)}
 
+# Output order of DeepFace's emotion model
+EMOTION_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+EMOTION_INPUT = 48
+
+def _emotion_model():
+    # DeepFace caches built models; 0.0.93 moved build_model to (task, model_name)
+    try:
+        client = DeepFace.build_model(task="facial_attribute", model_name="Emotion")
+    except TypeError:
+        client = DeepFace.build_model("Emotion")
+    return getattr(client, "model", client)  # the Keras model behind the client
+
+def _emotion_input(face):
+    """
+    Prepares one extract_faces() crop (RGB, floats in [0, 1]) the way
+    DeepFace.analyze does: padded to a square, grayscale, 48x48.
+    """
+    height, width = face.shape[:2]
+    side = max(height, width)
+    square = np.zeros((side, side, 3), dtype=np.float32)
+    top, left = (side - height) // 2, (side - width) // 2
+    square[top:top + height, left:left + width] = face
+    gray = cv2.cvtColor(square, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, (EMOTION_INPUT, EMOTION_INPUT), interpolation=cv2.INTER_AREA)
+
+def detect_moods_batch(images, max_side=MAX_IMAGE_SIDE, detector_backend="opencv"):
+    """
+    Detects moods for many frames with one emotion-model call.
+
+    Faces are detected and cropped per frame, then every crop from every
+    frame is stacked and classified in a single batched predict().
+    Args:
+        images (list): Paths, encoded bytes, file-like objects or BGR arrays.
+        max_side (int): Images larger than this are downscaled before detection.
+    Returns:
+        list: One entry per input image: a list of per-face dicts (emotion,
+        dominant_emotion, region), or {"error": ...} if that image failed.
+    """
+    _load_backends()
+    results, crops, owners = [], [], []
+    for image in images:
+        try:
+            faces = DeepFace.extract_faces(img_path=load_image(image, max_side), detector_backend=detector_backend,
+                                           enforce_detection=False, align=True)
+            faces = [face for face in faces if face["face"].size]
+            inputs = [_emotion_input(face["face"]) for face in faces]
+        except Exception as e:
+            results.append({"error": str(e)})
+            continue
+        results.append([])
+        crops.extend(inputs)
+        owners.extend((len(results) - 1, face.get("facial_area")) for face in faces)
+    if not crops:
+        return results
+
+    try:
+        batch = np.stack(crops)[..., np.newaxis]
+        predictions = np.asarray(_emotion_model().predict(batch, verbose=0), dtype=np.float64)
+    except Exception as e:
+        return [{"error": str(e)} if isinstance(r, list) else r for r in results]
+    for (i, region), scores in zip(owners, predictions):
+        scores = 100 * scores / scores.sum()
+        results[i].append({
+            "emotion": {label: float(score) for label, score in zip(EMOTION_LABELS, scores)},
+            "dominant_emotion": EMOTION_LABELS[int(np.argmax(scores))],
+            "region": region,
+        })
+    return results
+
 if __name__ == "__main__":
-    # Example usage (requires an image file)
-    # You can replace 'test_image.jpg' with a path to your own image
-    # For testing, you might need to provide a dummy image or skip this block
-    print("To test mood detection, provide an image path to detect_mood_from_image function.")
-    print("Example: detect_mood_from_image(\"path/to/your/image.jpg\")")
+    # Benchmark: per-image latency of DeepFace.analyze per frame vs. one batched emotion-model call.
+    # Pass image paths on the command line, or synthetic frames are used.
+    import sys
+    import time
+
+    _load_backends()
+    paths = sys.argv[1:]
+    frames = [load_image(p, max_side=None) for p in paths] or [
+        np.random.default_rng(i).integers(0, 255, (1080, 1920, 3), dtype=np.uint8) for i in range(8)
+    ]
+    encoded = [cv2.imencode(".jpg", f)[1].tobytes() for f in frames]
+
+    detect_mood_from_image(encoded[0])  # load the emotion model once before timing
+    start = time.perf_counter()
+    for data in encoded:
+        detect_mood_from_image(data)
+    single = (time.perf_counter() - start) / len(encoded)
 
+    start = time.perf_counter()
+    detect_moods_batch(encoded)
+    batched = (time.perf_counter() - start) / len(encoded)
 
+    start = time.perf_counter()
+    detect_moods_batch(encoded, max_side=None)
+    full_size = (time.perf_counter() - start) / len(encoded)
 
+    print(f"Single calls:            {single * 1000:.1f} ms/image")
+    print(f"Batched:                 {batched * 1000:.1f} ms/image")
+    print(f"Batched, no downscaling: {full_size * 1000:.1f} ms/image")
@@ -1,26 +1,59 @@
 
 import datetime
+import os
 import time
 import threading
 
-def set_reminder(message, remind_time):
+from reminder_delivery import deliver_reminders
+from reminder_scheduler import ReminderScheduler
+
+REMINDER_DB = os.environ.get("REMINDER_DB", "reminders.db")
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    Returns the process-wide reminder scheduler, starting it on first use.
+    Reminders saved by a previous run are reloaded from REMINDER_DB. Reminders
+    with a recipient are sent over WhatsApp when Twilio credentials are set.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReminderScheduler(REMINDER_DB, dispatch=deliver_reminders).start()
+        return _scheduler
+
+def set_reminder(message, remind_time, every=None, recipient=None):
     """
     Sets a reminder to display a message at a specific time.
     Args:
         message (str): The reminder message.
         remind_time (datetime.datetime): The datetime object when the reminder should trigger.
+        every (datetime.timedelta): Repeat interval for recurring reminders.
+        recipient (str): Optional delivery address for the reminder.
+    Returns:
+        int: Reminder id for cancel_reminder(), or None if it was shown immediately.
     """
     now = datetime.datetime.now()
     delay = (remind_time - now).total_seconds()
 
-    if delay <= 0:
+    if delay <= 0 and every is None:
         print("Reminder time is in the past or present. Displaying immediately.")
         print(f"REMINDER: {message}")
-        return
+        return None
+
+    print(f"Setting reminder for {remind_time} (in {max(delay, 0):.0f} seconds).")
+    interval = every.total_seconds() if every is not None else None
+    return get_scheduler().schedule(message, remind_time, interval=interval, recipient=recipient)
 
-    print(f"Setting reminder for {remind_time} (in {delay:.0f} seconds).")
-    timer = threading.Timer(delay, display_reminder, args=[message])
-    timer.start()
+def cancel_reminder(reminder_id):
+    """
+    Cancels a reminder created with set_reminder().
+    Returns:
+        bool: True if the reminder was still pending.
+    """
+    return get_scheduler().cancel(reminder_id)
 
 def display_reminder(message):
     """
@@ -0,0 +1,269 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TWILIO_API_URL = os.getenv("TWILIO_API_URL", "https://api.twilio.com")
+# Twilio's default WhatsApp sender throughput is 80 messages/second
+DEFAULT_RATE = 80.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class WhatsAppSender:
+    """
+    Sends WhatsApp messages through the Twilio Messages REST API.
+
+    Requests share one pooled keep-alive session and are throttled by a token
+    bucket, so a burst of reminders cannot exceed the account's send quota.
+    Throttling (429) and server errors are retried with exponential backoff;
+    other client errors (e.g. 400 for an invalid number) fail at once.
+    """
+
+    def __init__(self, account_sid, auth_token, from_number, base_url=TWILIO_API_URL,
+                 rate=DEFAULT_RATE, burst=None, max_workers=16, max_retries=4,
+                 backoff=0.5, timeout=10, dedupe_window=3600.0, dedupe_size=100000):
+        """
+        Args:
+            account_sid (str): Twilio account SID.
+            auth_token (str): Twilio auth token.
+            from_number (str): Sender, e.g. "whatsapp:+14155238886".
+            base_url (str): API root; point it at a local fake in tests.
+            rate (float): Messages per second allowed by the account.
+            burst (int): Bucket capacity. Defaults to one second's worth.
+            max_workers (int): Concurrent requests (and pooled connections).
+            max_retries (int): Retries after the first attempt.
+            backoff (float): Base delay in seconds, doubled on each retry.
+            dedupe_window (float): Seconds during which a message with the same
+                dedupe key (one reminder occurrence) is not sent again.
+        """
+        self.url = f"{base_url}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.from_number = from_number
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="whatsapp-send")
+        self.dedupe_window = dedupe_window
+        self.dedupe_size = dedupe_size
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        Builds a sender from TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and
+        TWILIO_WHATSAPP_FROM, or returns None when they are not set.
+        """
+        sid, token = os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN")
+        from_number = os.getenv("TWILIO_WHATSAPP_FROM")
+        if not (sid and token and from_number):
+            return None
+        return cls(sid, token, from_number, **kwargs)
+
+    def send(self, to, body):
+        """
+        Sends one message, retrying transient failures.
+        Returns:
+            dict: to, status ("sent" or "failed"), sid, attempts, error and
+            retryable (False when the request itself was rejected, so sending
+            it again cannot succeed).
+        """
+        to = to if to.startswith("whatsapp:") else f"whatsapp:{to}"
+        result = {"to": to, "status": "failed", "sid": None, "attempts": 0, "error": None, "retryable": True}
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            result["attempts"] = attempt + 1
+            retry_after = None
+            try:
+                res = self.session.post(self.url, data={"From": self.from_number, "To": to, "Body": body},
+                                        timeout=self.timeout)
+                if res.status_code < 300:
+                    result.update(status="sent", sid=res.json().get("sid"), error=None)
+                    return result
+                result["error"] = f"HTTP {res.status_code}: {res.text[:200]}"
+                if res.status_code not in RETRY_STATUSES:
+                    result["retryable"] = res.status_code >= 500
+                    return result
+                retry_after = res.headers.get("Retry-After")
+            except requests.RequestException as e:
+                result["error"] = str(e)
+            if attempt < self.max_retries:
+                delay = self.backoff * 2 ** attempt
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                time.sleep(delay * random.uniform(0.8, 1.2))
+        return result
+
+    def send_many(self, messages):
+        """
+        Sends a batch concurrently, skipping duplicates.
+        Args:
+            messages (list): (to, body) pairs, or (to, body, key) triples. A message
+                whose key was already sent within dedupe_window is skipped; use one
+                key per reminder occurrence. Messages without a key are always sent.
+        Returns:
+            dict: sent, failed and duplicates counts, elapsed seconds,
+            msgs_per_sec and the results of the messages sent (each with its key).
+        """
+        start = time.perf_counter()
+        unique, duplicates = [], 0
+        for message in messages:
+            to, body, key = (tuple(message) + (None,))[:3]
+            if key is not None and self._seen(key):
+                duplicates += 1
+            else:
+                unique.append((to, body, key))
+        results = list(self._executor.map(lambda m: self.send(m[0], m[1]), unique))
+        for (_, _, key), result in zip(unique, results):
+            result["key"] = key
+            if key is not None and result["status"] != "sent":
+                self._forget(key)  # only delivered occurrences count as sent if dispatched again
+        elapsed = time.perf_counter() - start
+        sent = sum(r["status"] == "sent" for r in results)
+        return {
+            "sent": sent,
+            "failed": len(results) - sent,
+            "duplicates": duplicates,
+            "elapsed": elapsed,
+            "msgs_per_sec": sent / elapsed if elapsed > 0 else 0.0,
+            "results": results,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    # ── internals ──────────────────────────────────────────────────
+    def _seen(self, key):
+        now = time.monotonic()
+        with self._recent_lock:
+            while self._recent:
+                oldest, stamp = next(iter(self._recent.items()))
+                if now - stamp <= self.dedupe_window and len(self._recent) <= self.dedupe_size:
+                    break
+                self._recent.popitem(last=False)
+            if key in self._recent:
+                return True
+            self._recent[key] = now
+            return False
+
+    def _forget(self, key):
+        with self._recent_lock:
+            self._recent.pop(key, None)
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """Returns the process-wide sender configured from the environment, or None."""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = WhatsAppSender.from_env()
+        return _sender
+
+
+def deliver_reminders(batch, sender=None):
+    """
+    ReminderScheduler dispatch function: reminders with a recipient go out over
+    WhatsApp in one concurrent, rate-limited batch; the rest are displayed.
+    Args:
+        batch (list): Due Reminder objects.
+        sender (WhatsAppSender): Defaults to get_sender().
+    Returns:
+        list: One outcome per reminder: DELIVERED (also for occurrences the
+        sender had already delivered), RETRY for transient send failures and
+        FAILED for messages Twilio rejected.
+    """
+    from notification_system import display_reminder
+    from reminder_scheduler import DELIVERED, FAILED, RETRY
+
+    sender = sender or get_sender()
+    outcomes, outgoing = [DELIVERED] * len(batch), {}
+    for i, reminder in enumerate(batch):
+        if reminder.recipient and sender is not None:
+            # One key per occurrence: a recurring reminder's next due time is a new message
+            outgoing[f"{reminder.id}@{reminder.due}"] = i
+        elif not getattr(reminder, "attempts", 0):
+            display_reminder(reminder.message)  # shown on the first attempt only
+    if not outgoing:
+        return outcomes
+    stats = sender.send_many([(batch[i].recipient, batch[i].message, key) for key, i in outgoing.items()])
+    failures = [r for r in stats["results"] if r["status"] != "sent"]
+    for result in failures:
+        outcomes[outgoing[result["key"]]] = RETRY if result["retryable"] else FAILED
+    if failures:
+        print(f"{len(failures)} of {len(outgoing)} reminders could not be delivered, e.g. {failures[0]['error']}")
+    return outcomes
+
+
+if __name__ == "__main__":
+    # Benchmark: throughput against a local fake Twilio endpoint
+    import sys
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class FakeTwilio(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(0.02)  # simulated API latency
+            body = b'{"sid": "SM0000"}'
+            self.send_response(201)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTwilio)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    messages = [(f"+1555{i:07d}", "Time for a deep breath 🌿") for i in range(n)]
+
+    for rate, workers in [(80, 16), (400, 32), (1000, 64)]:
+        sender = WhatsAppSender("AC_test", "token", "whatsapp:+14155238886",
+                                base_url=f"http://127.0.0.1:{server.server_port}", rate=rate, max_workers=workers)
+        stats = sender.send_many(messages[:min(n, rate * 5)])
+        print(f"rate {rate}/s, {workers} workers: {stats['sent']} sent, {stats['msgs_per_sec']:.0f} msgs/sec")
+        sender.close()
+    server.shutdown()
@@ -0,0 +1,366 @@
+import heapq
+import math
+import sqlite3
+import threading
+import time
+
+# Per-reminder results a dispatch function may return
+DELIVERED = "delivered"
+RETRY = "retry"    # transient failure: fire the same occurrence again later
+FAILED = "failed"  # permanent failure: retrying cannot help
+
+
+class Reminder:
+    __slots__ = ("id", "due", "message", "interval", "recipient", "attempts", "retry_at")
+
+    def __init__(self, id, due, message, interval=None, recipient=None):
+        self.id = id
+        self.due = due
+        self.message = message
+        self.interval = interval
+        self.recipient = recipient
+        # Failed dispatches keep `due` (the occurrence) and fire again at retry_at
+        self.attempts = 0
+        self.retry_at = None
+
+    @property
+    def fire_at(self):
+        return self.due if self.retry_at is None else self.retry_at
+
+    def __repr__(self):
+        return f"Reminder(id={self.id}, due={self.due}, message={self.message!r})"
+
+
+def _print_batch(batch):
+    from notification_system import display_reminder
+    for reminder in batch:
+        display_reminder(reminder.message)
+
+
+class ReminderScheduler:
+    """
+    Single-threaded reminder scheduler backed by a binary heap.
+
+    One background thread sleeps until the earliest reminder is due and hands
+    every due reminder to `dispatch` in batches, instead of one OS thread per
+    reminder. With a store, reminders are written to SQLite and reloaded on
+    start-up; only the earliest `max_in_memory` of them are kept in the heap,
+    the rest are paged in from the store as the earlier ones fire. Delivery is
+    at-least-once: a reminder leaves the store only after its batch was
+    dispatched, so a crash mid-batch re-fires it after restart. `dispatch`
+    may return one outcome per reminder (DELIVERED, RETRY or FAILED); only
+    the RETRY ones fire again, with exponential backoff, up to max_attempts.
+    If it raises, the whole batch is retried. Returning None means the whole
+    batch was delivered.
+    """
+
+    def __init__(self, store_path=None, dispatch=_print_batch, batch_size=1000,
+                 max_in_memory=1000000, clock=time.time, retry_delay=60.0, max_retry_delay=3600.0,
+                 max_attempts=8):
+        """
+        Args:
+            store_path (str): SQLite file for durable reminders. None keeps them in memory only.
+            dispatch (callable): f(list of Reminder) called on the scheduler thread;
+                returns None or a list with one outcome per reminder.
+            batch_size (int): Maximum reminders per dispatch call.
+            max_in_memory (int): Heap size above which later reminders stay on disk
+                (only with a store).
+            clock (callable): Returns the current time in epoch seconds.
+            retry_delay (float): Seconds before a failed batch is dispatched again;
+                doubles with every further failure.
+            max_retry_delay (float): Upper bound for the retry delay.
+            max_attempts (int): Dispatch attempts per occurrence before it is given up.
+        """
+        self.dispatch = dispatch
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.max_in_memory = max_in_memory
+        self.clock = clock
+        self._heap = []
+        self._reminders = {}
+        self._in_flight = {}
+        self._next_id = 1
+        # Everything scheduled at or before (due, id) is in the heap; later ones only on disk
+        self._horizon = (math.inf, 0)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._stopping = False
+        self.fired = 0
+
+        self._db = None
+        if store_path:
+            self._db = sqlite3.connect(store_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reminders ("
+                "id INTEGER PRIMARY KEY, due REAL NOT NULL, message TEXT NOT NULL, "
+                "interval REAL, recipient TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS reminders_due ON reminders (due, id)")
+            self._db.commit()
+            self._next_id = (self._db.execute("SELECT MAX(id) FROM reminders").fetchone()[0] or 0) + 1
+            self._horizon = (-math.inf, 0)
+            self._page_in()
+
+    def schedule(self, message, due, interval=None, recipient=None):
+        """
+        Schedules a reminder.
+        Args:
+            message (str): The reminder message.
+            due (float | datetime.datetime): When it should fire.
+            interval (float): Repeat every `interval` seconds; None fires once.
+            recipient (str): Optional delivery address, e.g. a WhatsApp number.
+        Returns:
+            int: Reminder id, usable with cancel().
+        """
+        return self.schedule_many([(message, due, interval, recipient)])[0]
+
+    def schedule_many(self, items):
+        """
+        Schedules many reminders in one transaction.
+        Args:
+            items (list): (message, due[, interval[, recipient]]) tuples.
+        Returns:
+            list: Reminder ids in input order.
+        """
+        with self._lock:
+            reminders = []
+            for item in items:
+                message, due, interval, recipient = (tuple(item) + (None, None))[:4]
+                if hasattr(due, "timestamp"):
+                    due = due.timestamp()
+                if interval is not None and interval <= 0:
+                    raise ValueError("interval must be positive.")
+                reminders.append(Reminder(self._next_id, float(due), message, interval, recipient))
+                self._next_id += 1
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT INTO reminders (id, due, message, interval, recipient) VALUES (?, ?, ?, ?, ?)",
+                    [(r.id, r.due, r.message, r.interval, r.recipient) for r in reminders],
+                )
+                self._db.commit()
+            earliest = self._heap[0][0] if self._heap else math.inf
+            for reminder in reminders:
+                self._push(reminder)
+            if self._heap and self._heap[0][0] < earliest:
+                self._wakeup.notify()
+            return [r.id for r in reminders]
+
+    def cancel(self, reminder_id):
+        """
+        Cancels a pending (or recurring) reminder.
+        Returns:
+            bool: True if the reminder existed.
+        """
+        with self._lock:
+            # The heap entry stays behind and is skipped when it surfaces
+            found = (self._reminders.pop(reminder_id, None) or self._in_flight.pop(reminder_id, None)) is not None
+            if self._db is not None:
+                deleted = self._db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,)).rowcount
+                self._db.commit()
+                found = found or deleted > 0
+            return found
+
+    def run_pending(self, now=None):
+        """
+        Fires every reminder due at `now` on the calling thread.
+        Returns:
+            int: Number of reminders dispatched.
+        """
+        fired = 0
+        now = self.clock() if now is None else now
+        while True:
+            with self._lock:
+                batch = self._pop_due(now)
+            if not batch:
+                return fired
+            fired += self._dispatch(batch, now)
+
+    def next_due(self):
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def start(self):
+        """Starts the scheduler thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def close(self):
+        self.stop()
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        with self._lock:
+            if self._db is not None:
+                return self._db.execute("SELECT COUNT(*) FROM reminders").fetchone()[0]
+            return len(self._reminders)
+
+    # ── internals ──────────────────────────────────────────────────
+    def _push(self, reminder):
+        if (reminder.due, reminder.id) > self._horizon:
+            return  # stays on disk until its page is loaded
+        self._reminders[reminder.id] = reminder
+        heapq.heappush(self._heap, (reminder.fire_at, reminder.id))
+        if self._db is not None and len(self._reminders) > self.max_in_memory:
+            self._spill()
+
+    def _spill(self):
+        # Keep the earliest half in memory; the rest are already in the store
+        keep = heapq.nsmallest(self.max_in_memory // 2,
+                               ((r.due, r.id) for r in self._reminders.values()))
+        self._horizon = keep[-1]
+        self._reminders = {key[1]: self._reminders[key[1]] for key in keep}
+        self._heap = [(self._reminders[rid].fire_at, rid) for _, rid in keep]
+        heapq.heapify(self._heap)
+
+    def _page_in(self):
+        due, rid = self._horizon
+        limit = max(1, self.max_in_memory // 2)
+        rows = self._db.execute(
+            "SELECT id, due, message, interval, recipient FROM reminders "
+            "WHERE due > ? OR (due = ? AND id > ?) ORDER BY due, id LIMIT ?",
+            (due, due, rid, limit),
+        ).fetchall()
+        self._horizon = (rows[-1][1], rows[-1][0]) if len(rows) == limit else (math.inf, 0)
+        for row in rows:
+            self._reminders[row[0]] = Reminder(*row)
+            heapq.heappush(self._heap, (row[1], row[0]))
+
+    def _drop_stale(self):
+        while True:
+            while self._heap:
+                due, rid = self._heap[0]
+                reminder = self._reminders.get(rid)
+                if reminder is not None and reminder.fire_at == due:
+                    break
+                heapq.heappop(self._heap)
+            if self._db is None or self._horizon[0] == math.inf:
+                return
+            # A retry can be due later than reminders still on disk
+            if self._heap and self._heap[0][0] <= self._horizon[0]:
+                return
+            self._page_in()
+
+    def _pop_due(self, now):
+        batch = []
+        while len(batch) < self.batch_size:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, rid = heapq.heappop(self._heap)
+            reminder = self._in_flight[rid] = self._reminders.pop(rid)
+            batch.append(reminder)
+        return batch
+
+    def _dispatch(self, batch, now):
+        """
+        Returns:
+            int: Reminders delivered.
+        """
+        try:
+            outcomes = self.dispatch(batch)
+            if outcomes is None:
+                outcomes = [DELIVERED] * len(batch)
+            elif len(outcomes) != len(batch):
+                raise ValueError(f"dispatch returned {len(outcomes)} outcomes for {len(batch)} reminders")
+        except Exception as e:
+            print(f"Reminder dispatch failed, retrying {len(batch)} reminders: {e}")
+            outcomes = [RETRY] * len(batch)
+        with self._lock:
+            finished, repeating, retrying, given_up = [], [], [], []
+            for reminder, outcome in zip(batch, outcomes):
+                if self._in_flight.pop(reminder.id, None) is None:
+                    continue  # cancelled while being dispatched
+                if outcome == RETRY:
+                    reminder.attempts += 1
+                    if reminder.attempts < self.max_attempts:
+                        # Stays stored with the same due time, i.e. the same occurrence
+                        delay = self.retry_delay * 2 ** (reminder.attempts - 1)
+                        reminder.retry_at = now + min(delay, self.max_retry_delay)
+                        retrying.append(reminder)
+                        continue
+                    outcome = FAILED
+                if outcome == FAILED:
+                    given_up.append((reminder.id, reminder.message, reminder.due))
+                reminder.attempts, reminder.retry_at = 0, None
+                if reminder.interval:
+                    # Skip occurrences missed while the process was down or retrying
+                    missed = max(1, math.ceil((now - reminder.due) / reminder.interval))
+                    reminder.due += missed * reminder.interval
+                    repeating.append(reminder)
+                else:
+                    finished.append(reminder.id)
+            if self._db is not None:
+                self._db.executemany("DELETE FROM reminders WHERE id = ?", [(rid,) for rid in finished])
+                self._db.executemany("UPDATE reminders SET due = ? WHERE id = ?",
+                                     [(r.due, r.id) for r in repeating])
+                self._db.commit()
+            for reminder in repeating + retrying:
+                self._push(reminder)
+            delivered = sum(outcome == DELIVERED for outcome in outcomes)
+            self.fired += delivered
+        for rid, message, due in given_up:
+            print(f"Giving up on reminder {rid} ({message!r}) due at {due}.")
+        return delivered
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._stopping:
+                    self._drop_stale()
+                    now = self.clock()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._wakeup.wait(timeout)
+                if self._stopping:
+                    return
+                now = self.clock()
+                batch = self._pop_due(now)
+            self._dispatch(batch, now)
+
+
+if __name__ == "__main__":
+    # Benchmark: scheduling, firing and reload throughput
+    import os
+    import tempfile
+
+    n = 200000
+    base = time.time()
+    items = [(f"Reminder {i}", base + (i * 7919) % n, None, f"+1555{i:07d}") for i in range(n)]
+
+    for label, path, cap in [("in-memory", None, 1000000),
+                             ("sqlite", os.path.join(tempfile.mkdtemp(), "reminders.db"), 1000000),
+                             ("sqlite, 50k in memory", os.path.join(tempfile.mkdtemp(), "reminders.db"), 50000)]:
+        scheduler = ReminderScheduler(path, dispatch=lambda batch: None, max_in_memory=cap)
+        start = time.perf_counter()
+        for i in range(0, n, 10000):
+            scheduler.schedule_many(items[i:i + 10000])
+        scheduled = time.perf_counter() - start
+        if path:
+            scheduler.close()
+            start = time.perf_counter()
+            scheduler = ReminderScheduler(path, dispatch=lambda batch: None, max_in_memory=cap)
+            print(f"{label}: reload {len(scheduler)} reminders in {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        fired = scheduler.run_pending(now=base + n)
+        firing = time.perf_counter() - start
+        print(f"{label}: schedule {n / scheduled:,.0f}/s, fire {fired / firing:,.0f}/s")
+        scheduler.close()
@@ -0,0 +1,256 @@
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Approximate bytes of bookkeeping per turn (slots object, float, int) and
+# per session (record, turn list, key string, OrderedDict entry)
+TURN_OVERHEAD = 136
+SESSION_OVERHEAD = 320
+ROLE_LABELS = {"user": "User", "assistant": "AI"}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+class Turn:
+    __slots__ = ("role", "text", "ts", "tokens")
+
+    def __init__(self, role, text, ts, tokens):
+        self.role = role
+        self.text = text
+        self.ts = ts
+        self.tokens = tokens
+
+
+class _Session:
+    __slots__ = ("turns", "nbytes", "last_seen")
+
+    def __init__(self, last_seen):
+        self.turns = []
+        self.nbytes = SESSION_OVERHEAD
+        self.last_seen = last_seen
+
+
+class SessionStore:
+    """
+    Bounded in-memory conversation history, keyed by user or session id.
+
+    Sessions are kept in least-recently-used order. When their estimated size
+    exceeds max_bytes the least recently active ones are evicted, to the spill
+    database when one is configured (and transparently reloaded on the next
+    message) or dropped otherwise. Sessions idle for longer than idle_ttl
+    expire. build_context() returns as many of the latest turns as fit into a
+    token budget.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, idle_ttl=3600.0, max_turns=40,
+                 spill_path=None, count_tokens=estimate_tokens, clock=time.time):
+        """
+        Args:
+            max_bytes (int): Memory budget for all sessions.
+            idle_ttl (float): Seconds without activity after which a session expires.
+            max_turns (int): Turns kept per session; older ones are discarded.
+            spill_path (str): Optional SQLite file receiving evicted sessions.
+            count_tokens (callable): f(text) -> tokens, e.g. a real tokenizer.
+            clock (callable): Returns the current time in epoch seconds.
+        """
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.count_tokens = count_tokens
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._db = None
+        if spill_path:
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, last_seen REAL, turns TEXT)"
+            )
+            self._db.commit()
+
+    def append(self, sid, role, text):
+        """
+        Adds a turn to a session, creating (or reloading) the session.
+        Args:
+            sid (str): Session key, e.g. a WhatsApp From number.
+            role (str): "user" or "assistant".
+            text (str): The message.
+        """
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            session = self._get(sid, now, create=True)
+            turn = Turn(role, text, now, self.count_tokens(text))
+            session.turns.append(turn)
+            size = TURN_OVERHEAD + sys.getsizeof(text)
+            session.nbytes += size
+            self.nbytes += size
+            if len(session.turns) > self.max_turns:
+                dropped = session.turns.pop(0)
+                size = TURN_OVERHEAD + sys.getsizeof(dropped.text)
+                session.nbytes -= size
+                self.nbytes -= size
+            self._evict()
+
+    def history(self, sid):
+        """
+        Returns:
+            list: The session's Turn records, oldest first.
+        """
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            session = self._get(sid, now)
+            return list(session.turns) if session else []
+
+    def build_context(self, sid, max_tokens=1024):
+        """
+        Formats the latest turns that fit into a token budget.
+        Args:
+            sid (str): Session key.
+            max_tokens (int): Budget for the history part of the prompt.
+        Returns:
+            str: "User: ...\\nAI: ...\\n" lines, oldest first; empty if no history.
+        """
+        lines, used = [], 0
+        for turn in reversed(self.history(sid)):
+            label = ROLE_LABELS.get(turn.role, turn.role)
+            cost = turn.tokens + 2  # role label and newline
+            if used + cost > max_tokens:
+                break
+            lines.append(f"{label}: {turn.text}\n")
+            used += cost
+        return "".join(reversed(lines))
+
+    def clear(self, sid):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+            if session is not None:
+                self.nbytes -= session.nbytes
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+    # ── internals ──────────────────────────────────────────────────
+    def _get(self, sid, now, create=False):
+        session = self._sessions.get(sid)
+        if session is not None:
+            self._sessions.move_to_end(sid)
+        else:
+            session = self._load(sid, now)
+            if session is None:
+                if not create:
+                    return None
+                session = _Session(now)
+            self._sessions[sid] = session
+            self.nbytes += session.nbytes
+        session.last_seen = now
+        return session
+
+    def _load(self, sid, now):
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT last_seen, turns FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            return None
+        # The row stays behind; it is replaced on the next spill or purged once idle
+        if now - row[0] > self.idle_ttl:
+            return None
+        session = _Session(row[0])
+        for role, text, ts, tokens in json.loads(row[1]):
+            session.turns.append(Turn(role, text, ts, tokens))
+            session.nbytes += TURN_OVERHEAD + sys.getsizeof(text)
+        return session
+
+    def _expire(self, now):
+        # LRU order is also last-activity order, so expired sessions sit at the front
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.nbytes -= session.nbytes
+            self.expirations += 1
+
+    def _evict(self):
+        if self.nbytes <= self.max_bytes:
+            return
+        # Evict down to a low watermark so spills are written in batches
+        target = self.max_bytes * 0.9
+        spilled = []
+        while self.nbytes > target and len(self._sessions) > 1:
+            sid, session = self._sessions.popitem(last=False)
+            self.nbytes -= session.nbytes
+            self.evictions += 1
+            if self._db is not None:
+                turns = [(t.role, t.text, t.ts, t.tokens) for t in session.turns]
+                spilled.append((sid, session.last_seen, json.dumps(turns)))
+        if spilled:
+            self._db.executemany("INSERT OR REPLACE INTO sessions (sid, last_seen, turns) VALUES (?, ?, ?)", spilled)
+            cutoff = self.clock() - self.idle_ttl
+            self._db.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+            self._db.commit()
+
+
+if __name__ == "__main__":
+    # Benchmark: 100k concurrent users under a fixed memory budget
+    import os
+    import random
+    import tempfile
+    import tracemalloc
+
+    rng = random.Random(0)
+    users = [f"whatsapp:+1555{i:07d}" for i in range(100000)]
+    messages = ["I can't sleep before my exams", "Work has been overwhelming lately",
+                "Thanks, that breathing exercise helped", "I feel a bit lonely this week"]
+
+    for budget_mb, spill in [(64, None), (16, None), (16, os.path.join(tempfile.mkdtemp(), "sessions.db"))]:
+        tracemalloc.start()
+        store = SessionStore(max_bytes=budget_mb * 1024 * 1024, spill_path=spill)
+        start = time.perf_counter()
+        for _ in range(3):
+            for user in users:
+                store.append(user, "user", rng.choice(messages))
+                store.append(user, "assistant", "That sounds hard. Let's take it one step at a time together.")
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for user in users[-1000:]:
+            store.build_context(user, max_tokens=512)
+        context_us = (time.perf_counter() - start) / 1000 * 1e6
+        stats = store.stats()
+        label = f"{budget_mb} MB budget" + (", spill" if spill else "")
+        print(f"{label}: {6 * len(users) / elapsed:,.0f} turns/s, {stats['sessions']:,} sessions in memory, "
+              f"estimated {stats['bytes'] / 2**20:.1f} MB, traced {current / 2**20:.1f} MB "
+              f"(peak {peak / 2**20:.1f}), {stats['evictions']:,} evictions, build_context {context_us:.0f} us")
+        store.close()
@@ -0,0 +1,370 @@
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import bindparam, inspect, text
+
+TIPS_TABLE = "mental_health_tips"
+FETCH_CHUNK = 500
+# int8 codes of the normalized embedding, written by tip_quantize.py and tip_ingest.py
+QUANTIZED_COLUMN = "embedding_q8"
+# TIP_INDEX_QUANTIZED=1 loads embedding_q8 instead of the float32 embeddings;
+# TIP_INDEX_RERANK=N re-scores the best N candidates with their float32 embeddings
+QUANTIZED = os.environ.get("TIP_INDEX_QUANTIZED", "0") == "1"
+RERANK = int(os.environ.get("TIP_INDEX_RERANK", 0))
+SCORE_BLOCK = 2048  # int8 rows widened to float32 at a time; small enough to stay in cache
+
+
+def _normalize_rows(matrix):
+    """
+    Scales every row of a 2-D float32 matrix to unit length (in place).
+    Zero rows are left as zeros so they can never win a search.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def quantize_int8(matrix):
+    """
+    Quantizes embeddings to int8 with one scale per vector.
+    Rows are normalized first, so code @ query * scale approximates the cosine.
+    Args:
+        matrix (np.ndarray): 2-D float array, one embedding per row.
+    Returns:
+        tuple: (int8 codes of the same shape, float32 scale per row).
+    """
+    matrix = _normalize_rows(np.array(matrix, dtype=np.float32, ndmin=2))
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def encode_int8(vec):
+    """
+    Returns:
+        bytes: The float32 scale followed by the int8 codes (dim + 4 bytes, vs. 4 * dim for float32).
+    """
+    codes, scales = quantize_int8(vec)
+    return scales[:1].tobytes() + codes[0].tobytes()
+
+
+def decode_int8(blob):
+    """
+    Returns:
+        tuple: (int8 codes, float scale) of an encode_int8() blob.
+    """
+    return np.frombuffer(blob, dtype=np.int8, offset=4), float(np.frombuffer(blob, dtype=np.float32, count=1)[0])
+
+
+def version_column_for(engine, table=TIPS_TABLE, column="text_hash"):
+    """
+    Returns:
+        str: column if the tips table has it (tip_ingest.py adds it), otherwise None,
+        so TipIndex falls back to tracking new and deleted rows only.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return None
+    return column if column in {c["name"] for c in inspector.get_columns(table)} else None
+
+
+class TipIndex:
+    """
+    In-memory cosine-similarity index over the mental_health_tips table.
+
+    All embeddings are kept in one contiguous, pre-normalized float32 matrix,
+    so a query is a single matrix-vector product followed by argpartition.
+    refresh() only pulls rows that are new (or changed, when a version column
+    such as text_hash is available) instead of re-reading every blob.
+
+    With quantized=True the index loads the int8 embedding_q8 column instead
+    (see tip_quantize.py): a quarter of the memory and of the bytes read from
+    the database. Float queries are scored against the int8 codes directly,
+    and the best `rerank` candidates can be re-scored exactly from their
+    float32 embeddings.
+    """
+
+    def __init__(self, engine, table=TIPS_TABLE, key_column="id",
+                 version_column=None, max_age=60.0, quantized=QUANTIZED, rerank=RERANK):
+        """
+        Args:
+            engine (sqlalchemy.engine.Engine): Engine used to read the tips table.
+            table (str): Name of the tips table.
+            key_column (str): Unique, monotonically increasing row id column.
+            version_column (str): Optional column that changes whenever a row is
+                edited (e.g. "text_hash"). Without it only new and deleted rows
+                are picked up incrementally; use refresh(full=True) after edits.
+            max_age (float): Seconds after which search() refreshes the index
+                automatically. None disables auto-refresh.
+            quantized (bool): Keep int8 codes from the embedding_q8 column instead of float32.
+            rerank (int): With quantized, re-score this many top candidates with the
+                float32 embeddings from the table. 0 returns the int8 scores.
+        """
+        self.engine = engine
+        self.table = table
+        self.key_column = key_column
+        self.version_column = version_column
+        self.max_age = max_age
+        self.quantized = quantized
+        self.rerank = rerank if quantized else 0
+        self._column = QUANTIZED_COLUMN if quantized else "embedding"
+
+        self._lock = threading.RLock()
+        self._ids = []
+        self._positions = {}
+        self._versions = {}
+        self._topics = []
+        self._texts = []
+        self._reset()
+        self._last_refresh = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def dim(self):
+        return self._matrix.shape[1] if len(self._ids) else 0
+
+    @property
+    def nbytes(self):
+        """Memory held by the embeddings (and int8 scales)."""
+        return self._matrix.nbytes + self._scales.nbytes
+
+    def refresh(self, full=False):
+        """
+        Synchronizes the index with the tips table.
+        Args:
+            full (bool): Reload every row instead of applying only the changes.
+        Returns:
+            dict: Counts of added, updated and removed rows.
+        """
+        with self._lock:
+            if full:
+                self._reset()
+
+            with self.engine.connect() as conn:
+                current = self._fetch_versions(conn)
+                removed = [i for i in self._ids if i not in current]
+                max_known = max(self._ids) if self._ids else None
+                added, changed = [], []
+                for key, version in current.items():
+                    if key not in self._positions:
+                        added.append(key)
+                    elif self.version_column and self._versions.get(key) != version:
+                        changed.append(key)
+
+                if removed:
+                    self._remove(removed)
+                if added or changed:
+                    if (not self.version_column and not changed and max_known is not None
+                            and min(added) > max_known):
+                        rows = self._fetch_rows_after(conn, max_known)
+                    else:
+                        rows = self._fetch_rows(conn, added + changed)
+                    self._upsert(rows, current)
+
+            self._last_refresh = time.monotonic()
+            return {"added": len(added), "updated": len(changed), "removed": len(removed)}
+
+    def search(self, vec, k=1):
+        """
+        Finds the k tips most similar to a query embedding.
+        Args:
+            vec (array-like): Query embedding (need not be normalized).
+            k (int): Number of results to return.
+        Returns:
+            list: Dicts with id, topic, tip_text and score, best match first.
+        """
+        if self._is_stale():
+            self.refresh()
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return []
+            query = np.asarray(vec, dtype=np.float32).ravel()
+            if query.shape[0] != self._matrix.shape[1]:
+                raise ValueError(
+                    f"Query has {query.shape[0]} dimensions, index has {self._matrix.shape[1]}."
+                )
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return []
+            query = query / norm
+            scores = self._scores(query)
+
+            m = min(max(k, self.rerank), n)
+            if m < n:
+                top = np.argpartition(-scores, m - 1)[:m]
+            else:
+                top = np.arange(n)
+            top = top[np.argsort(-scores[top])]
+            results = [
+                {
+                    "id": self._ids[i],
+                    "topic": self._topics[i],
+                    "tip_text": self._texts[i],
+                    "score": float(scores[i]),
+                }
+                for i in top
+            ]
+
+        if self.rerank and self.engine is not None:
+            results = self._rerank(results, query)
+        return results[:k]
+
+    # ── internals ──────────────────────────────────────────────────
+    def _is_stale(self):
+        if self._last_refresh is None:
+            return True
+        if self.max_age is None:
+            return False
+        return time.monotonic() - self._last_refresh > self.max_age
+
+    def _reset(self):
+        self._ids, self._positions, self._versions = [], {}, {}
+        self._topics, self._texts = [], []
+        self._matrix = np.empty((0, 0), dtype=np.int8 if self.quantized else np.float32)
+        self._scales = np.empty(0, dtype=np.float32)
+
+    def _scores(self, query):
+        if not self.quantized:
+            return self._matrix @ query
+        # Asymmetric scoring: the float query against int8 codes, widened block by
+        # block so the float32 copy never exceeds SCORE_BLOCK rows
+        n = len(self._ids)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCORE_BLOCK):
+            block = self._matrix[start:start + SCORE_BLOCK]
+            np.matmul(block.astype(np.float32), query, out=scores[start:start + len(block)])
+        scores *= self._scales
+        return scores
+
+    def _rerank(self, results, query):
+        stmt = text(
+            f"SELECT {self.key_column}, embedding FROM {self.table} WHERE {self.key_column} IN :keys"
+        ).bindparams(bindparam("keys", expanding=True))
+        with self.engine.connect() as conn:
+            exact = {key: emb for key, emb in conn.execute(stmt, {"keys": [r["id"] for r in results]})}
+        for result in results:
+            emb = exact.get(result["id"])
+            if emb is not None:
+                vec = np.frombuffer(emb, dtype=np.float32)
+                norm = np.linalg.norm(vec)
+                if norm and vec.shape[0] == query.shape[0]:
+                    result["score"] = float(vec @ query / norm)
+        return sorted(results, key=lambda r: -r["score"])
+
+    def _fetch_versions(self, conn):
+        version = self.version_column or "NULL"
+        rows = conn.execute(text(
+            f"SELECT {self.key_column}, {version} FROM {self.table} WHERE {self._column} IS NOT NULL"
+        ))
+        return {key: ver for key, ver in rows}
+
+    def _fetch_rows_after(self, conn, last_key):
+        return conn.execute(
+            text(
+                f"SELECT {self.key_column}, topic, tip_text, {self._column} FROM {self.table} "
+                f"WHERE {self.key_column} > :last_key AND {self._column} IS NOT NULL"
+            ),
+            {"last_key": last_key},
+        ).fetchall()
+
+    def _fetch_rows(self, conn, keys):
+        stmt = text(
+            f"SELECT {self.key_column}, topic, tip_text, {self._column} FROM {self.table} "
+            f"WHERE {self.key_column} IN :keys"
+        ).bindparams(bindparam("keys", expanding=True))
+        rows = []
+        for start in range(0, len(keys), FETCH_CHUNK):
+            rows.extend(conn.execute(stmt, {"keys": keys[start:start + FETCH_CHUNK]}))
+        return rows
+
+    def _remove(self, keys):
+        drop = {self._positions[k] for k in keys}
+        keep = [i for i in range(len(self._ids)) if i not in drop]
+        self._ids = [self._ids[i] for i in keep]
+        self._topics = [self._topics[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._matrix = np.ascontiguousarray(self._matrix[keep])
+        if self.quantized:
+            self._scales = self._scales[keep]
+        for k in keys:
+            self._versions.pop(k, None)
+        self._positions = {k: i for i, k in enumerate(self._ids)}
+
+    def _upsert(self, rows, versions):
+        new_ids, new_topics, new_texts, new_vecs, new_scales = [], [], [], [], []
+        for key, topic, tip_text, emb in rows:
+            if self.quantized:
+                vec, scale = decode_int8(emb)
+            else:
+                vec, scale = np.frombuffer(emb, dtype=np.float32), None
+            self._versions[key] = versions.get(key)
+            pos = self._positions.get(key)
+            if pos is not None:
+                if vec.shape[0] != self._matrix.shape[1]:
+                    raise ValueError(f"Tip {key} has {vec.shape[0]} dimensions, index has {self._matrix.shape[1]}.")
+                self._topics[pos], self._texts[pos] = topic, tip_text
+                self._matrix[pos] = vec
+                if self.quantized:
+                    self._scales[pos] = scale
+                else:
+                    _normalize_rows(self._matrix[pos:pos + 1])
+            else:
+                new_ids.append(key)
+                new_topics.append(topic)
+                new_texts.append(tip_text)
+                new_vecs.append(vec)
+                new_scales.append(scale)
+
+        if not new_vecs:
+            return
+        if self.quantized:
+            block = np.vstack(new_vecs)
+        else:
+            block = _normalize_rows(np.vstack(new_vecs).astype(np.float32, copy=True))
+        if len(self._ids):
+            if block.shape[1] != self._matrix.shape[1]:
+                raise ValueError(f"New tips have {block.shape[1]} dimensions, index has {self._matrix.shape[1]}.")
+            self._matrix = np.ascontiguousarray(np.vstack([self._matrix, block]))
+        else:
+            self._matrix = block
+        if self.quantized:
+            self._scales = np.concatenate([self._scales, np.asarray(new_scales, dtype=np.float32)])
+        start = len(self._ids)
+        self._ids.extend(new_ids)
+        self._topics.extend(new_topics)
+        self._texts.extend(new_texts)
+        self._positions.update({k: start + i for i, k in enumerate(new_ids)})
+
+
+if __name__ == "__main__":
+    # Example usage against an in-memory SQLite stand-in for TiDB
+    from sqlalchemy import create_engine
+
+    engine = create_engine("sqlite://")
+    rng = np.random.default_rng(0)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE mental_health_tips (id INTEGER PRIMARY KEY, topic TEXT, tip_text TEXT, embedding BLOB)"
+        ))
+        conn.execute(
+            text("INSERT INTO mental_health_tips (topic, tip_text, embedding) VALUES (:t, :x, :e)"),
+            [{"t": f"topic {i}", "x": f"tip {i}", "e": rng.standard_normal(384).astype(np.float32).tobytes()}
+             for i in range(10000)],
+        )
+
+    index = TipIndex(engine)
+    print("Refresh:", index.refresh())
+    query = rng.standard_normal(384).astype(np.float32)
+    start = time.perf_counter()
+    for _ in range(100):
+        results = index.search(query, k=3)
+    print(f"Search over {len(index)} tips: {(time.perf_counter() - start) * 10:.3f} ms/query")
+    print(results)
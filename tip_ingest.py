@@ -0,0 +1,215 @@
+import csv
+import hashlib
+import json
+import time
+
+import numpy as np
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, String, Table, Text, inspect, text
+
+from tip_index import QUANTIZED_COLUMN, TIPS_TABLE, encode_int8
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def tip_hash(topic, tip_text):
+    """
+    Content hash used to detect unchanged tips.
+    Args:
+        topic (str): Tip topic.
+        tip_text (str): Tip text.
+    Returns:
+        str: Hex SHA-1 of the topic and text.
+    """
+    return hashlib.sha1(f"{topic}\x1f{tip_text}".encode("utf-8")).hexdigest()
+
+
+def ensure_tips_table(engine, table=TIPS_TABLE):
+    """
+    Creates the tips table if needed, adds the text_hash column to tables
+    created before ingestion tracked content hashes and fills it in for rows
+    that have none, so re-ingesting a tip file does not duplicate them.
+    """
+    metadata = MetaData()
+    Table(
+        table, metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("topic", String(255)),
+        Column("tip_text", Text),
+        Column("text_hash", String(40), index=True),
+        Column("embedding", LargeBinary),
+    )
+    metadata.create_all(engine)
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    if "text_hash" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN text_hash VARCHAR(40)"))
+    fill_text_hashes(engine, table)
+
+
+def fill_text_hashes(engine, table=TIPS_TABLE, chunk=1000):
+    """
+    Computes text_hash for rows where it is NULL (tips stored before hashes
+    were tracked, or by other tools). Rows are processed in id order, `chunk`
+    at a time with one transaction each, like tip_quantize.quantize_tips.
+    Returns:
+        int: Rows filled in.
+    """
+    select_sql = text(
+        f"SELECT id, topic, tip_text FROM {table} WHERE id > :last_id AND text_hash IS NULL "
+        f"ORDER BY id LIMIT :chunk"
+    )
+    update_sql = text(f"UPDATE {table} SET text_hash = :text_hash WHERE id = :id")
+    filled, last_id = 0, -1
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select_sql, {"last_id": last_id, "chunk": chunk}).fetchall()
+        if not rows:
+            return filled
+        with engine.begin() as conn:
+            conn.execute(update_sql, [{"id": row_id, "text_hash": tip_hash(topic, tip_text)}
+                                      for row_id, topic, tip_text in rows])
+        filled += len(rows)
+        last_id = rows[-1][0]
+
+
+def read_tips(path):
+    """
+    Streams tips from a CSV or JSONL file without loading it into memory.
+    Each record needs topic and tip_text fields; an optional id targets an
+    existing row for update.
+    Args:
+        path (str): Path to a .csv or .jsonl file.
+    Yields:
+        dict: One tip record at a time.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for record in records:
+            tip_id = record.get("id")
+            yield {
+                "id": int(tip_id) if tip_id not in (None, "") else None,
+                "topic": (record.get("topic") or "").strip(),
+                "tip_text": (record.get("tip_text") or "").strip(),
+            }
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_tips(engine, records, model=None, batch_size=64, write_chunk=500, table=TIPS_TABLE):
+    """
+    Embeds tips in batches and writes them to the tips table.
+
+    Rows whose content hash is already stored are skipped; the rest are
+    embedded in one model call per batch and written with executemany in
+    chunks, one transaction per batch. Once tip_quantize.py has added the
+    embedding_q8 column, the int8 codes are written alongside.
+    Args:
+        engine (sqlalchemy.engine.Engine): Target database.
+        records (iterable): Tip dicts as produced by read_tips().
+        model: Object with an encode(texts) method. Defaults to all-MiniLM-L6-v2.
+        batch_size (int): Number of tips embedded per model call.
+        write_chunk (int): Number of rows per executemany call.
+        table (str): Name of the tips table.
+    Returns:
+        dict: Counts of read/skipped/inserted/updated tips and throughput.
+    """
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(MODEL_NAME)
+    ensure_tips_table(engine, table)
+    quantized = QUANTIZED_COLUMN in {c["name"] for c in inspect(engine).get_columns(table)}
+    columns = ["topic", "tip_text", "text_hash", "embedding"] + ([QUANTIZED_COLUMN] if quantized else [])
+
+    with engine.connect() as conn:
+        existing = {row_id: h for row_id, h in conn.execute(text(f"SELECT id, text_hash FROM {table}"))}
+    known_hashes = set(existing.values())
+
+    insert_sql = text(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})"
+    )
+    update_sql = text(
+        f"UPDATE {table} SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE id = :id"
+    )
+
+    stats = {"read": 0, "skipped": 0, "inserted": 0, "updated": 0}
+    start = time.perf_counter()
+    for batch in _batches(records, batch_size):
+        stats["read"] += len(batch)
+        pending = []
+        for record in batch:
+            if not record["tip_text"]:
+                stats["skipped"] += 1
+                continue
+            record["text_hash"] = tip_hash(record["topic"], record["tip_text"])
+            if record["id"] is not None and record["id"] in existing:
+                unchanged = existing[record["id"]] == record["text_hash"]
+            else:
+                unchanged = record["text_hash"] in known_hashes
+            if unchanged:
+                stats["skipped"] += 1
+                continue
+            known_hashes.add(record["text_hash"])
+            pending.append(record)
+        if not pending:
+            continue
+
+        vectors = model.encode([r["tip_text"] for r in pending])
+        inserts, updates = [], []
+        for record, vec in zip(pending, vectors):
+            row = {
+                "topic": record["topic"],
+                "tip_text": record["tip_text"],
+                "text_hash": record["text_hash"],
+                "embedding": np.asarray(vec, dtype=np.float32).tobytes(),
+            }
+            if quantized:
+                row[QUANTIZED_COLUMN] = encode_int8(vec)
+            if record["id"] is not None and record["id"] in existing:
+                row["id"] = record["id"]
+                existing[record["id"]] = record["text_hash"]
+                updates.append(row)
+            else:
+                inserts.append(row)
+
+        with engine.begin() as conn:
+            for sql, rows in ((insert_sql, inserts), (update_sql, updates)):
+                for i in range(0, len(rows), write_chunk):
+                    conn.execute(sql, rows[i:i + write_chunk])
+        stats["inserted"] += len(inserts)
+        stats["updated"] += len(updates)
+
+    stats["seconds"] = time.perf_counter() - start
+    written = stats["inserted"] + stats["updated"]
+    stats["tips_per_sec"] = written / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Bulk-load mental health tips with embeddings.")
+    parser.add_argument("path", help="CSV or JSONL file with topic and tip_text columns")
+    parser.add_argument("--db-url", default=os.getenv("TIPS_DB_URL", "sqlite:///tips.db"))
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--write-chunk", type=int, default=500)
+    args = parser.parse_args()
+
+    result = ingest_tips(create_engine(args.db_url), read_tips(args.path),
+                         batch_size=args.batch_size, write_chunk=args.write_chunk)
+    print(f"Read {result['read']} tips: {result['inserted']} inserted, {result['updated']} updated, "
+          f"{result['skipped']} unchanged in {result['seconds']:.2f}s "
+          f"({result['tips_per_sec']:.1f} tips/sec)")
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+from sqlalchemy import inspect, text
+
+from tip_index import QUANTIZED_COLUMN, TIPS_TABLE, encode_int8
+
+
+def ensure_quantized_column(engine, table=TIPS_TABLE):
+    """
+    Adds the embedding_q8 column to the tips table if it is missing.
+    Returns:
+        bool: True if the column was added.
+    """
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    if QUANTIZED_COLUMN in columns:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {QUANTIZED_COLUMN} BLOB"))
+    return True
+
+
+def quantize_tips(engine, table=TIPS_TABLE, chunk=1000, full=False):
+    """
+    Fills embedding_q8 from the float32 embedding column.
+
+    Rows are read and written in id order, `chunk` at a time with one
+    transaction each, so the migration can run against a live table and be
+    resumed: without full, rows that already have codes are skipped. The
+    float32 embeddings are kept for exact re-ranking.
+    Args:
+        engine (sqlalchemy.engine.Engine): Database holding the tips table.
+        table (str): Name of the tips table.
+        chunk (int): Rows per read and executemany.
+        full (bool): Re-encode every row, e.g. after embeddings were edited outside tip_ingest.py.
+    Returns:
+        dict: Rows quantized, float32 and int8 bytes, and seconds taken.
+    """
+    ensure_quantized_column(engine, table)
+    pending = "" if full else f" AND {QUANTIZED_COLUMN} IS NULL"
+    select_sql = text(
+        f"SELECT id, embedding FROM {table} WHERE id > :last_id AND embedding IS NOT NULL{pending} "
+        f"ORDER BY id LIMIT :chunk"
+    )
+    update_sql = text(f"UPDATE {table} SET {QUANTIZED_COLUMN} = :code WHERE id = :id")
+
+    stats = {"quantized": 0, "float32_bytes": 0, "int8_bytes": 0}
+    start = time.perf_counter()
+    last_id = -1
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select_sql, {"last_id": last_id, "chunk": chunk}).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, emb in rows:
+            code = encode_int8(np.frombuffer(emb, dtype=np.float32))
+            updates.append({"id": row_id, "code": code})
+            stats["float32_bytes"] += len(emb)
+            stats["int8_bytes"] += len(code)
+        with engine.begin() as conn:
+            conn.execute(update_sql, updates)
+        stats["quantized"] += len(updates)
+        last_id = rows[-1][0]
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+
+    parser = argparse.ArgumentParser(description="Add int8 tip embeddings (embedding_q8) to the tips table, "
+                                                 "or compare int8 against float32 search on synthetic tips.")
+    parser.add_argument("--db-url", default=os.getenv("TIPS_DB_URL"),
+                        help="Database to migrate; without it, runs the comparison instead")
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--full", action="store_true", help="Re-encode rows that already have codes")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Tip counts for the comparison")
+    args = parser.parse_args()
+
+    if args.db_url:
+        from sqlalchemy import create_engine
+        result = quantize_tips(create_engine(args.db_url), chunk=args.chunk, full=args.full)
+        print(f"Quantized {result['quantized']} tips in {result['seconds']:.2f}s: "
+              f"{result['float32_bytes'] / 2**20:.1f} MiB float32 -> {result['int8_bytes'] / 2**20:.1f} MiB int8")
+        sys.exit()
+
+    # Memory, scan latency and agreement with float32 on clustered synthetic embeddings
+    from benchmarks import fake_tidb, synthetic_embeddings, synthetic_tip_rows
+    from tip_index import TipIndex
+
+    def generated(index, n):
+        # Above 100k tips the SQLite stand-in no longer fits in memory next to the indexes
+        for first in range(0, n, 100000):
+            rows = synthetic_tip_rows(min(100000, n - first), seed=first, first_id=first + 1)
+            if index.quantized:
+                rows = [(key, topic, tip, encode_int8(np.frombuffer(emb, dtype=np.float32)))
+                        for key, topic, tip, emb in rows]
+            index._upsert(rows, {})
+        index._last_refresh = time.monotonic()
+
+    queries = synthetic_embeddings(200, seed=1)
+    print(f"{'tips':>9} {'index':<12} {'memory':>10} {'p50 search':>11} {'top-1':>7} {'recall@10':>10}")
+    for n in [int(size) for size in args.sizes.split(",")]:
+        engine = None
+        if n <= 100000:
+            engine = fake_tidb(synthetic_tip_rows(n))
+            migrated = quantize_tips(engine, chunk=5000)
+            print(f"{n:>9,} migrated in {migrated['seconds']:.1f}s "
+                  f"({migrated['float32_bytes'] / 2**20:.1f} -> {migrated['int8_bytes'] / 2**20:.1f} MiB stored)")
+        else:
+            print(f"{n:>9,} generated in memory (re-ranking needs the table)")
+
+        indexes = {
+            "float32": TipIndex(engine, max_age=None),
+            "int8": TipIndex(engine, max_age=None, quantized=True),
+        }
+        if engine is not None:
+            indexes["int8+rerank"] = TipIndex(engine, max_age=None, quantized=True, rerank=20)
+        baseline = None
+        for name, index in indexes.items():
+            start = time.perf_counter()
+            if engine is not None:
+                index.refresh()
+            else:
+                generated(index, n)
+            load = time.perf_counter() - start
+            timings, found = [], []
+            for q in queries:
+                start = time.perf_counter()
+                found.append([r["id"] for r in index.search(q, k=10)])
+                timings.append(time.perf_counter() - start)
+            if baseline is None:
+                baseline = found
+            top1 = np.mean([a[0] == b[0] for a, b in zip(found, baseline)])
+            recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found, baseline)])
+            print(f"{'':>9} {name:<12} {index.nbytes / 2**20:>7.1f} MiB {np.median(timings) * 1000:>8.2f} ms "
+                  f"{top1:>7.3f} {recall:>10.3f}   (load {load:.1f}s)")
+            index._reset()
+        if engine is not None:
+            engine.dispose()
@@ -0,0 +1,319 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import instrumentation
+import model_registry
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+
+_STOP = object()
+
+
+def _default_engine():
+    return model_registry.get("pyttsx3").init()
+
+
+class TTSService:
+    """
+    Text-to-speech on one long-lived worker thread.
+
+    The worker creates a single engine and keeps it, so replies no longer pay
+    engine start-up, and callers only enqueue work. speak() plays text aloud
+    and can be cancelled or interrupted; synthesize() renders text to an audio
+    file in a content-addressed cache, so repeated strings (fixed responses,
+    tips) are served from disk instead of being synthesized again.
+    """
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, engine_factory=_default_engine, voice=None, rate=None,
+                 audio_format="wav", max_cache_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            cache_dir (str): Directory holding synthesized audio files.
+            engine_factory (callable): Returns a pyttsx3-compatible engine; called once, on the worker.
+            voice (str): Optional engine voice id.
+            rate (int): Optional speaking rate in words per minute.
+            audio_format (str): Extension of cached files ("wav", or "aiff" on macOS).
+            max_cache_bytes (int): Oldest unused files are deleted beyond this size.
+        """
+        self.cache_dir = cache_dir
+        self.engine_factory = engine_factory
+        self.voice = voice
+        self.rate = rate
+        self.audio_format = audio_format
+        self.max_cache_bytes = max_cache_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}  # cache key -> Future of a queued synthesis
+        self._generation = 0  # bumped by interrupt(); older speech jobs are dropped
+        self._speaking = None
+        self.counters = {"spoken": 0, "interrupted": 0, "cancelled": 0,
+                         "cache_hits": 0, "synthesized": 0, "failed": 0}
+        self.engine_init_s = None
+        self._thread = threading.Thread(target=self._work, name="tts-worker", daemon=True)
+        self._thread.start()
+
+    def speak(self, text, interrupt=False):
+        """
+        Queues text to be spoken aloud.
+        Args:
+            text (str): Text to speak.
+            interrupt (bool): Stop current and queued speech first, e.g. for a newer reply.
+        Returns:
+            Future: Resolves to True when spoken, False if interrupted; cancel() drops it while queued.
+        """
+        if interrupt:
+            self.interrupt()
+        future = Future()
+        with self._lock:
+            self._queue.put(("speak", text, future, self._generation))
+        return future
+
+    def synthesize(self, text):
+        """
+        Returns the cached audio file for text, rendering it on the worker on a miss.
+        Returns:
+            Future: Resolves to the file path. Already done on a cache hit.
+        """
+        key = self.cache_key(text)
+        path = self._path(key)
+        future = Future()
+        with self._lock:
+            if os.path.exists(path):
+                self.counters["cache_hits"] += 1
+                os.utime(path)  # mtime doubles as last use for cache pruning
+                future.set_result(path)
+                return future
+            if key in self._pending:
+                return self._pending[key]
+            self._pending[key] = future
+            self._queue.put(("synthesize", text, future, key))
+        return future
+
+    def cached_path(self, text):
+        """
+        Returns:
+            str | None: Path of the synthesized audio if it is already cached.
+        """
+        path = self._path(self.cache_key(text))
+        return path if os.path.exists(path) else None
+
+    def cache_key(self, text):
+        # Voice and rate change the audio, so they are part of the address
+        data = f"{self.voice}\0{self.rate}\0{' '.join(text.split())}"
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def interrupt(self):
+        """Stops the utterance being spoken and drops queued speech; syntheses continue."""
+        with self._lock:
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, queued=self._queue.qsize(), engine_init_s=self.engine_init_s)
+
+    def close(self, timeout=5.0):
+        self.interrupt()
+        self._queue.put((_STOP, None, None, None))
+        self._thread.join(timeout)
+
+    # ── internals ──────────────────────────────────────────────────
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{self.audio_format}")
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _init_engine(self):
+        start = time.perf_counter()
+        engine = self.engine_factory()
+        if self.voice is not None:
+            engine.setProperty("voice", self.voice)
+        if self.rate is not None:
+            engine.setProperty("rate", self.rate)
+        # pyttsx3 can only be stopped from its own callbacks, so check for interrupts per word
+        engine.connect("started-word", lambda *args, **kwargs: self._check_interrupt(engine))
+        self.engine_init_s = time.perf_counter() - start
+        return engine
+
+    def _check_interrupt(self, engine):
+        if self._speaking is not None and self._speaking != self._generation:
+            engine.stop()
+
+    def _work(self):
+        engine = None
+        while True:
+            kind, text, future, extra = self._queue.get()
+            if kind is _STOP:
+                return
+            if not future.set_running_or_notify_cancel():
+                self._count("cancelled")
+                continue
+            try:
+                if engine is None:
+                    engine = self._init_engine()
+                if kind == "speak":
+                    future.set_result(self._speak(engine, text, extra))
+                else:
+                    future.set_result(self._synthesize(engine, text, extra))
+            except Exception as e:
+                self._count("failed")
+                future.set_exception(e)
+            finally:
+                if kind == "synthesize":
+                    with self._lock:
+                        self._pending.pop(extra, None)
+
+    @instrumentation.timed("tts_speak")
+    def _speak(self, engine, text, generation):
+        if generation != self._generation:
+            self._count("interrupted")
+            return False
+        self._speaking = generation
+        try:
+            engine.say(text)
+            engine.runAndWait()
+        finally:
+            self._speaking = None
+        completed = generation == self._generation
+        self._count("spoken" if completed else "interrupted")
+        return completed
+
+    @instrumentation.timed("tts_synthesize")
+    def _synthesize(self, engine, text, key):
+        path = self._path(key)
+        # Render to a temporary name so readers never see a partial file
+        partial = f"{path}.{threading.get_ident()}.part"
+        try:
+            engine.save_to_file(text, partial)
+            engine.runAndWait()
+            os.replace(partial, path)
+        except Exception:
+            # A failed render may leave a partial file that _prune() would never match
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        self._count("synthesized")
+        self._prune()
+        return path
+
+    def _prune(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith("." + self.audio_format):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_cache_bytes:
+            return
+        for _, size, path in sorted(files):
+            if total <= self.max_cache_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_tts_service():
+    """Returns the process-wide TTS service, started on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TTSService()
+        return _service
+
+
+if __name__ == "__main__":
+    # Latency: per-call engine (old text_to_speech) vs. persistent worker, cold vs. cached phrases.
+    # Uses pyttsx3 when installed, otherwise a stand-in engine with typical start-up and render costs.
+    import json
+    import shutil
+    import tempfile
+    import wave
+
+    from intent_router import INTENTS_FILE
+
+    class SimulatedEngine:
+        def __init__(self):
+            time.sleep(0.25)  # driver and voice loading
+            self._jobs = []
+
+        def setProperty(self, name, value):
+            pass
+
+        def connect(self, topic, callback):
+            pass
+
+        def say(self, text):
+            self._jobs.append((text, None))
+
+        def save_to_file(self, text, path):
+            self._jobs.append((text, path))
+
+        def runAndWait(self):
+            for text, path in self._jobs:
+                time.sleep(0.002 * len(text))  # rendering time grows with text length
+                if path:
+                    with wave.open(path, "wb") as wav:
+                        wav.setnchannels(1)
+                        wav.setsampwidth(2)
+                        wav.setframerate(22050)
+                        wav.writeframes(b"\0\0" * 22050)
+            self._jobs = []
+
+        def stop(self):
+            pass
+
+    try:
+        import pyttsx3
+        factory = pyttsx3.init
+        print("Engine: pyttsx3")
+    except ImportError:
+        factory = SimulatedEngine
+        print("Engine: simulated (pyttsx3 not installed)")
+
+    with open(INTENTS_FILE, encoding="utf-8") as f:
+        config = json.load(f)
+    phrases = [intent["response"] for intent in config["intents"]] + [config["default_response"]]
+
+    start = time.perf_counter()
+    for text in phrases:
+        engine = factory()
+        engine.save_to_file(text, os.path.join(tempfile.gettempdir(), "tts_bench.wav"))
+        engine.runAndWait()
+    per_call = (time.perf_counter() - start) / len(phrases)
+
+    cache_dir = tempfile.mkdtemp()
+    service = TTSService(cache_dir=cache_dir, engine_factory=factory)
+    cold = []
+    for text in phrases:
+        start = time.perf_counter()
+        service.synthesize(text).result()
+        cold.append(time.perf_counter() - start)
+    cached = []
+    for _ in range(100):
+        for text in phrases:
+            start = time.perf_counter()
+            service.synthesize(text).result()
+            cached.append(time.perf_counter() - start)
+    service.close()
+    shutil.rmtree(cache_dir)
+
+    print(f"{len(phrases)} fixed responses")
+    print(f"new engine per call:      {per_call * 1000:8.1f} ms/phrase")
+    print(f"persistent worker, cold:  {sum(cold[1:]) / (len(cold) - 1) * 1000:8.1f} ms/phrase "
+          f"(first call {cold[0] * 1000:.1f} ms incl. engine start {service.engine_init_s * 1000:.1f} ms)")
+    print(f"persistent worker, cache: {sorted(cached)[len(cached) // 2] * 1e6:8.1f} us/phrase (p50)")
@@ -0,0 +1,209 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class SeenCache:
+    """Remembers keys (e.g. Twilio MessageSids) for `ttl` seconds, up to max_size of them."""
+
+    def __init__(self, ttl=24 * 3600, max_size=100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        """
+        Returns:
+            bool: True if the key is new, False if it was seen within the ttl.
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._seen:
+                oldest, stamp = next(iter(self._seen.items()))
+                if now - stamp <= self.ttl and len(self._seen) < self.max_size:
+                    break
+                self._seen.popitem(last=False)
+            if key in self._seen:
+                return False
+            self._seen[key] = now
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._seen.pop(key, None)
+
+
+class ReplyWorkerPool:
+    """
+    Processes incoming messages off the request thread.
+
+    submit() only deduplicates and enqueues, so a webhook can acknowledge
+    immediately; worker threads then run `handle` (generate a reply and send
+    it through the outbound API). The queue is bounded so a flood of messages
+    turns into fast rejections instead of unbounded memory and latency. The
+    webhook has already acknowledged the message, so Twilio will not redeliver
+    it: `handle` has to do its own retrying.
+    """
+
+    def __init__(self, handle, workers=8, max_queue=1000, dedupe_ttl=24 * 3600):
+        """
+        Args:
+            handle (callable): f(payload) run on a worker thread.
+            workers (int): Worker threads.
+            max_queue (int): Messages waiting for a worker before submit() rejects.
+            dedupe_ttl (float): Seconds a message id is remembered for idempotency.
+        """
+        self.handle = handle
+        self.seen = SeenCache(ttl=dedupe_ttl)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.counters = {"accepted": 0, "duplicates": 0, "rejected": 0, "processed": 0, "failed": 0}
+        self._latencies = []
+        self._threads = [threading.Thread(target=self._work, name=f"webhook-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, message_id, payload):
+        """
+        Enqueues a message unless it was already accepted.
+        Returns:
+            str: "queued", "duplicate" or "full".
+        """
+        if message_id and not self.seen.add(message_id):
+            self._count("duplicates")
+            return "duplicate"
+        try:
+            self._queue.put_nowait((time.perf_counter(), payload))
+        except queue.Full:
+            if message_id:
+                self.seen.discard(message_id)  # a redelivery may succeed later
+            self._count("rejected")
+            return "full"
+        self._count("accepted")
+        return "queued"
+
+    def join(self):
+        """Blocks until every queued message was processed."""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.counters, queued=self._queue.qsize())
+        if latencies:
+            stats["p50_s"] = latencies[len(latencies) // 2]
+            stats["p95_s"] = latencies[int(len(latencies) * 0.95)]
+        return stats
+
+    def shutdown(self, timeout=5.0):
+        for _ in self._threads:
+            self._queue.put((None, None))
+        for thread in self._threads:
+            thread.join(timeout)
+
+    # ── internals ──────────────────────────────────────────────────
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _work(self):
+        while True:
+            enqueued, payload = self._queue.get()
+            try:
+                if enqueued is None:
+                    return
+                self.handle(payload)
+                with self._lock:
+                    self.counters["processed"] += 1
+                    self._latencies.append(time.perf_counter() - enqueued)
+                    del self._latencies[:-10000]
+            except Exception as e:
+                self._count("failed")
+                print(f"Failed to process message: {e}")
+            finally:
+                self._queue.task_done()
+
+
+if __name__ == "__main__":
+    # Load test: webhook ack latency and end-to-end throughput in async mode,
+    # against local stand-ins for Twilio and LM Studio
+    import json
+    import logging
+    import os
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import requests
+    from werkzeug.serving import make_server
+
+    class FakeServices(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        delivered = []
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path.endswith("/completions"):
+                time.sleep(0.5)  # simulated generation time
+                stream = json.loads(data).get("stream")
+                text = json.dumps({"choices": [{"text": "You are not alone in this."}]})
+                body = (f"data: {text}\n\ndata: [DONE]\n\n" if stream else text).encode()
+                status = 200
+            else:
+                FakeServices.delivered.append(data)
+                body, status = b'{"sid": "SM1"}', 201
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    fake = ThreadingHTTPServer(("127.0.0.1", 0), FakeServices)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    fake_url = f"http://127.0.0.1:{fake.server_port}"
+    os.environ.update(TWILIO_ACCOUNT_SID="AC_load", TWILIO_AUTH_TOKEN="token",
+                      TWILIO_WHATSAPP_FROM="whatsapp:+14155238886", TWILIO_API_URL=fake_url)
+
+    import reminder_delivery
+    import whatsapp_integration
+    reminder_delivery.TWILIO_API_URL = fake_url
+    reminder_delivery._sender = reminder_delivery.WhatsAppSender.from_env(base_url=fake_url, rate=1000)
+    whatsapp_integration.WEBHOOK_MODE = "async"
+    whatsapp_integration.LLM_OPTIONS["base_url"] = fake_url + "/v1"
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, whatsapp_integration.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    webhook = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    texts = ["hi", "I can't sleep before my exams", "help", "work has been overwhelming lately"]
+    # Every 10th request is a Twilio retry of an earlier MessageSid
+    forms = [{"Body": texts[i % len(texts)], "From": f"whatsapp:+1555{i:07d}",
+              "MessageSid": f"SM{i - 1 if i % 10 == 9 else i:032d}"} for i in range(n)]
+
+    session = requests.Session()
+
+    def post(form):
+        start = time.perf_counter()
+        session.post(webhook, data=form, timeout=30).raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as clients:
+        acks = sorted(clients.map(post, forms))
+    whatsapp_integration.get_reply_pool().join()
+    elapsed = time.perf_counter() - start
+
+    stats = whatsapp_integration.get_reply_pool().stats()
+    print(f"{n} webhooks: ack p50 {acks[n // 2] * 1000:.1f} ms, p95 {acks[int(n * 0.95)] * 1000:.1f} ms, "
+          f"max {acks[-1] * 1000:.1f} ms")
+    print(f"{len(FakeServices.delivered)} replies sent, {stats['duplicates']} retries dropped, "
+          f"{len(FakeServices.delivered) / elapsed:.1f} replies/sec, reply latency p95 {stats['p95_s']:.2f}s")
+    server.shutdown()
+    fake.shutdown()
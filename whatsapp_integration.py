@@ -1,41 +1,229 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from twilio.twiml.messaging_response import MessagingResponse
 import os
+import threading
+import time
+import instrumentation
+from intent_router import IntentRouter, INTENTS_FILE
+from session_store import SessionStore
+from webhook_worker import ReplyWorkerPool
 
 app = Flask(__name__)
+router = IntentRouter.from_file(os.environ.get("INTENTS_FILE", INTENTS_FILE))
+
+# "sync" answers inside the request; "async" acknowledges at once and replies
+# through the outbound Messages API from a worker pool
+WEBHOOK_MODE = os.environ.get("WEBHOOK_MODE", "sync")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 8))
+PROMPT_TEMPLATE = "You are a kind mental‑health assistant.\n{context}User: {user_input}\nAI:"
+LLM_OPTIONS = {"max_tokens": 150, "temperature": 0.7}
+CONTEXT_TOKENS = 1024
+# The webhook has already acknowledged the message, so Twilio won't redeliver it;
+# the worker retries the outbound send itself (on top of the sender's own retries)
+REPLY_SEND_ROUNDS = 3
+REPLY_RETRY_DELAY = 5.0
+
+# Per-number conversation history; evicted sessions go to SESSION_SPILL_PATH if set
+sessions = SessionStore(max_bytes=int(os.environ.get("SESSION_MAX_MB", 64)) * 1024 * 1024,
+                        idle_ttl=float(os.environ.get("SESSION_IDLE_SECONDS", 24 * 3600)),
+                        spill_path=os.environ.get("SESSION_SPILL_PATH"))
+
+_pool = None
+_pipeline = None
+_tip_index = None
+_completion_cache = None
+_embedder = None
+_lazy_lock = threading.Lock()
+
+def get_embedder():
+    # Memoized embeddings shared by tip lookup and the completion cache, as on the Chat page
+    global _embedder
+    import model_registry
+    from embedding_cache import EmbeddingCache
+    model = model_registry.get("embedder")
+    with _lazy_lock:
+        if _embedder is None:
+            _embedder = EmbeddingCache(model, max_entries=5000)
+        return _embedder
+
+def get_completion_cache():
+    global _completion_cache
+    from completion_cache import CompletionCache
+    # Near-duplicate matching needs the embedder, which is only loaded when tips are enabled
+    embed = get_embedder().encode if os.environ.get("TIDB_HOST") else None
+    with _lazy_lock:
+        if _completion_cache is None:
+            # Same settings as the Chat page
+            _completion_cache = CompletionCache(os.environ.get("COMPLETION_CACHE_PATH", "completion_cache.db"),
+                                                ttl=24 * 3600, max_entries=2000,
+                                                embed=embed, similarity_threshold=0.92)
+        return _completion_cache
+
+def _llm_reply(user_input, on_token, context=""):
+    from llm_client import DEFAULT_MODEL, generate_reply
+    metrics = {}
+
+    def compute():
+        prompt = PROMPT_TEMPLATE.format(context=context, user_input=user_input)
+        reply, call_metrics = generate_reply(prompt, on_token=on_token, **LLM_OPTIONS)
+        metrics.update(call_metrics)
+        return reply
+
+    if context:
+        # Replies that depend on earlier turns are not reusable across conversations
+        return compute()
+    model = LLM_OPTIONS.get("model", DEFAULT_MODEL)
+    # Only replies produced without any error are reused by later (near-)duplicate prompts
+    reply, cached = get_completion_cache().get_or_compute(user_input, compute, model, PROMPT_TEMPLATE, LLM_OPTIONS,
+                                                          cacheable=lambda reply: not metrics["error"])
+    if cached:
+        on_token(reply)
+    return reply
+
+def _find_tip(user_input):
+    # Tip retrieval needs the tips database; without TIDB_HOST replies carry no tip
+    global _tip_index
+    if not os.environ.get("TIDB_HOST"):
+        return None
+    from db_pool import get_engine
+    from tip_index import TipIndex, version_column_for
+    with _lazy_lock:
+        if _tip_index is None:
+            engine = get_engine()
+            _tip_index = TipIndex(engine, version_column=version_column_for(engine), max_age=300)
+    with instrumentation.span("embedding"):
+        query = get_embedder().encode(user_input)
+    with instrumentation.span("tip_search"):
+        matches = _tip_index.search(query, k=1)
+    if not matches:
+        return None
+    return matches[0]["topic"], matches[0]["tip_text"], matches[0]["score"]
+
+def get_pipeline():
+    global _pipeline
+    from chat_pipeline import ChatTurnPipeline
+    with _lazy_lock:
+        if _pipeline is None:
+            _pipeline = ChatTurnPipeline(_llm_reply, _find_tip, llm_timeout=60.0, tip_timeout=5.0,
+                                         llm_workers=WEBHOOK_WORKERS, tip_workers=WEBHOOK_WORKERS)
+        return _pipeline
+
+def compose_reply(message, session_id=None):
+    """
+    Builds the reply to a message: a configured intent answers directly,
+    anything else goes to the LLM, with the conversation so far and a
+    matching tip appended.
+    Args:
+        message (str): The incoming message.
+        session_id (str): Conversation key (the sender's number); None keeps no history.
+    """
+    with instrumentation.span("intent_route"):
+        intent, reply = router.route(message)
+    if intent is None:
+        context = sessions.build_context(session_id, max_tokens=CONTEXT_TOKENS) if session_id else ""
+        turn = get_pipeline().run(message, context=context)
+        reply = turn["ai_reply"] if "llm" not in turn["errors"] and turn["ai_reply"] else router.default_response
+        if turn["tip_text"]:
+            reply += f"\n\n💡 {turn['tip_text']}"
+    if session_id:
+        sessions.append(session_id, "user", message)
+        sessions.append(session_id, "assistant", reply)
+    return reply
+
+def transcribe_voice_note(url, sender):
+    """Streams a voice note from Twilio's media URL into offline speech recognition."""
+    from audio_utils import transcribe
+    with instrumentation.span("transcribe"), sender.session.get(url, stream=True, timeout=30) as res:
+        res.raise_for_status()
+        res.raw.decode_content = True
+        return transcribe(res.raw)
+
+@instrumentation.timed("process_message")
+def process_message(payload):
+    """Worker-side handling of one acknowledged message."""
+    from reminder_delivery import get_sender
+    sender = get_sender()
+    body = payload["body"]
+    if payload.get("media_url") and sender is not None:
+        try:
+            body = transcribe_voice_note(payload["media_url"], sender) or body
+        except Exception as e:
+            # A download or decoding failure still gets the "couldn't make out" reply
+            print(f"Failed to transcribe voice note from {payload['from']}: {e}")
+    if body.strip():
+        reply = compose_reply(body, session_id=payload["from"])
+    else:
+        reply = "Sorry, I couldn't make out that voice note. Could you try again or type your message?"
+    if sender is None:
+        print(f"No Twilio credentials configured; reply to {payload['from']} not sent: {reply}")
+        return
+    for attempt in range(REPLY_SEND_ROUNDS):
+        if attempt:
+            time.sleep(REPLY_RETRY_DELAY * 2 ** (attempt - 1))
+        result = sender.send(payload["from"], reply)
+        if result["status"] == "sent" or not result.get("retryable", True):
+            break
+    if result["status"] != "sent":
+        raise RuntimeError(f"Reply to {payload['from']} failed: {result['error']}")
+
+def get_reply_pool():
+    global _pool
+    with _lazy_lock:
+        if _pool is None:
+            _pool = ReplyWorkerPool(process_message, workers=WEBHOOK_WORKERS)
+        return _pool
+
+def _valid_signature():
+    # Opt-in because it needs the public URL Twilio posts to (behind proxies/ngrok)
+    if os.environ.get("TWILIO_VALIDATE_SIGNATURE") != "1":
+        return True
+    from twilio.request_validator import RequestValidator
+    validator = RequestValidator(os.environ.get("TWILIO_AUTH_TOKEN", ""))
+    return validator.validate(request.url, request.form, request.headers.get("X-Twilio-Signature", ""))
 
 @app.route("/webhook", methods=['POST'])
+@instrumentation.timed("webhook")
 def whatsapp_webhook():
     """
     Webhook to handle incoming WhatsApp messages via Twilio.
     """
+    if not _valid_signature():
+        return "Invalid signature", 403
     incoming_msg = request.values.get('Body', '').lower()
     from_number = request.values.get('From', '')
-    
+
+    if WEBHOOK_MODE == "async":
+        # Voice notes arrive as audio media and are transcribed by the worker
+        media_url = None
+        if request.values.get('MediaContentType0', '').startswith('audio/'):
+            media_url = request.values.get('MediaUrl0')
+        if not (incoming_msg.strip() or media_url) or not from_number:
+            return "Missing Body or From", 400
+        # Twilio retries deliveries it considers failed; the MessageSid makes them idempotent
+        status = get_reply_pool().submit(request.values.get('MessageSid', ''),
+                                         {"from": from_number, "body": request.values.get('Body', ''),
+                                          "media_url": media_url})
+        if status == "full":
+            return "Busy, retry later", 503, {"Retry-After": "5"}
+        return str(MessagingResponse()), 200, {"Content-Type": "text/xml"}
+
     # Create a Twilio response object
     resp = MessagingResponse()
     msg = resp.message()
-    
-    # Simple response logic (can be enhanced with AI integration)
-    if 'hello' in incoming_msg or 'hi' in incoming_msg:
-        response_text = "Hello! I'm your AI Mental Health Companion. How are you feeling today?"
-    elif 'mood' in incoming_msg:
-        response_text = "I'd love to help you track your mood. On a scale of 1-10, how would you rate your current mood?"
-    elif 'help' in incoming_msg:
-        response_text = "I'm here to support your mental health journey. You can:\n• Share how you're feeling\n• Ask for mood tracking\n• Request breathing exercises\n• Get mental health tips"
-    elif 'breathing' in incoming_msg or 'breathe' in incoming_msg:
-        response_text = "Let's do a quick breathing exercise:\n1. Inhale for 4 seconds\n2. Hold for 7 seconds\n3. Exhale for 8 seconds\nRepeat this 3 times. You've got this! 🌟"
-    elif any(word in incoming_msg for word in ['sad', 'depressed', 'down', 'anxious', 'worried']):
-        response_text = "I hear that you're going through a tough time. Remember, it's okay to feel this way. Would you like to try a breathing exercise or talk about what's on your mind?"
-    elif any(word in incoming_msg for word in ['happy', 'good', 'great', 'excellent']):
-        response_text = "That's wonderful to hear! I'm so glad you're feeling good. What's contributing to your positive mood today?"
-    else:
-        response_text = "Thank you for sharing that with me. I'm here to listen and support you. Is there anything specific I can help you with today?"
-    
+
+    # Keyword intents are loaded from intents.json and matched on whole words
+    with instrumentation.span("intent_route"):
+        intent, response_text = router.route(incoming_msg)
+
     msg.body(response_text)
-    
+
     return str(resp)
 
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """Per-stage latency histograms in the Prometheus text format."""
+    return Response(instrumentation.prometheus_text(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/", methods=['GET'])
 def home():
     return "WhatsApp Mental Health Bot is running!"
@@ -46,7 +234,7 @@ if __name__ == "__main__":
     # 2. Configure WhatsApp Business API
     # 3. Set up webhook URL (using ngrok for local testing)
     # 4. Add proper environment variables for Twilio credentials
-    
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    # 5. Serve with a production WSGI server, e.g. gunicorn -w 1 --threads 16 whatsapp_integration:app
 
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)